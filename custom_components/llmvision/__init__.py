@@ -4,6 +4,14 @@ from .calendar import Timeline
 from .providers import Request
 from .memory import Memory
 from .media_handlers import MediaProcessor
+from .executor import retire_media_executor, setup_media_executor
+from .frame import EncoderProfile
+from .cache import setup_image_cache
+from .frame_cache import setup_frame_cache
+from .video import ExtractionProfile
+from .workspace import remove_stale_workspaces, setup_tmp_path
+from .scheduler import setup_ffmpeg_scheduler
+from .supervisor import retire_process_supervisor, setup_process_supervisor
 from .llm_logger import LLMLogger
 import re
 import os
@@ -38,6 +46,31 @@ from .const import (
     CONF_AWS_ACCESS_KEY_ID,
     CONF_AWS_SECRET_ACCESS_KEY,
     CONF_AWS_REGION_NAME,
+    CONF_MEDIA_WORKERS,
+    CONF_MEDIA_BACKEND,
+    CONF_IMAGE_FORMAT,
+    CONF_IMAGE_QUALITY,
+    CONF_IMAGE_SUBSAMPLING,
+    CONF_IMAGE_OPTIMIZE,
+    CONF_IMAGE_PROGRESSIVE,
+    CONF_IMAGE_CACHE_SIZE,
+    CONF_FRAME_EXTRACTION,
+    DATA_ENCODER_PROFILE,
+    DATA_IMAGE_CACHE,
+    DATA_FRAME_EXTRACTION,
+    CONF_SCENE_THRESHOLD,
+    CONF_TMP_PATH,
+    CONF_STREAM_CLIPS,
+    CONF_FFMPEG_JOBS,
+    CONF_FFMPEG_TIMEOUT,
+    CONF_FFMPEG_NICE,
+    CONF_FFMPEG_IONICE,
+    CONF_FFMPEG_THREADS,
+    CONF_FRAME_CACHE_SIZE,
+    CONF_FRAME_CACHE_TTL,
+    DATA_FFMPEG_SCHEDULER,
+    DATA_FRAME_CACHE,
+    DATA_TMP_PATH,
     MESSAGE,
     REMEMBER,
     USE_MEMORY,
@@ -55,6 +88,10 @@ from .const import (
     DURATION,
     MAX_FRAMES,
     MIN_FRAMES_PER_CAMERA,
+    FRAME_SELECTION,
+    FRAME_SELECTION_SSIM,
+    CROP_TO_MOTION,
+    MOSAIC,
     INCLUDE_FILENAME,
     EXPOSE_IMAGES,
     GENERATE_TITLE,
@@ -113,6 +150,25 @@ async def async_setup_entry(hass, entry):
         CONF_MEMORY_STRINGS: entry.data.get(CONF_MEMORY_STRINGS),
         CONF_SYSTEM_PROMPT: entry.data.get(CONF_SYSTEM_PROMPT),
         CONF_TITLE_PROMPT: entry.data.get(CONF_TITLE_PROMPT),
+        CONF_MEDIA_WORKERS: entry.data.get(CONF_MEDIA_WORKERS),
+        CONF_MEDIA_BACKEND: entry.data.get(CONF_MEDIA_BACKEND),
+        CONF_IMAGE_FORMAT: entry.data.get(CONF_IMAGE_FORMAT),
+        CONF_IMAGE_QUALITY: entry.data.get(CONF_IMAGE_QUALITY),
+        CONF_IMAGE_SUBSAMPLING: entry.data.get(CONF_IMAGE_SUBSAMPLING),
+        CONF_IMAGE_OPTIMIZE: entry.data.get(CONF_IMAGE_OPTIMIZE),
+        CONF_IMAGE_PROGRESSIVE: entry.data.get(CONF_IMAGE_PROGRESSIVE),
+        CONF_IMAGE_CACHE_SIZE: entry.data.get(CONF_IMAGE_CACHE_SIZE),
+        CONF_FRAME_EXTRACTION: entry.data.get(CONF_FRAME_EXTRACTION),
+        CONF_SCENE_THRESHOLD: entry.data.get(CONF_SCENE_THRESHOLD),
+        CONF_TMP_PATH: entry.data.get(CONF_TMP_PATH),
+        CONF_STREAM_CLIPS: entry.data.get(CONF_STREAM_CLIPS),
+        CONF_FFMPEG_JOBS: entry.data.get(CONF_FFMPEG_JOBS),
+        CONF_FFMPEG_TIMEOUT: entry.data.get(CONF_FFMPEG_TIMEOUT),
+        CONF_FFMPEG_NICE: entry.data.get(CONF_FFMPEG_NICE),
+        CONF_FFMPEG_IONICE: entry.data.get(CONF_FFMPEG_IONICE),
+        CONF_FFMPEG_THREADS: entry.data.get(CONF_FFMPEG_THREADS),
+        CONF_FRAME_CACHE_SIZE: entry.data.get(CONF_FRAME_CACHE_SIZE),
+        CONF_FRAME_CACHE_TTL: entry.data.get(CONF_FRAME_CACHE_TTL),
     }
 
     # Filter out None values
@@ -129,6 +185,20 @@ async def async_setup_entry(hass, entry):
 
     # If this is the Settings entry, set up the calendar and run cleanup
     if filtered_provider_config.get(CONF_PROVIDER) == "Settings":
+        setup_media_executor(hass, filtered_provider_config)
+        hass.data[DATA_ENCODER_PROFILE] = EncoderProfile.from_config(
+            filtered_provider_config
+        )
+        setup_image_cache(hass, filtered_provider_config)
+        hass.data[DATA_FRAME_EXTRACTION] = ExtractionProfile.from_config(
+            filtered_provider_config
+        )
+        setup_ffmpeg_scheduler(hass, filtered_provider_config)
+        setup_process_supervisor(hass, filtered_provider_config)
+        tmp_path = setup_tmp_path(hass, filtered_provider_config)
+        await hass.async_add_executor_job(remove_stale_workspaces, tmp_path)
+        frame_cache = setup_frame_cache(hass, filtered_provider_config)
+        await hass.async_add_executor_job(frame_cache.prune)
         await hass.config_entries.async_forward_entry_setups(entry, ["calendar"])
         timeline = Timeline(hass, entry)
         await timeline._cleanup()
@@ -173,6 +243,17 @@ async def async_unload_entry(hass, entry) -> bool:
         )
     else:
         unload_ok = True
+    if entry.data.get(CONF_PROVIDER) == "Settings":
+        # Calls in flight keep using the executor and their ffmpeg
+        # processes until they are done
+        retire_media_executor(hass)
+        hass.data.pop(DATA_ENCODER_PROFILE, None)
+        hass.data.pop(DATA_IMAGE_CACHE, None)
+        hass.data.pop(DATA_FRAME_EXTRACTION, None)
+        hass.data.pop(DATA_TMP_PATH, None)
+        hass.data.pop(DATA_FFMPEG_SCHEDULER, None)
+        retire_process_supervisor(hass)
+        hass.data.pop(DATA_FRAME_CACHE, None)
     return unload_ok
 
 
@@ -567,6 +648,9 @@ class ServiceCallData:
         self.frigate_retry_seconds = int(data_call.data.get(FRIGATE_RETRY_SECONDS, 1))
         self.max_frames = int(data_call.data.get(MAX_FRAMES, 3))
         self.min_frames_per_camera = int(data_call.data.get(MIN_FRAMES_PER_CAMERA, 0))
+        self.frame_selection = data_call.data.get(FRAME_SELECTION, FRAME_SELECTION_SSIM)
+        self.crop_to_motion = data_call.data.get(CROP_TO_MOTION, False)
+        self.mosaic = data_call.data.get(MOSAIC, False)
         self.target_width = data_call.data.get(TARGET_WIDTH, 3840)
         self.temperature = float()
         self.max_tokens = int(data_call.data.get(MAXTOKENS, 100))
@@ -590,7 +674,7 @@ class ServiceCallData:
         self.end_time = self._convert_time_input_to_datetime(self.end_time)
 
         # ------------ Added during call ------------
-        # self.base64_images : List[str] = []
+        # self.images : List[bytes | str] = []
         # self.filenames : List[str] = []
 
     def _convert_time_input_to_datetime(self, time_input) -> datetime:
@@ -674,7 +758,13 @@ def setup(hass, config):
         """Handle the service call to analyze a video (future implementation)"""
         start = dt_util.now()
         call = ServiceCallData(data_call).get_service_call_data()
-        call.message = "The attached images are frames from a video. " + call.message
+        # Groq accepts a single image only, send its frames as one mosaic
+        mosaic = call.mosaic or Request.get_provider(hass, call.provider) == "Groq"
+        call.message = (
+            "The attached image is a grid of labeled frames from a video. "
+            if mosaic
+            else "The attached images are frames from a video. "
+        ) + call.message
 
         request = Request(
             hass,
@@ -692,6 +782,9 @@ def setup(hass, config):
             expose_images=call.expose_images,
             frigate_retry_attempts=call.frigate_retry_attempts,
             frigate_retry_seconds=call.frigate_retry_seconds,
+            frame_selection=call.frame_selection,
+            crop_to_motion=call.crop_to_motion,
+            mosaic=mosaic,
         )
         call.memory = Memory(hass)
         await call.memory._update_memory()
@@ -715,9 +808,13 @@ def setup(hass, config):
         """Handle the service call to analyze a stream"""
         start = dt_util.now()
         call = ServiceCallData(data_call).get_service_call_data()
+        # Groq accepts a single image only, send its frames as one mosaic
+        mosaic = call.mosaic or Request.get_provider(hass, call.provider) == "Groq"
         call.message = (
-            "The attached images are frames from a live camera feed. " + call.message
-        )
+            "The attached image is a grid of labeled frames from a live camera feed. "
+            if mosaic
+            else "The attached images are frames from a live camera feed. "
+        ) + call.message
         request = Request(
             hass,
             message=call.message,
@@ -734,6 +831,9 @@ def setup(hass, config):
             target_width=call.target_width,
             include_filename=call.include_filename,
             expose_images=call.expose_images,
+            frame_selection=call.frame_selection,
+            crop_to_motion=call.crop_to_motion,
+            mosaic=mosaic,
         )
 
         call.memory = Memory(hass)
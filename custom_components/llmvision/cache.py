@@ -0,0 +1,108 @@
+"""In-memory LRU cache of decoded and encoded images"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+
+from .const import (
+    CONF_IMAGE_CACHE_SIZE,
+    DATA_IMAGE_CACHE,
+    DEFAULT_IMAGE_CACHE_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """Hash of encoded image bytes, used as cache key"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ImageCache:
+    """LRU cache of frames with a byte budget
+
+    Frames are keyed by the hash of the original image bytes, the target width
+    and the encoder profile, so the same snapshot or file analyzed by several
+    calls is only decoded, resized and encoded once. When the cached frames
+    exceed max_bytes, the least recently used ones are evicted.
+
+    Args:
+        max_bytes (int): Byte budget, 0 disables the cache
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(digest, target_width, profile):
+        return (digest, target_width, profile.key)
+
+    def get(self, key):
+        """Return the cached frame for key or None"""
+        entry = self._frames.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, frame):
+        """Add or update a frame, evicting least recently used frames if needed
+
+        Call again after encoding a cached frame so its size is accounted for.
+        """
+        nbytes = frame.nbytes
+        if nbytes > self.max_bytes:
+            return
+        previous = self._frames.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+        self._frames[key] = (frame, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._frames.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self._frames.clear()
+        self.size = 0
+
+    @property
+    def stats(self) -> dict:
+        """Hit/miss counters and memory usage"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._frames),
+            "size_mb": round(self.size / 1_000_000, 2),
+            "max_size_mb": round(self.max_bytes / 1_000_000, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 2) if lookups else 0.0,
+        }
+
+
+def setup_image_cache(hass, config: dict) -> ImageCache:
+    """Create the image cache from Settings, replacing an existing one"""
+    size_mb = config.get(CONF_IMAGE_CACHE_SIZE)
+    if size_mb is None:
+        size_mb = DEFAULT_IMAGE_CACHE_SIZE
+    cache = ImageCache(max_bytes=int(size_mb * 1_000_000))
+    _LOGGER.debug(f"Image cache size: {size_mb} MB")
+    hass.data[DATA_IMAGE_CACHE] = cache
+    return cache
+
+
+def get_image_cache(hass) -> ImageCache:
+    """Return the shared image cache, create it with defaults if needed"""
+    cache = hass.data.get(DATA_IMAGE_CACHE)
+    if cache is None:
+        cache = setup_image_cache(hass, {})
+    return cache
@@ -39,6 +39,50 @@ from .const import (
     CONF_AWS_ACCESS_KEY_ID,
     CONF_AWS_SECRET_ACCESS_KEY,
     CONF_AWS_REGION_NAME,
+    CONF_MEDIA_WORKERS,
+    CONF_MEDIA_BACKEND,
+    DEFAULT_MEDIA_WORKERS,
+    DEFAULT_MEDIA_BACKEND,
+    CONF_IMAGE_FORMAT,
+    CONF_IMAGE_QUALITY,
+    CONF_IMAGE_SUBSAMPLING,
+    CONF_IMAGE_OPTIMIZE,
+    CONF_IMAGE_PROGRESSIVE,
+    DEFAULT_IMAGE_FORMAT,
+    DEFAULT_IMAGE_QUALITY,
+    DEFAULT_IMAGE_SUBSAMPLING,
+    DEFAULT_IMAGE_OPTIMIZE,
+    DEFAULT_IMAGE_PROGRESSIVE,
+    CONF_IMAGE_CACHE_SIZE,
+    DEFAULT_IMAGE_CACHE_SIZE,
+    CONF_FRAME_EXTRACTION,
+    DEFAULT_FRAME_EXTRACTION,
+    FRAME_EXTRACTION_FILES,
+    FRAME_EXTRACTION_PIPE,
+    CONF_SCENE_THRESHOLD,
+    DEFAULT_SCENE_THRESHOLD,
+    CONF_TMP_PATH,
+    CONF_STREAM_CLIPS,
+    DEFAULT_STREAM_CLIPS,
+    CONF_FFMPEG_JOBS,
+    DEFAULT_FFMPEG_JOBS,
+    CONF_FFMPEG_TIMEOUT,
+    DEFAULT_FFMPEG_TIMEOUT,
+    CONF_FFMPEG_NICE,
+    DEFAULT_FFMPEG_NICE,
+    CONF_FFMPEG_IONICE,
+    DEFAULT_FFMPEG_IONICE,
+    IONICE_NONE,
+    IONICE_BEST_EFFORT,
+    IONICE_IDLE,
+    CONF_FFMPEG_THREADS,
+    DEFAULT_FFMPEG_THREADS,
+    CONF_FRAME_CACHE_SIZE,
+    DEFAULT_FRAME_CACHE_SIZE,
+    CONF_FRAME_CACHE_TTL,
+    DEFAULT_FRAME_CACHE_TTL,
+    MEDIA_BACKEND_THREADS,
+    MEDIA_BACKEND_PROCESSES,
     DEFAULT_TITLE_PROMPT,
     DEFAULT_SYSTEM_PROMPT,
     DEFAULT_OPENAI_MODEL,
@@ -1333,6 +1377,246 @@ class llmvisionConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     ),
                     {"collapsed": True},
                 ),
+                vol.Optional("performance_section"): section(
+                    vol.Schema(
+                        {
+                            vol.Optional(
+                                CONF_MEDIA_WORKERS, default=DEFAULT_MEDIA_WORKERS
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 1,
+                                        "max": 16,
+                                        "step": 1,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_MEDIA_BACKEND, default=DEFAULT_MEDIA_BACKEND
+                            ): selector(
+                                {
+                                    "select": {
+                                        "options": [
+                                            {
+                                                "label": "Threads",
+                                                "value": MEDIA_BACKEND_THREADS,
+                                            },
+                                            {
+                                                "label": "Processes",
+                                                "value": MEDIA_BACKEND_PROCESSES,
+                                            },
+                                        ],
+                                        "mode": "dropdown",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_IMAGE_FORMAT, default=DEFAULT_IMAGE_FORMAT
+                            ): selector(
+                                {
+                                    "select": {
+                                        "options": [
+                                            {"label": "JPEG", "value": "JPEG"},
+                                            {"label": "WebP", "value": "WEBP"},
+                                        ],
+                                        "mode": "dropdown",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_IMAGE_QUALITY, default=DEFAULT_IMAGE_QUALITY
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 30,
+                                        "max": 100,
+                                        "step": 5,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_IMAGE_SUBSAMPLING,
+                                default=DEFAULT_IMAGE_SUBSAMPLING,
+                            ): selector(
+                                {
+                                    "select": {
+                                        "options": ["4:4:4", "4:2:2", "4:2:0"],
+                                        "mode": "dropdown",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_IMAGE_OPTIMIZE, default=DEFAULT_IMAGE_OPTIMIZE
+                            ): selector({"boolean": {}}),
+                            vol.Optional(
+                                CONF_IMAGE_PROGRESSIVE,
+                                default=DEFAULT_IMAGE_PROGRESSIVE,
+                            ): selector({"boolean": {}}),
+                            vol.Optional(
+                                CONF_IMAGE_CACHE_SIZE,
+                                default=DEFAULT_IMAGE_CACHE_SIZE,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 0,
+                                        "max": 512,
+                                        "step": 16,
+                                        "unit_of_measurement": "MB",
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FRAME_EXTRACTION,
+                                default=DEFAULT_FRAME_EXTRACTION,
+                            ): selector(
+                                {
+                                    "select": {
+                                        "options": [
+                                            {
+                                                "label": "Files",
+                                                "value": FRAME_EXTRACTION_FILES,
+                                            },
+                                            {
+                                                "label": "Pipe",
+                                                "value": FRAME_EXTRACTION_PIPE,
+                                            },
+                                        ],
+                                        "mode": "dropdown",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_SCENE_THRESHOLD,
+                                default=DEFAULT_SCENE_THRESHOLD,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 0,
+                                        "max": 1,
+                                        "step": 0.05,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_STREAM_CLIPS,
+                                default=DEFAULT_STREAM_CLIPS,
+                            ): selector({"boolean": {}}),
+                            vol.Optional(
+                                CONF_FFMPEG_JOBS,
+                                default=DEFAULT_FFMPEG_JOBS,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 1,
+                                        "max": 8,
+                                        "step": 1,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FFMPEG_TIMEOUT,
+                                default=DEFAULT_FFMPEG_TIMEOUT,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 30,
+                                        "max": 900,
+                                        "step": 30,
+                                        "unit_of_measurement": "s",
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FFMPEG_NICE,
+                                default=DEFAULT_FFMPEG_NICE,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 0,
+                                        "max": 19,
+                                        "step": 1,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FFMPEG_IONICE,
+                                default=DEFAULT_FFMPEG_IONICE,
+                            ): selector(
+                                {
+                                    "select": {
+                                        "options": [
+                                            {
+                                                "label": "None",
+                                                "value": IONICE_NONE,
+                                            },
+                                            {
+                                                "label": "Best effort",
+                                                "value": IONICE_BEST_EFFORT,
+                                            },
+                                            {
+                                                "label": "Idle",
+                                                "value": IONICE_IDLE,
+                                            },
+                                        ],
+                                        "mode": "dropdown",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FFMPEG_THREADS,
+                                default=DEFAULT_FFMPEG_THREADS,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 0,
+                                        "max": 8,
+                                        "step": 1,
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FRAME_CACHE_SIZE,
+                                default=DEFAULT_FRAME_CACHE_SIZE,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 0,
+                                        "max": 500,
+                                        "step": 10,
+                                        "unit_of_measurement": "MB",
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(
+                                CONF_FRAME_CACHE_TTL,
+                                default=DEFAULT_FRAME_CACHE_TTL,
+                            ): selector(
+                                {
+                                    "number": {
+                                        "min": 1,
+                                        "max": 168,
+                                        "step": 1,
+                                        "unit_of_measurement": "h",
+                                        "mode": "slider",
+                                    }
+                                }
+                            ),
+                            vol.Optional(CONF_TMP_PATH): selector(
+                                {"text": {}}
+                            ),
+                        }
+                    ),
+                    {"collapsed": True},
+                ),
             }
         )
 
@@ -1367,6 +1651,63 @@ class llmvisionConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 CONF_MEMORY_PATHS: self.init_info.get(CONF_MEMORY_PATHS),
                 CONF_MEMORY_STRINGS: self.init_info.get(CONF_MEMORY_STRINGS),
             },
+            "performance_section": {
+                CONF_MEDIA_WORKERS: self.init_info.get(
+                    CONF_MEDIA_WORKERS, DEFAULT_MEDIA_WORKERS
+                ),
+                CONF_MEDIA_BACKEND: self.init_info.get(
+                    CONF_MEDIA_BACKEND, DEFAULT_MEDIA_BACKEND
+                ),
+                CONF_IMAGE_FORMAT: self.init_info.get(
+                    CONF_IMAGE_FORMAT, DEFAULT_IMAGE_FORMAT
+                ),
+                CONF_IMAGE_QUALITY: self.init_info.get(
+                    CONF_IMAGE_QUALITY, DEFAULT_IMAGE_QUALITY
+                ),
+                CONF_IMAGE_SUBSAMPLING: self.init_info.get(
+                    CONF_IMAGE_SUBSAMPLING, DEFAULT_IMAGE_SUBSAMPLING
+                ),
+                CONF_IMAGE_OPTIMIZE: self.init_info.get(
+                    CONF_IMAGE_OPTIMIZE, DEFAULT_IMAGE_OPTIMIZE
+                ),
+                CONF_IMAGE_PROGRESSIVE: self.init_info.get(
+                    CONF_IMAGE_PROGRESSIVE, DEFAULT_IMAGE_PROGRESSIVE
+                ),
+                CONF_IMAGE_CACHE_SIZE: self.init_info.get(
+                    CONF_IMAGE_CACHE_SIZE, DEFAULT_IMAGE_CACHE_SIZE
+                ),
+                CONF_FRAME_EXTRACTION: self.init_info.get(
+                    CONF_FRAME_EXTRACTION, DEFAULT_FRAME_EXTRACTION
+                ),
+                CONF_SCENE_THRESHOLD: self.init_info.get(
+                    CONF_SCENE_THRESHOLD, DEFAULT_SCENE_THRESHOLD
+                ),
+                CONF_STREAM_CLIPS: self.init_info.get(
+                    CONF_STREAM_CLIPS, DEFAULT_STREAM_CLIPS
+                ),
+                CONF_FFMPEG_JOBS: self.init_info.get(
+                    CONF_FFMPEG_JOBS, DEFAULT_FFMPEG_JOBS
+                ),
+                CONF_FFMPEG_TIMEOUT: self.init_info.get(
+                    CONF_FFMPEG_TIMEOUT, DEFAULT_FFMPEG_TIMEOUT
+                ),
+                CONF_FFMPEG_NICE: self.init_info.get(
+                    CONF_FFMPEG_NICE, DEFAULT_FFMPEG_NICE
+                ),
+                CONF_FFMPEG_IONICE: self.init_info.get(
+                    CONF_FFMPEG_IONICE, DEFAULT_FFMPEG_IONICE
+                ),
+                CONF_FFMPEG_THREADS: self.init_info.get(
+                    CONF_FFMPEG_THREADS, DEFAULT_FFMPEG_THREADS
+                ),
+                CONF_FRAME_CACHE_SIZE: self.init_info.get(
+                    CONF_FRAME_CACHE_SIZE, DEFAULT_FRAME_CACHE_SIZE
+                ),
+                CONF_FRAME_CACHE_TTL: self.init_info.get(
+                    CONF_FRAME_CACHE_TTL, DEFAULT_FRAME_CACHE_TTL
+                ),
+                CONF_TMP_PATH: self.init_info.get(CONF_TMP_PATH, ""),
+            },
         }
         data_schema = self.add_suggested_values_to_schema(data_schema, suggested)
 
@@ -43,6 +43,64 @@ CONF_TITLE_PROMPT = "title_prompt"
 CONF_MEMORY_PATHS = "memory_paths"
 CONF_MEMORY_IMAGES_ENCODED = "memory_images_encoded"
 CONF_MEMORY_STRINGS = "memory_strings"
+CONF_MEDIA_WORKERS = "media_workers"
+CONF_MEDIA_BACKEND = "media_backend"
+CONF_IMAGE_FORMAT = "image_format"
+CONF_IMAGE_QUALITY = "image_quality"
+CONF_IMAGE_SUBSAMPLING = "image_subsampling"
+CONF_IMAGE_OPTIMIZE = "image_optimize"
+CONF_IMAGE_PROGRESSIVE = "image_progressive"
+CONF_IMAGE_CACHE_SIZE = "image_cache_size"
+CONF_FRAME_EXTRACTION = "frame_extraction"
+CONF_SCENE_THRESHOLD = "scene_threshold"
+CONF_TMP_PATH = "tmp_path"
+CONF_STREAM_CLIPS = "stream_clips"
+CONF_FFMPEG_JOBS = "ffmpeg_jobs"
+CONF_FFMPEG_TIMEOUT = "ffmpeg_timeout"
+CONF_FFMPEG_NICE = "ffmpeg_nice"
+CONF_FFMPEG_IONICE = "ffmpeg_ionice"
+CONF_FFMPEG_THREADS = "ffmpeg_threads"
+CONF_FRAME_CACHE_SIZE = "frame_cache_size"
+CONF_FRAME_CACHE_TTL = "frame_cache_ttl"
+
+# Media processing
+DATA_MEDIA_EXECUTOR = f"{DOMAIN}_media_executor"
+DATA_RETIRED_EXECUTORS = f"{DOMAIN}_retired_executors"
+DEFAULT_MEDIA_WORKERS = 2
+MEDIA_BACKEND_THREADS = "threads"
+MEDIA_BACKEND_PROCESSES = "processes"
+DEFAULT_MEDIA_BACKEND = MEDIA_BACKEND_THREADS
+MEDIA_PROCESS_START_TIMEOUT = 30
+MEDIA_QUEUE_PER_WORKER = 4
+DATA_ENCODER_PROFILE = f"{DOMAIN}_encoder_profile"
+DEFAULT_IMAGE_FORMAT = "JPEG"
+DEFAULT_IMAGE_QUALITY = 75
+DEFAULT_IMAGE_SUBSAMPLING = "4:2:0"
+DEFAULT_IMAGE_OPTIMIZE = True
+DEFAULT_IMAGE_PROGRESSIVE = False
+DATA_IMAGE_CACHE = f"{DOMAIN}_image_cache"
+DEFAULT_IMAGE_CACHE_SIZE = 64  # MB
+DATA_FRAME_EXTRACTION = f"{DOMAIN}_frame_extraction"
+FRAME_EXTRACTION_FILES = "files"
+FRAME_EXTRACTION_PIPE = "pipe"
+DEFAULT_FRAME_EXTRACTION = FRAME_EXTRACTION_FILES
+DEFAULT_SCENE_THRESHOLD = 0.0  # disabled
+DEFAULT_STREAM_CLIPS = False
+DATA_FFMPEG_SCHEDULER = f"{DOMAIN}_ffmpeg_scheduler"
+DEFAULT_FFMPEG_JOBS = 2
+DEFAULT_FFMPEG_TIMEOUT = 300  # seconds
+DATA_PROCESS_SUPERVISOR = f"{DOMAIN}_process_supervisor"
+DATA_RETIRED_SUPERVISORS = f"{DOMAIN}_retired_supervisors"
+IONICE_NONE = "none"
+IONICE_BEST_EFFORT = "best_effort"
+IONICE_IDLE = "idle"
+DEFAULT_FFMPEG_NICE = 10
+DEFAULT_FFMPEG_IONICE = IONICE_BEST_EFFORT
+DEFAULT_FFMPEG_THREADS = 0  # ffmpeg decides
+DATA_TMP_PATH = f"{DOMAIN}_tmp_path"
+DATA_FRAME_CACHE = f"{DOMAIN}_frame_cache"
+DEFAULT_FRAME_CACHE_SIZE = 50  # MB
+DEFAULT_FRAME_CACHE_TTL = 24  # hours
 
 
 # SERVICE CALL CONSTANTS
@@ -63,6 +121,9 @@ FRIGATE_RETRY_ATTEMPTS = "frigate_retry_attempts"
 FRIGATE_RETRY_SECONDS = "frigate_retry_seconds"
 MAX_FRAMES = "max_frames"
 MIN_FRAMES_PER_CAMERA = "min_frames_per_camera"
+FRAME_SELECTION = "frame_selection"
+CROP_TO_MOTION = "crop_to_motion"
+MOSAIC = "mosaic"
 INCLUDE_FILENAME = "include_filename"
 EXPOSE_IMAGES = "expose_images"
 GENERATE_TITLE = "generate_title"
@@ -70,6 +131,10 @@ SENSOR_ENTITY = "sensor_entity"
 RESPONSE_FORMAT = "response_format"
 STRUCTURE = "structure"
 
+# Frame selection modes
+FRAME_SELECTION_SSIM = "ssim"
+FRAME_SELECTION_DIVERSITY = "diversity"
+
 # Error messages
 ERROR_NOT_CONFIGURED = "{provider} is not configured"
 ERROR_GROQ_MULTIPLE_IMAGES = "Groq does not support videos or streams"
@@ -0,0 +1,190 @@
+"""Downloading clips that may not be available yet, e.g. Frigate event clips"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+from urllib.parse import urlparse
+
+import aiohttp
+from aiofile import async_open
+from multidict import CIMultiDict
+
+_LOGGER = logging.getLogger(__name__)
+
+# Upper bound of the backoff between two attempts, before jitter
+MAX_RETRY_DELAY = 30  # seconds
+
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)")
+
+# Event clips served by the Frigate integration, see add_videos
+FRIGATE_CLIP = re.compile(r"/api/frigate/notifications/[^/]+/clip\.mp4")
+
+
+def is_frigate_clip(url):
+    """Whether url is a Frigate event clip, which may not be available yet"""
+    return FRIGATE_CLIP.fullmatch(urlparse(url).path) is not None
+
+
+def backoff_delay(attempt, retry_seconds, rng=random):
+    """Seconds to wait after a failed attempt
+
+    The delay doubles with each attempt, up to MAX_RETRY_DELAY. A random
+    part of up to half the delay keeps calls for the same event from
+    retrying in lockstep.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 1
+        retry_seconds (float): Delay after the first attempt
+        rng (random.Random, optional): Source of the jitter
+    """
+    delay = min(retry_seconds * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _probe(session, url, ranged):
+    """Status and headers of url, from a HEAD request or a GET of its first byte
+
+    The headers are a copy that outlives the response, with case-insensitive
+    names like the response's own.
+    """
+    if not ranged:
+        async with session.head(url, allow_redirects=True) as response:
+            return response.status, CIMultiDict(response.headers)
+    async with session.get(url, headers={"Range": "bytes=0-0"}) as response:
+        headers = CIMultiDict(response.headers)
+        match = CONTENT_RANGE.fullmatch(headers.get("Content-Range", ""))
+        if response.status == 206 and match and match[2] != "*":
+            # Length of the clip, not of the requested byte
+            headers["Content-Length"] = match[2]
+        return response.status, headers
+
+
+async def wait_until_ready(session, url, attempts=2, retry_seconds=1):
+    """Poll url until the clip can be downloaded
+
+    Frigate only serves an event clip once the recording segments of the
+    event are written, a clip requested right after the event is missing.
+    The clip is polled with HEAD requests, or with GET requests for its
+    first byte if the server doesn't support HEAD. Only a missing (404) or
+    empty clip is polled again, other statuses don't tell whether the clip
+    can be downloaded.
+
+    Args:
+        session (aiohttp.ClientSession): Session to poll with
+        url (str): URL of the clip
+        attempts (int): Number of requests before giving up
+        retry_seconds (float): Delay after the first request, see backoff_delay
+
+    Returns:
+        CIMultiDict: Response headers once the clip is ready, empty if the
+            probe is refused, None if the clip is still missing
+    """
+    ranged = False
+    for attempt in range(1, attempts + 1):
+        try:
+            status, headers = await _probe(session, url, ranged)
+            if status in (405, 501) and not ranged:
+                _LOGGER.debug(f"HEAD not supported for {url}, polling with GET")
+                ranged = True
+                status, headers = await _probe(session, url, ranged)
+            if 200 <= status < 300 and headers.get("Content-Length") != "0":
+                return headers
+            if not 200 <= status < 300 and status != 404:
+                _LOGGER.debug(f"Probing {url} failed (status code {status})")
+                return CIMultiDict()
+            reason = f"status code {status}"
+        except (aiohttp.ClientError, TimeoutError) as e:
+            reason = str(e) or type(e).__name__
+        _LOGGER.info(f"{url} is not ready ({reason}), attempt {attempt}/{attempts}")
+        if attempt < attempts:
+            await asyncio.sleep(backoff_delay(attempt, retry_seconds))
+    return None
+
+
+def clip_version(headers):
+    """Version of a clip from its response headers, None if they have none
+
+    The ETag, or else Last-Modified with Content-Length, changes when the
+    clip does, e.g. a Frigate clip requested before its event ended.
+    """
+    if headers.get("ETag"):
+        return headers["ETag"]
+    if headers.get("Last-Modified") and headers.get("Content-Length"):
+        return f"{headers['Last-Modified']}/{headers['Content-Length']}"
+    return None
+
+
+async def download(session, url, target_file, attempts=2, retry_seconds=1):
+    """Download url to target_file, resuming an interrupted download
+
+    If target_file already holds the start of the clip, e.g. from a failed
+    attempt, only the rest is requested with a Range request. Servers that
+    ignore the range send the whole clip, which replaces the file.
+
+    Args:
+        session (aiohttp.ClientSession): Session to download with
+        url (str): URL of the clip
+        target_file (str): File to write the clip to
+        attempts (int): Number of requests before giving up
+        retry_seconds (float): Delay after the first request, see backoff_delay
+
+    Returns:
+        int: Size of the downloaded clip in bytes
+
+    Raises:
+        ValueError: If the clip couldn't be downloaded
+    """
+    loop = asyncio.get_running_loop()
+    error = None
+    for attempt in range(1, attempts + 1):
+        offset = await loop.run_in_executor(None, _file_size, target_file)
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        try:
+            async with session.get(url, headers=headers) as response:
+                content_range = response.headers.get("Content-Range", "")
+                match = CONTENT_RANGE.fullmatch(content_range)
+                if response.status == 416 and match and match[2] == str(offset):
+                    # The previous attempt got the whole clip
+                    return offset
+                if response.status == 416 or (
+                    response.status == 206 and (not match or match[1] != str(offset))
+                ):
+                    # Don't resume from a file the server doesn't agree with
+                    await loop.run_in_executor(None, _remove, target_file)
+                    raise ValueError(f"unexpected Content-Range {content_range!r}")
+                if not response.ok:
+                    raise ValueError(f"status code {response.status}")
+                if response.status != 206:
+                    offset = 0
+                elif offset:
+                    _LOGGER.info(f"Resuming download of {url} at {offset} bytes")
+                async with async_open(target_file, "ab" if offset else "wb") as output:
+                    async for data in response.content.iter_any():
+                        await output.write(data)
+                        offset += len(data)
+                _LOGGER.debug(f"Downloaded {offset} bytes into {target_file}")
+                return offset
+        except (aiohttp.ClientError, TimeoutError, ValueError) as e:
+            error = str(e) or type(e).__name__
+        _LOGGER.warning(
+            f"Downloading {url} failed ({error}), attempt {attempt}/{attempts}"
+        )
+        if attempt < attempts:
+            await asyncio.sleep(backoff_delay(attempt, retry_seconds))
+    raise ValueError(f"Couldn't download {url} after {attempts} attempts: {error}")
@@ -0,0 +1,293 @@
+"""Bounded executor for CPU bound image processing"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+from .const import (
+    CONF_MEDIA_BACKEND,
+    CONF_MEDIA_WORKERS,
+    DATA_MEDIA_EXECUTOR,
+    DATA_RETIRED_EXECUTORS,
+    DEFAULT_MEDIA_BACKEND,
+    DEFAULT_MEDIA_WORKERS,
+    MEDIA_BACKEND_PROCESSES,
+    MEDIA_BACKEND_THREADS,
+    MEDIA_PROCESS_START_TIMEOUT,
+    MEDIA_QUEUE_PER_WORKER,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _process_context():
+    """Start method for worker processes
+
+    Forking Home Assistant with all its threads is unsafe, so workers are
+    started from a clean forkserver process where available, else spawned.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+
+
+def _call_timed(func, args, kwargs):
+    """Run func in a worker process and report when it started"""
+    return time.time(), func(*args, **kwargs)
+
+
+class MediaExecutor:
+    """Dedicated pool for decoding, scoring, resizing and encoding images
+
+    Keeps image work off the Home Assistant event loop and out of the shared
+    default executor. At most max_queue jobs are handed to the pool at once,
+    further callers wait on the event loop until a slot frees up.
+
+    With the processes backend, run_cpu jobs are executed in worker processes
+    so they are not limited by the GIL. Frames are passed as encoded bytes and
+    returned pickled. If worker processes can't be started, or the pool
+    breaks, run_cpu falls back to the thread pool.
+
+    Args:
+        max_workers (int): Number of worker threads (and processes)
+        max_queue (int, optional): Maximum number of jobs queued or running in the pool
+        backend (str): "threads" or "processes"
+    """
+
+    def __init__(
+        self, max_workers=DEFAULT_MEDIA_WORKERS, max_queue=None, backend=DEFAULT_MEDIA_BACKEND
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue or max_workers * MEDIA_QUEUE_PER_WORKER
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llmvision_media"
+        )
+        self._processes = None
+        self._closed = False
+        self._retired = False
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._lock = threading.Lock()
+        # Metrics
+        self.waiting = 0
+        self.pending = 0
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.total_wait_time = 0.0
+
+    def start_processes(self) -> bool:
+        """Start the worker processes, blocking. Returns False if not available"""
+        pool = None
+        try:
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=_process_context()
+            )
+            # Workers are started lazily, make sure one can actually be started
+            pool.submit(os.getpid).result(timeout=MEDIA_PROCESS_START_TIMEOUT)
+        except Exception as e:
+            _LOGGER.warning(
+                f"Couldn't start media worker processes, using threads instead: {e}"
+            )
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            return False
+        if self._closed:
+            pool.shutdown(wait=False, cancel_futures=True)
+            return False
+        self._processes = pool
+        _LOGGER.debug(f"Started media worker processes ({self.max_workers})")
+        return True
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the thread pool and return its result"""
+        return await self._bounded(self._run_thread, func, args, kwargs)
+
+    async def run_cpu(self, func, *args, **kwargs):
+        """Run a pure, picklable function on the worker processes
+
+        func must be importable at module level and its arguments and result
+        must be picklable. Runs on the thread pool when the processes backend
+        is not used or not available.
+        """
+        pool = self._processes
+        if pool is not None:
+            try:
+                return await self._bounded(self._run_process, pool, func, args, kwargs)
+            except BrokenProcessPool as e:
+                self._stop_processes(f"Media worker process pool broke: {e}")
+        return await self.run(func, *args, **kwargs)
+
+    async def _bounded(self, submit, *args):
+        """Wait for a free slot, then run submit(*args)"""
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            self.waiting -= 1
+            self._shutdown_if_idle()
+            raise
+        self.waiting -= 1
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await submit(*args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._slots.release()
+            self._shutdown_if_idle()
+
+    async def _run_thread(self, func, args, kwargs):
+        submitted = time.monotonic()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(self._execute, submitted, func, *args, **kwargs)
+        )
+
+    async def _run_process(self, pool, func, args, kwargs):
+        # Wall clock time, monotonic clocks aren't comparable across processes
+        submitted = time.time()
+        started, result = await asyncio.wrap_future(
+            pool.submit(_call_timed, func, args, kwargs)
+        )
+        self.total_wait_time += max(0.0, started - submitted)
+        return result
+
+    def _execute(self, submitted, func, *args, **kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self.running += 1
+            self.total_wait_time += started - submitted
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _stop_processes(self, reason):
+        pool, self._processes = self._processes, None
+        if pool is not None:
+            _LOGGER.warning(f"{reason}, falling back to threads")
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def stats(self) -> dict:
+        """Queue depth and throughput metrics"""
+        if self._processes is not None:
+            # Jobs in worker processes can't report back while they run
+            running = min(self.pending, self.max_workers)
+        else:
+            running = self.running
+        return {
+            "backend": (
+                MEDIA_BACKEND_PROCESSES
+                if self._processes is not None
+                else MEDIA_BACKEND_THREADS
+            ),
+            "workers": self.max_workers,
+            "running": running,
+            "queued": self.pending - running,
+            "waiting": self.waiting,
+            "peak_queue_depth": self.peak_pending,
+            "completed": self.completed,
+            "average_wait_ms": round(
+                1000 * self.total_wait_time / max(self.completed, 1), 2
+            ),
+        }
+
+    def retire(self):
+        """Shut down once the jobs running or waiting for a slot have finished
+
+        Calls in flight when Settings are reloaded finish their jobs here,
+        while new jobs go to the executor replacing this one.
+        """
+        self._retired = True
+        self._shutdown_if_idle()
+
+    def _shutdown_if_idle(self):
+        if self._retired and not self._closed and not (self.pending or self.waiting):
+            _LOGGER.debug("Retired media executor is idle, shutting it down")
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop accepting work and cancel jobs that haven't started"""
+        self._closed = True
+        pool, self._processes = self._processes, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _retired_executors(hass) -> weakref.WeakSet:
+    """Executors still finishing jobs after a reload
+
+    Home Assistant stopping shuts them down along with the current one. The
+    stop listener is registered with the set, once, so reloads don't add
+    listeners. Retired executors drop out once nothing uses them anymore.
+    """
+    retired = hass.data.get(DATA_RETIRED_EXECUTORS)
+    if retired is None:
+        retired = hass.data[DATA_RETIRED_EXECUTORS] = weakref.WeakSet()
+
+        def _shutdown(event):
+            shutdown_media_executor(hass)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _shutdown)
+    return retired
+
+
+def setup_media_executor(hass, config: dict) -> MediaExecutor:
+    """Create the media executor from Settings, replacing an existing one
+
+    Jobs running on the previous executor finish, new jobs use the new one.
+    """
+    workers = int(config.get(CONF_MEDIA_WORKERS) or DEFAULT_MEDIA_WORKERS)
+    backend = config.get(CONF_MEDIA_BACKEND) or DEFAULT_MEDIA_BACKEND
+    retire_media_executor(hass)
+
+    _LOGGER.debug(f"Starting media executor with {workers} workers ({backend})")
+    executor = MediaExecutor(max_workers=workers, backend=backend)
+    hass.data[DATA_MEDIA_EXECUTOR] = executor
+    if backend == MEDIA_BACKEND_PROCESSES:
+        # Uses threads until the worker processes are up
+        hass.loop.run_in_executor(None, executor.start_processes)
+    return executor
+
+
+def get_media_executor(hass) -> MediaExecutor:
+    """Return the shared media executor, create it with defaults if needed"""
+    executor = hass.data.get(DATA_MEDIA_EXECUTOR)
+    if executor is None:
+        executor = setup_media_executor(hass, {})
+    return executor
+
+
+def shutdown_media_executor(hass) -> None:
+    """Shut down and forget the shared media executor and retired ones"""
+    executor = hass.data.pop(DATA_MEDIA_EXECUTOR, None)
+    if executor is not None:
+        executor.shutdown()
+    retired = hass.data.get(DATA_RETIRED_EXECUTORS)
+    if retired:
+        for executor in list(retired):
+            executor.shutdown()
+        retired.clear()
+
+
+def retire_media_executor(hass) -> None:
+    """Forget the shared media executor, it shuts down once its jobs finished"""
+    retired = _retired_executors(hass)
+    executor = hass.data.pop(DATA_MEDIA_EXECUTOR, None)
+    if executor is not None:
+        executor.retire()
+        if not executor._closed:
+            retired.add(executor)
@@ -0,0 +1,289 @@
+"""Decoded frame shared by scoring, resizing, exposing and encoding"""
+
+import io
+from PIL import Image, UnidentifiedImageError
+
+from .const import (
+    CONF_IMAGE_FORMAT,
+    CONF_IMAGE_OPTIMIZE,
+    CONF_IMAGE_PROGRESSIVE,
+    CONF_IMAGE_QUALITY,
+    CONF_IMAGE_SUBSAMPLING,
+    DEFAULT_IMAGE_FORMAT,
+    DEFAULT_IMAGE_OPTIMIZE,
+    DEFAULT_IMAGE_PROGRESSIVE,
+    DEFAULT_IMAGE_QUALITY,
+    DEFAULT_IMAGE_SUBSAMPLING,
+)
+from .similarity import gray_proxy
+
+# Reduce by an integer factor first when downscaling by more than this factor,
+# the final resample then only works on the reduced image
+REDUCING_GAP = 3.0
+
+
+def convert_to_rgb(img):
+    """Convert image to a mode that can be saved as JPEG"""
+    if img.mode not in ("RGB", "L") or img.format == "GIF":
+        img = img.convert("RGB")
+    return img
+
+
+# Leading bytes of encoded images by mime type
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"RIFF": "image/webp",
+    b"\x89PNG": "image/png",
+    b"GIF8": "image/gif",
+}
+
+# Leading characters of base64 encoded images by mime type
+BASE64_SIGNATURES = {
+    "/9j/": "image/jpeg",
+    "UklGR": "image/webp",
+    "iVBORw0KGgo": "image/png",
+    "R0lGOD": "image/gif",
+}
+
+
+def image_mime_type(image):
+    """Mime type of an encoded image (bytes or base64 str), sniffed from its first bytes"""
+    signatures = BASE64_SIGNATURES if isinstance(image, str) else IMAGE_SIGNATURES
+    for signature, mime_type in signatures.items():
+        if image[: len(signature)] == signature:
+            return mime_type
+    return "image/jpeg"
+
+
+class EncoderProfile:
+    """Format and settings used to encode images sent to the LLM
+
+    Args:
+        format (str): "JPEG" or "WEBP"
+        quality (int): Quality from 1 (smallest) to 100 (best)
+        subsampling (str): JPEG chroma subsampling: "4:4:4", "4:2:2" or "4:2:0"
+        optimize (bool): Compute optimal Huffman tables (JPEG), slightly smaller files
+        progressive (bool): Write progressive JPEGs
+    """
+
+    def __init__(
+        self,
+        format=DEFAULT_IMAGE_FORMAT,
+        quality=DEFAULT_IMAGE_QUALITY,
+        subsampling=DEFAULT_IMAGE_SUBSAMPLING,
+        optimize=DEFAULT_IMAGE_OPTIMIZE,
+        progressive=DEFAULT_IMAGE_PROGRESSIVE,
+    ):
+        self.format = format.upper()
+        self.quality = int(quality)
+        self.subsampling = subsampling
+        self.optimize = optimize
+        self.progressive = progressive
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Create the profile from the Settings config entry"""
+        return cls(
+            format=config.get(CONF_IMAGE_FORMAT, DEFAULT_IMAGE_FORMAT),
+            quality=config.get(CONF_IMAGE_QUALITY, DEFAULT_IMAGE_QUALITY),
+            subsampling=config.get(CONF_IMAGE_SUBSAMPLING, DEFAULT_IMAGE_SUBSAMPLING),
+            optimize=config.get(CONF_IMAGE_OPTIMIZE, DEFAULT_IMAGE_OPTIMIZE),
+            progressive=config.get(CONF_IMAGE_PROGRESSIVE, DEFAULT_IMAGE_PROGRESSIVE),
+        )
+
+    @property
+    def mime_type(self):
+        return "image/webp" if self.format == "WEBP" else "image/jpeg"
+
+    @property
+    def key(self):
+        """Identifies the encoder settings, frames encoded with equal keys are identical"""
+        return (
+            self.format,
+            self.quality,
+            self.subsampling,
+            self.optimize,
+            self.progressive,
+        )
+
+    def save_kwargs(self) -> dict:
+        """Keyword arguments for PIL.Image.save"""
+        if self.format == "WEBP":
+            return {"format": "WEBP", "quality": self.quality}
+        return {
+            "format": "JPEG",
+            "quality": self.quality,
+            "subsampling": self.subsampling,
+            "optimize": self.optimize,
+            "progressive": self.progressive,
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, EncoderProfile) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"EncoderProfile{self.key}"
+
+
+# Plain JPEG, used for exposed images
+DEFAULT_ENCODER_PROFILE = EncoderProfile()
+
+
+def encode_image(image, profile=DEFAULT_ENCODER_PROFILE):
+    """Encode a decoded image with the given profile"""
+    buffer = io.BytesIO()
+    image.save(buffer, **profile.save_kwargs())
+    return buffer.getvalue()
+
+
+def can_pass_through(data, target_width, profile=DEFAULT_ENCODER_PROFILE):
+    """Whether an encoded image can be sent as it is, without decoding it
+
+    True for RGB or grayscale JPEGs no wider than target_width when the
+    encoder profile is JPEG. Only the header is parsed.
+    """
+    if profile.format != "JPEG":
+        return False
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return (
+                img.format == "JPEG"
+                and img.mode in ("RGB", "L")
+                and img.width <= target_width
+            )
+    except (UnidentifiedImageError, OSError):
+        return False
+
+
+class Frame:
+    """A single image that is decoded at most once and encoded at most once per size
+
+    All methods are synchronous and CPU bound. Call them from an executor.
+    Frames can be pickled, so they can be decoded in a worker process.
+
+    Args:
+        image (PIL.Image.Image): Decoded image, already scaled to the size sent to the LLM
+        gray (np.ndarray, optional): Small grayscale proxy used for similarity scoring
+        source (bytes, optional): Original encoded bytes, used for full size exposure
+        source_format (str, optional): PIL format of source (e.g. "JPEG")
+    """
+
+    def __init__(self, image, gray=None, source=None, source_format=None):
+        self.image = image
+        self.source = source
+        self.source_format = source_format
+        self._gray = gray
+        # Encoded image by encoder profile key
+        self.encoded = {}
+        # Key of the frame in the image cache, if cached
+        self.cache_key = None
+
+    @classmethod
+    def decode(cls, data, target_width=None, keep_source=False):
+        """Decode encoded image bytes once
+
+        JPEG images are decoded directly at the smallest 1/2, 1/4 or 1/8 scale
+        that is still at least target_width wide (DCT domain downscaling), other
+        formats are reduced by an integer factor before the final resample.
+        The grayscale proxy for scoring is computed right away, so it is
+        computed in the worker as well.
+
+        Args:
+            data (bytes): Encoded image (JPEG, PNG, GIF, ...)
+            target_width (int, optional): Width the image is sent to the LLM with
+            keep_source (bool): Keep data to expose the original image later
+        """
+        img = Image.open(io.BytesIO(data))
+        if target_width and img.format == "JPEG":
+            width, height = img.size
+            img.draft("RGB", (target_width, int(target_width * height / width)))
+        img.load()
+        image = cls._scale(convert_to_rgb(img), target_width)
+        return cls(
+            image,
+            gray=gray_proxy(image),
+            source=data if keep_source else None,
+            source_format=img.format,
+        )
+
+    @classmethod
+    def open(cls, path, target_width=None, keep_source=False):
+        """Read and decode an image file once"""
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls.decode(data, target_width=target_width, keep_source=keep_source)
+
+    @staticmethod
+    def _scale(img, target_width):
+        """Scale image down to target_width, keeping the aspect ratio"""
+        if not target_width:
+            return img
+        width, height = img.size
+        aspect_ratio = width / height
+        target_height = int(target_width / aspect_ratio)
+
+        # Resize the image only if it's larger than the target size
+        if width > target_width or height > target_height:
+            img = img.resize((target_width, target_height), reducing_gap=REDUCING_GAP)
+        return img
+
+    def crop(self, box):
+        """New frame with the image cropped to box
+
+        Args:
+            box (tuple): (left, top, right, bottom) as fractions of the image size
+        """
+        width, height = self.image.size
+        left, top, right, bottom = box
+        return Frame(
+            self.image.crop(
+                (
+                    round(left * width),
+                    round(top * height),
+                    round(right * width),
+                    round(bottom * height),
+                )
+            )
+        )
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the frame"""
+        width, height = self.image.size
+        nbytes = width * height * len(self.image.getbands())
+        if self._gray is not None:
+            nbytes += self._gray.nbytes
+        if self.source is not None:
+            nbytes += len(self.source)
+        return nbytes + sum(len(encoded) for encoded in self.encoded.values())
+
+    @property
+    def gray(self):
+        """Grayscale proxy of the frame for scoring, computed once"""
+        if self._gray is None:
+            self._gray = gray_proxy(self.image)
+        return self._gray
+
+    def encode(self, profile=DEFAULT_ENCODER_PROFILE):
+        """Encode the (scaled) image, once per encoder profile"""
+        if profile.key not in self.encoded:
+            self.encoded[profile.key] = encode_image(self.image, profile)
+        return self.encoded[profile.key]
+
+    @property
+    def full_size_source(self):
+        """Original bytes if they can be exposed as they are (JPEG), else None"""
+        if self.source is not None and self.source_format == "JPEG":
+            return self.source
+        return None
+
+    def encode_full_size(self):
+        """Encoded image in its original size for exposing
+
+        Reuses the source bytes when they already are a JPEG, otherwise falls
+        back to the scaled encoding.
+        """
+        return self.full_size_source or self.encode()
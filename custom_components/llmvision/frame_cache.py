@@ -0,0 +1,229 @@
+"""Disk cache of the frames selected from video clips"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from functools import partial
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .const import (
+    CONF_FRAME_CACHE_SIZE,
+    CONF_FRAME_CACHE_TTL,
+    DATA_FRAME_CACHE,
+    DEFAULT_FRAME_CACHE_SIZE,
+    DEFAULT_FRAME_CACHE_TTL,
+)
+from .workspace import get_tmp_path
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_CACHE_DIR = "frame_cache"
+INDEX_FILE = "frames.json"
+PARTIAL_PREFIX = ".partial_"
+
+
+def cache_key(*parts):
+    """Key of a cache entry from JSON serializable parts"""
+    data = json.dumps(parts, sort_keys=True).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path):
+    """Hash of a file's content, read in chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(partial(file.read, 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_identity(path):
+    """Path, size and modification time of a file, cheaper than its digest"""
+    stat = os.stat(path)
+    return [os.path.realpath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def clip_id(url):
+    """URL of a clip without the signature, which changes with every call"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != "authSig"]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class FrameCache:
+    """Frames selected from video clips, kept on disk between calls
+
+    A repeated call for the same clip with the same settings reads the
+    selected frames back, instead of downloading the clip, running ffmpeg
+    and scoring the frames again. Each entry is a directory with the frames
+    as JPEG files and an index of their names, scores and motion boxes.
+    Entries expire after ttl seconds. When the entries exceed max_bytes, the
+    least recently used ones are deleted.
+
+    All methods do disk I/O, call them from an executor.
+
+    Args:
+        path (str): Directory of the cache
+        max_bytes (int): Byte budget, 0 disables the cache
+        ttl (float): Seconds an entry is used for
+    """
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """Return the cached frames for key or None
+
+        Returns:
+            list[tuple]: (name, JPEG bytes, score, motion box or None) of each frame
+        """
+        entry = os.path.join(self.path, key)
+        index_file = os.path.join(entry, INDEX_FILE)
+        try:
+            if time.time() - os.stat(index_file).st_mtime > self.ttl:
+                shutil.rmtree(entry, ignore_errors=True)
+                raise FileNotFoundError(entry)
+            with open(index_file) as file:
+                index = json.load(file)
+            frames = []
+            for item in index:
+                with open(os.path.join(entry, item["file"]), "rb") as file:
+                    frames.append((item["name"], file.read(), item["score"], item["box"]))
+            # Marks the entry as recently used
+            os.utime(entry)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frames
+
+    def put(self, key, frames):
+        """Add the frames selected from a clip, evicting entries if needed
+
+        Args:
+            frames (list[tuple]): (name, JPEG bytes, score, motion box or None)
+        """
+        size = sum(len(data) for _, data, _, _ in frames)
+        if not frames or size > self.max_bytes:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        partial_entry = tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=self.path)
+        try:
+            index = []
+            for number, (name, data, score, box) in enumerate(frames):
+                filename = f"{number:03d}.jpg"
+                with open(os.path.join(partial_entry, filename), "wb") as file:
+                    file.write(data)
+                index.append(
+                    {
+                        "name": name,
+                        "file": filename,
+                        "score": float(score),
+                        "box": None if box is None else [float(v) for v in box],
+                    }
+                )
+            with open(os.path.join(partial_entry, INDEX_FILE), "w") as file:
+                json.dump(index, file)
+            # Readers only ever see complete entries
+            entry = os.path.join(self.path, key)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(partial_entry, entry)
+        except OSError as e:
+            _LOGGER.warning(f"Couldn't cache frames in {self.path}: {e}")
+            shutil.rmtree(partial_entry, ignore_errors=True)
+            return
+        self.prune()
+
+    def prune(self):
+        """Delete expired entries, then the least recently used ones over budget"""
+        try:
+            scanned = list(os.scandir(self.path))
+        except FileNotFoundError:
+            scanned = []
+        now = time.time()
+        entries = []
+        for item in scanned:
+            if not item.is_dir(follow_symlinks=False):
+                continue
+            partial_entry = item.name.startswith(PARTIAL_PREFIX)
+            try:
+                used = item.stat().st_mtime
+                if partial_entry:
+                    # Left behind by a restart while writing
+                    created, size = used, 0
+                else:
+                    created = os.stat(os.path.join(item.path, INDEX_FILE)).st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(item.path))
+                expired = now - created > self.ttl
+            except OSError:
+                used, size, expired = 0, 0, True
+            if expired:
+                shutil.rmtree(item.path, ignore_errors=True)
+            elif not partial_entry:
+                entries.append((used, size, item.path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_bytes:
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+        self.size = total
+        self.entries = len(entries)
+
+    @property
+    def stats(self) -> dict:
+        """Hit/miss counters and disk usage as of the last prune"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.entries,
+            "size_mb": round(self.size / 1_000_000, 2),
+            "max_size_mb": round(self.max_bytes / 1_000_000, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 2) if lookups else 0.0,
+        }
+
+
+def setup_frame_cache(hass, config: dict) -> FrameCache:
+    """Create the frame cache from Settings, replacing an existing one
+
+    The cache is kept below the tmp path, set that up first.
+    """
+    size_mb = config.get(CONF_FRAME_CACHE_SIZE)
+    if size_mb is None:
+        size_mb = DEFAULT_FRAME_CACHE_SIZE
+    ttl_hours = config.get(CONF_FRAME_CACHE_TTL) or DEFAULT_FRAME_CACHE_TTL
+    cache = FrameCache(
+        os.path.join(get_tmp_path(hass), FRAME_CACHE_DIR),
+        max_bytes=int(size_mb * 1_000_000),
+        ttl=ttl_hours * 3600,
+    )
+    _LOGGER.debug(f"Frame cache: {size_mb} MB for {ttl_hours} h in {cache.path}")
+    hass.data[DATA_FRAME_CACHE] = cache
+    return cache
+
+
+def get_frame_cache(hass) -> FrameCache:
+    """Return the shared frame cache, create it with defaults if needed"""
+    cache = hass.data.get(DATA_FRAME_CACHE)
+    if cache is None:
+        cache = setup_frame_cache(hass, {})
+    return cache
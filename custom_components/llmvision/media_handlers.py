@@ -1,28 +1,85 @@
 import base64
-import io
 import os
 import uuid
-import shutil
 import logging
 import time
 import asyncio
 import shlex
-from aiofile import async_open
 from datetime import timedelta
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.components.http.auth import async_sign_path
 from homeassistant.components.media_source import is_media_source_id
 from homeassistant.components.media_player import async_process_play_media_url
+from homeassistant.components.camera import async_get_image as async_get_camera_image
+from homeassistant.components.image import async_get_image as async_get_entity_image
+from homeassistant.core import split_entity_id
 
 from urllib.parse import urlparse
+from contextlib import AsyncExitStack, aclosing
 from functools import partial
 from bisect import insort
-from PIL import Image, UnidentifiedImageError
-import numpy as np
+from itertools import chain
+from PIL import UnidentifiedImageError
 from homeassistant.helpers.network import get_url
-from homeassistant.exceptions import ServiceValidationError
-
-from .const import DOMAIN
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+
+from .const import (
+    DOMAIN,
+    DATA_ENCODER_PROFILE,
+    DATA_FRAME_EXTRACTION,
+    FRAME_EXTRACTION_PIPE,
+    FRAME_SELECTION_DIVERSITY,
+    FRAME_SELECTION_SSIM,
+)
+from .executor import get_media_executor
+from .cache import content_hash, get_image_cache
+from .mosaic import build_mosaic
+from .download import clip_version, download, is_frigate_clip, wait_until_ready
+from .frame_cache import (
+    cache_key,
+    clip_id,
+    file_digest,
+    file_identity,
+    get_frame_cache,
+)
+from .scheduler import get_ffmpeg_scheduler
+from .supervisor import get_process_supervisor
+from .workspace import Workspace, get_tmp_path
+from .video import (
+    MAX_SEEK_SAMPLES,
+    MAX_SNIFF_BYTES,
+    SEEK_SAMPLES_PER_FRAME,
+    ClipStream,
+    ExtractionProfile,
+    FrameBuffer,
+    frame_proxy,
+    mp4_moov_end,
+    pipe_keyframes,
+    probe_keyframes,
+    probe_video_size,
+    sampling_timestamps,
+    scaled_size,
+    seek_frame,
+)
+from .selection import DIVERSITY_POOL_FACTOR, FrameSelector, select_diverse_frames
+from .similarity import (
+    HASH_THRESHOLD,
+    consecutive_scores,
+    distinct_frames,
+    frame_features,
+    hamming,
+    image_hash,
+    motion_box,
+    load_gray_proxies,
+    similarity_score,
+)
+from .frame import (
+    DEFAULT_ENCODER_PROFILE,
+    EncoderProfile,
+    Frame,
+    can_pass_through,
+    encode_image,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,17 +89,32 @@ class MediaProcessor:
         self.hass = hass
         self.session = async_get_clientsession(self.hass)
         self.client = client
-        self.base64_images = []
+        self.images = []
         self.filenames = []
         self.path = self.hass.config.path(f"media/{DOMAIN}/snapshots/")
         self.key_frame = ""
-
-    async def _encode_image(self, img):
-        """Encode image as base64"""
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format="JPEG")
-        base64_image = base64.b64encode(img_byte_arr.getvalue()).decode("utf-8")
-        return base64_image
+        self.profile = self.hass.data.get(DATA_ENCODER_PROFILE) or EncoderProfile()
+        self.cache = get_image_cache(self.hass)
+        self.extraction = (
+            self.hass.data.get(DATA_FRAME_EXTRACTION) or ExtractionProfile()
+        )
+        self.ffmpeg = get_ffmpeg_scheduler(self.hass)
+        self.frame_cache = get_frame_cache(self.hass)
+        # Near-duplicate frames dropped during this call
+        self.pruned_frames = 0
+        # Send video and stream frames as one mosaic image
+        self.mosaic = False
+        self._mosaic_frames = []
+
+    @property
+    def executor(self):
+        """Current media executor, it is replaced when Settings are reloaded"""
+        return get_media_executor(self.hass)
+
+    @property
+    def supervisor(self):
+        """Current process supervisor, it is replaced when Settings are reloaded"""
+        return get_process_supervisor(self.hass)
 
     async def _save_clip(
         self, clip_data=None, clip_path=None, image_data=None, image_path=None
@@ -68,12 +140,7 @@ class MediaProcessor:
             None, _run_save_clips, clip_data, clip_path, image_data, image_path
         )
 
-    def _convert_to_rgb(self, img):
-        if img.mode == "RGBA" or img.format == "GIF":
-            img = img.convert("RGB")
-        return img
-
-    async def _expose_image(self, frame_name, image_data, uid, frame_path=None):
+    async def _expose_image(self, frame_name, image_data, uid):
         # ensure /media/llmvision/snapshots dir exists
         await self.hass.loop.run_in_executor(
             None,
@@ -82,184 +149,172 @@ class MediaProcessor:
         if self.key_frame == "":
             filename = self.hass.config.path(f"media/{DOMAIN}/snapshots/{uid}-{frame_name}.jpg")
             self.key_frame = filename
-            if image_data is None and frame_path is not None:
-                # open image in hass.loop
-                with await self.hass.loop.run_in_executor(
-                    None, Image.open, frame_path
-                ) as image:
-                    await self.hass.loop.run_in_executor(None, image.load)
-                    image_data = await self._encode_image(image)
             await self._save_clip(image_data=image_data, image_path=filename)
 
-    def _similarity_score(self, previous_frame, current_frame_gray):
+    async def _load_frame(
+        self,
+        target_width,
+        image_path=None,
+        image_data=None,
+        keep_source=False,
+        cache=True,
+    ):
+        """Decode an image once and scale it to target_width on the media executor
+
+        Images that were decoded before (same content, target width and
+        encoder profile) are taken from the image cache instead. Pass
+        cache=False for images that won't be seen again, e.g. stream frames,
+        so they don't evict ones that will.
         """
-        SSIM by Z. Wang: https://ece.uwaterloo.ca/~z70wang/research/ssim/
-        Paper:  Z. Wang, A. C. Bovik, H. R. Sheikh and E. P. Simoncelli,
-        "Image quality assessment: From error visibility to structural similarity," IEEE Transactions on Image Processing, vol. 13, no. 4, pp. 600-612, Apr. 2004.
+        if not cache:
+            if image_path:
+                image_data = await self.executor.run(self._read_file, image_path)
+            return await self.executor.run_cpu(
+                Frame.decode, image_data, target_width=target_width, keep_source=keep_source
+            )
+
+        if image_path:
+            image_data, digest = await self.executor.run(self._read_image, image_path)
+        else:
+            digest = await self.executor.run(content_hash, image_data)
+
+        key = self.cache.key(digest, target_width, self.profile)
+        frame = self.cache.get(key)
+        if frame is None:
+            frame = await self.executor.run_cpu(
+                Frame.decode, image_data, target_width=target_width, keep_source=keep_source
+            )
+            frame.cache_key = key
+            self.cache.put(key, frame)
+        elif keep_source and frame.source is None:
+            frame.source = image_data
+            self.cache.put(key, frame)
+        return frame
+
+    @staticmethod
+    def _read_file(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    @classmethod
+    def _read_image(cls, image_path):
+        """Read an image file and hash its content"""
+        data = cls._read_file(image_path)
+        return data, content_hash(data)
+
+    async def _prepare_image(self, target_width, image_data, expose=False):
+        """Encode an image for the client, and for exposing if requested
+
+        JPEGs no wider than target_width are forwarded unchanged, this is
+        detected from the header without decoding the image.
+
+        Returns:
+            tuple: (encoded image, image to expose or None)
         """
-        K1 = 0.005
-        K2 = 0.015
-        L = 255
-
-        C1 = (K1 * L) ** 2
-        C2 = (K2 * L) ** 2
-
-        previous_frame_np = np.array(previous_frame)
-        current_frame_np = np.array(current_frame_gray)
-
-        # Ensure both frames have same dimensions
-        if previous_frame_np.shape != current_frame_np.shape:
-            min_shape = np.minimum(previous_frame_np.shape, current_frame_np.shape)
-            previous_frame_np = previous_frame_np[: min_shape[0], : min_shape[1]]
-            current_frame_np = current_frame_np[: min_shape[0], : min_shape[1]]
-
-        # Calculate mean (mu)
-        mu1 = np.mean(previous_frame_np, dtype=np.float64)
-        mu2 = np.mean(current_frame_np, dtype=np.float64)
-
-        # Calculate variance (sigma^2) and covariance (sigma12)
-        sigma1_sq = np.var(previous_frame_np, dtype=np.float64, mean=mu1)
-        sigma2_sq = np.var(current_frame_np, dtype=np.float64, mean=mu2)
-        sigma12 = np.cov(
-            previous_frame_np.flatten(), current_frame_np.flatten(), dtype=np.float64
-        )[0, 1]
-
-        # Calculate SSIM
-        ssim = ((2 * mu1 * mu2 + C1) * (2 * sigma12 + C2)) / (
-            (mu1**2 + mu2**2 + C1) * (sigma1_sq + sigma2_sq + C2)
+        if await self.executor.run(
+            can_pass_through, image_data, target_width, self.profile
+        ):
+            return image_data, image_data if expose else None
+        frame = await self._load_frame(target_width, image_data=image_data)
+        encoded_image = await self._encode_frame(frame)
+        return encoded_image, await self._encode_exposed(frame) if expose else None
+
+    async def _encode_frame(self, frame, profile=None):
+        """Encode a frame on the media executor, once per encoder profile"""
+        profile = profile or self.profile
+        if profile.key not in frame.encoded:
+            frame.encoded[profile.key] = await self.executor.run_cpu(
+                encode_image, frame.image, profile
+            )
+            if frame.cache_key is not None:
+                # Account for the encoded image in the cache
+                self.cache.put(frame.cache_key, frame)
+        return frame.encoded[profile.key]
+
+    async def _encode_exposed(self, frame):
+        """Encode a frame for exposing, exposed images are always JPEG"""
+        if self.profile.format == "JPEG":
+            return await self._encode_frame(frame)
+        return await self._encode_frame(frame, DEFAULT_ENCODER_PROFILE)
+
+    async def _frame_features(self, frames):
+        """Feature vectors of frames for diversity selection"""
+        return await asyncio.gather(
+            *(
+                self.executor.run(frame_features, frame.gray, frame.image)
+                for frame in frames
+            )
         )
 
-        return ssim
+    async def _crop_frame(self, frame, box):
+        """Crop a frame to the region that changed, if there is one"""
+        if box is None:
+            return frame
+        return await self.executor.run(frame.crop, box)
+
+    async def _add_selected_frame(self, frame, filename):
+        """Add a selected video or stream frame, or keep it for the mosaic"""
+        if self.mosaic:
+            self._mosaic_frames.append((frame, filename))
+            return
+        encoded_image = await self._encode_frame(frame)
+        self._add_frame(encoded_image, filename=filename)
+
+    async def _add_mosaic(self):
+        """Add the frames kept for the mosaic as one labeled grid image"""
+        frames, self._mosaic_frames = self._mosaic_frames, []
+        if len(frames) == 1:
+            frame, filename = frames[0]
+            self._add_frame(await self._encode_frame(frame), filename=filename)
+        elif frames:
+            mosaic = await self.executor.run_cpu(
+                build_mosaic,
+                [frame.image for frame, _ in frames],
+                [filename for _, filename in frames],
+            )
+            encoded_image = await self.executor.run_cpu(
+                encode_image, mosaic, self.profile
+            )
+            _LOGGER.debug(f"Added mosaic of {len(frames)} frames: {mosaic.size}")
+            self._add_frame(encoded_image, filename=f"Mosaic of {len(frames)} frames")
+
+    def _add_frame(self, encoded_image, filename):
+        """Add an encoded frame to the client, it is base64 encoded when sent"""
+        self.client.add_frame(image=encoded_image, filename=filename)
+
+    async def resize_image(self, target_width, image_path=None, image_data=None):
+        """Resize image to target_width and return it base64 encoded"""
+        if image_path:
+            image_data = await self.executor.run(self._read_file, image_path)
+        encoded_image, _ = await self._prepare_image(target_width, image_data)
+        return base64.b64encode(encoded_image).decode("utf-8")
+
+    async def _entity_image(self, entity_id):
+        """Snapshot of a camera or image entity
+
+        Camera and image entities are read in-process, without a request
+        through Home Assistant's web server and its auth. Other entities, and
+        entities that can't provide an image this way, are fetched from their
+        entity_picture over HTTP.
 
-    def _select_frames_with_minimums(self, camera_frames, max_frames, min_frames_per_camera):
-        """Select frames ensuring minimum representation per camera
-        
-        Args:
-            camera_frames (dict): Dict of camera_entity -> frames
-            max_frames (int): Maximum total frames to select
-            min_frames_per_camera (int): Minimum frames each camera should contribute
-            
         Returns:
-            tuple: (selected_frames, camera_frames_count) where:
-                - selected_frames: list of (frame_name, frame_data, ssim_score) tuples
-                - camera_frames_count: dict of camera_entity -> count
+            bytes: The encoded image, None if it couldn't be fetched
         """
-        if min_frames_per_camera == 0:
-            # Original behavior - no minimum per camera
-            frames_with_scores = []
-            for camera_entity in camera_frames:
-                for frame_name, frame_data in camera_frames[camera_entity].items():
-                    frames_with_scores.append(
-                        (frame_name, frame_data["frame_data"], frame_data["ssim_score"])
-                    )
-            frames_with_scores.sort(key=lambda x: x[2])
-            selected_frames = frames_with_scores[:max_frames]
-            
-            # Calculate camera distribution for logging
-            camera_frames_count = {}
-            for frame_name, _, _ in selected_frames:
-                # Extract camera name from frame_name (format: "camera_name frame N")
-                camera_name = frame_name.rsplit(' frame ', 1)[0]
-                camera_frames_count[camera_name] = camera_frames_count.get(camera_name, 0) + 1
-                
-            return selected_frames, camera_frames_count
-        
-        # Build list of all frames with camera info
-        all_frames = []
-        for camera_entity in camera_frames:
-            for frame_name, frame_data in camera_frames[camera_entity].items():
-                all_frames.append(
-                    (frame_name, frame_data["frame_data"], frame_data["ssim_score"], camera_entity)
-                )
-        
-        # Sort by SSIM score (lower = more distinct)
-        all_frames.sort(key=lambda x: x[2])
-        
-        selected_frames = []
-        selected_frame_names = set()  # Track selected frames by name
-        camera_frame_counts = {camera: 0 for camera in camera_frames.keys()}
-        
-        # First pass: try to satisfy minimum frames per camera
-        for frame_name, frame_data, ssim_score, camera_entity in all_frames:
-            if len(selected_frames) >= max_frames:
-                break
-                
-            if camera_frame_counts[camera_entity] < min_frames_per_camera:
-                selected_frames.append((frame_name, frame_data, ssim_score))
-                selected_frame_names.add(frame_name)
-                camera_frame_counts[camera_entity] += 1
-        
-        # Second pass: fill remaining slots with best frames
-        for frame_name, frame_data, ssim_score, camera_entity in all_frames:
-            if len(selected_frames) >= max_frames:
-                break
-                
-            # Skip if already selected
-            if frame_name in selected_frame_names:
-                continue
-                
-            selected_frames.append((frame_name, frame_data, ssim_score))
-            selected_frame_names.add(frame_name)
-            camera_frame_counts[camera_entity] += 1
-        
-        return selected_frames, camera_frame_counts
+        domain = split_entity_id(entity_id)[0]
+        try:
+            if domain == "camera":
+                return (await async_get_camera_image(self.hass, entity_id)).content
+            if domain == "image":
+                return (await async_get_entity_image(self.hass, entity_id)).content
+        except (HomeAssistantError, KeyError) as e:
+            # KeyError: the image integration isn't loaded
+            _LOGGER.debug(f"Couldn't get image of {entity_id}, fetching it: {e}")
+        return await self._fetch(
+            get_url(self.hass)
+            + self.hass.states.get(entity_id).attributes.get("entity_picture")
+        )
 
-    async def resize_image(
-        self, target_width, image_path=None, image_data=None, img=None
-    ):
-        """Resize image to target_width"""
-        if image_path:
-            # Open the image file
-            img = await self.hass.loop.run_in_executor(None, Image.open, image_path)
-            with img:
-                await self.hass.loop.run_in_executor(None, img.load)
-                # Check if the image is a GIF and convert if necessary
-                img = self._convert_to_rgb(img)
-                # calculate new height based on aspect ratio
-                width, height = img.size
-                aspect_ratio = width / height
-                target_height = int(target_width / aspect_ratio)
-
-                # Resize the image only if it's larger than the target size
-                if width > target_width or height > target_height:
-                    img = img.resize((target_width, target_height))
-
-                # Encode the image to base64
-                base64_image = await self._encode_image(img)
-
-        elif image_data:
-            # Convert the image to base64
-            img_byte_arr = io.BytesIO()
-            img_byte_arr.write(image_data)
-            img = await self.hass.loop.run_in_executor(None, Image.open, img_byte_arr)
-            with img:
-                await self.hass.loop.run_in_executor(None, img.load)
-                img = self._convert_to_rgb(img)
-                # calculate new height based on aspect ratio
-                width, height = img.size
-                aspect_ratio = width / height
-                target_height = int(target_width / aspect_ratio)
-
-                if width > target_width or height > target_height:
-                    img = img.resize((target_width, target_height))
-
-                base64_image = await self._encode_image(img)
-        elif img:
-            with img:
-                img = self._convert_to_rgb(img)
-                # calculate new height based on aspect ratio
-                width, height = img.size
-                aspect_ratio = width / height
-                target_height = int(target_width / aspect_ratio)
-
-                if width > target_width or height > target_height:
-                    img = img.resize((target_width, target_height))
-
-                base64_image = await self._encode_image(img)
-
-        return base64_image
-
-    async def _fetch(self, url, target_file=None, max_retries=2, retry_delay=1):
+    async def _fetch(self, url, max_retries=2, retry_delay=1):
         """Fetch image from url and return image data"""
         retries = 0
         while retries < max_retries:
@@ -274,29 +329,80 @@ class MediaProcessor:
                         await asyncio.sleep(retry_delay)
                         continue
                     # Just read file into buffer
-                    if target_file is None:
-                        data = await response.read()
-                        return data
-                    else:  # Save response into file in stream fashion to avoid memory leaks
-                        _LOGGER.debug(f"writing response into file {target_file}")
-                        written = 0
-                        chunks = 0
-                        async with async_open(target_file, "wb") as output:
-                            async for data in response.content.iter_any():
-                                await output.write(data)
-                                written += len(data)
-                                chunks += 1
-                        _LOGGER.debug(
-                            f"wrote {written} bytes ({chunks} chunks) into {target_file}"
-                        )
-
-                        return None
+                    data = await response.read()
+                    return data
             except Exception as e:
                 _LOGGER.error(f"Fetch failed: {e}")
                 retries += 1
                 await asyncio.sleep(retry_delay)
         _LOGGER.warning(f"Failed to fetch {url} after {max_retries} retries")
 
+    async def _stream_clip(
+        self, url, target_file, select_frames, retry_attempts=2, retry_seconds=1
+    ):
+        """Download a clip and extract its frames while it is downloading
+
+        ffmpeg can only read MP4 clips from a pipe if the moov box comes
+        before the media data, other clips are downloaded first. The clip is
+        also saved to target_file, so a failed extraction can be retried.
+
+        Args:
+            url (str): URL of the clip
+            target_file (str): File the clip is saved to
+            select_frames: Coroutine function that extracts and selects
+                frames from a ClipStream
+            retry_attempts (int): Attempts to download the clip if streaming fails
+            retry_seconds (float): Delay after the first failed attempt
+
+        Returns:
+            tuple: (frames, motion_boxes) as returned by select_frames, None
+                if the frames have to be extracted from target_file instead
+        """
+        try:
+            async with self.session.get(url) as response:
+                if not response.ok:
+                    raise ValueError(f"status code: {response.status}")
+                # Read until it's known if ffmpeg can read the clip from a pipe
+                prefix = bytearray()
+                moov_end = None
+                async for data in response.content.iter_any():
+                    prefix += data
+                    moov_end = mp4_moov_end(prefix)
+                    if moov_end is False or (moov_end and len(prefix) >= moov_end):
+                        break
+                    if len(prefix) > MAX_SNIFF_BYTES:
+                        moov_end = False
+                        break
+                clip = ClipStream(prefix, response.content.iter_any(), target_file)
+
+                if not moov_end or len(prefix) < moov_end:
+                    _LOGGER.debug(f"{url} is not streamable, downloading it first")
+                    clip.detach()
+                    await clip.run()
+                    return None
+
+                _LOGGER.debug(f"Extracting frames while downloading {url}")
+                copy = asyncio.create_task(clip.run())
+                try:
+                    selected = await select_frames(clip)
+                except asyncio.CancelledError:
+                    copy.cancel()
+                    raise
+                except Exception as e:
+                    _LOGGER.warning(
+                        f"Extracting frames while downloading failed, "
+                        f"retrying with the downloaded clip: {e}"
+                    )
+                    clip.detach()
+                    selected = None
+                await copy
+                return selected
+        except Exception as e:
+            _LOGGER.error(f"Streaming {url} failed: {e}")
+        # Resumes after the part that was streamed
+        await download(self.session, url, target_file, retry_attempts, retry_seconds)
+        return None
+
     async def record(
         self,
         image_entities,
@@ -306,6 +412,8 @@ class MediaProcessor:
         target_width,
         include_filename,
         expose_images,
+        frame_selection=FRAME_SELECTION_SSIM,
+        crop_to_motion=False,
     ):
         """Wrapper for client.add_frame with integrated recorder
 
@@ -313,7 +421,11 @@ class MediaProcessor:
             image_entities (list[string]): List of camera entities to record
             duration (float): Duration in seconds to record
             target_width (int): Target width for the images in pixels
+            frame_selection (str): "ssim" for the frames with the most motion,
+                "diversity" for the most diverse frames
+            crop_to_motion (bool): Crop frames to the region that changed
         """
+        diversity = frame_selection == FRAME_SELECTION_DIVERSITY
 
         interval = (
             1
@@ -324,24 +436,27 @@ class MediaProcessor:
                 else 4 if duration < 30 else 6 if duration < 60 else 10
             )
         )
-        camera_frames = {}
+        # Keeps only the most distinct frames of each camera while recording
+        selector = FrameSelector(
+            max_frames,
+            min_frames_per_camera,
+            pool_size=max_frames * DIVERSITY_POOL_FACTOR if diversity else None,
+        )
+        # Changed region of each frame by frame label
+        motion_boxes = {}
 
         # Record on a separate thread for each camera
         async def record_camera(image_entity, camera_number):
+            selector.add_camera(image_entity)
             start = time.time()
             frame_counter = 0
-            frames = {}
             previous_frame = None
+            previous_hash = None
             iteration_time = 0
 
-            base_url = get_url(self.hass)
-
             while time.time() - start < duration + iteration_time:
                 fetch_start_time = time.time()
-                frame_url = base_url + self.hass.states.get(
-                    image_entity
-                ).attributes.get("entity_picture")
-                frame_data = await self._fetch(frame_url)
+                frame_data = await self._entity_image(image_entity)
 
                 # Skip frame if fetch failed
                 if not frame_data:
@@ -352,21 +467,29 @@ class MediaProcessor:
 
                 preprocessing_start_time = time.time()
 
-                with await self.hass.loop.run_in_executor(
-                    None, Image.open, io.BytesIO(frame_data)
-                ) as img:
-                    current_frame_gray = np.array(img.convert("L"))
+                # Drop near-duplicates of the previous kept frame before decoding
+                frame_hash = await self.executor.run_cpu(image_hash, frame_data)
+                if previous_hash is not None and (
+                    hamming(previous_hash, frame_hash) <= HASH_THRESHOLD
+                ):
+                    self.pruned_frames += 1
+                    _LOGGER.debug(f"Skipping near-duplicate frame of {image_entity}")
+                else:
+                    previous_hash = frame_hash
+
+                    # Decode once: the frame keeps its grayscale array for scoring
+                    # and is already scaled to target_width for encoding later.
+                    # Each stream frame is new, caching it would only evict others
+                    frame = await self._load_frame(
+                        target_width, image_data=frame_data, cache=False
+                    )
+                    current_frame_gray = frame.gray
 
                     if previous_frame is not None:
-                        score = self._similarity_score(
-                            previous_frame, current_frame_gray
+                        score = await self.executor.run_cpu(
+                            similarity_score, previous_frame, current_frame_gray
                         )
 
-                        # Encode the image back to bytes
-                        buffer = io.BytesIO()
-                        img.save(buffer, format="JPEG")
-                        frame_data = buffer.getvalue()
-
                         # Use either entity name or assign number to each camera
                         frame_label = (
                             image_entity.replace("camera.", "")
@@ -378,14 +501,13 @@ class MediaProcessor:
                             + " frame "
                             + str(frame_counter)
                         )
-                        frames.update(
-                            {
-                                frame_label: {
-                                    "frame_data": frame_data,
-                                    "ssim_score": score,
-                                }
-                            }
+                        selector.add(
+                            image_entity, frame_label, frame, score, fetch_start_time
                         )
+                        if crop_to_motion:
+                            motion_boxes[frame_label] = await self.executor.run_cpu(
+                                motion_box, previous_frame, current_frame_gray
+                            )
 
                         frame_counter += 1
                         previous_frame = current_frame_gray
@@ -412,8 +534,6 @@ class MediaProcessor:
 
                 await asyncio.sleep(adjusted_interval)
 
-            camera_frames.update({image_entity: frames})
-
         _LOGGER.info(
             f"Recording {', '.join([entity.replace(
             'camera.', '') for entity in image_entities])} for {duration} seconds"
@@ -428,42 +548,44 @@ class MediaProcessor:
         )
 
         # Select frames using minimum per camera logic
-        selected_frames, camera_frames_count = self._select_frames_with_minimums(
-            camera_frames, max_frames, min_frames_per_camera
-        )
+        if diversity:
+            features = await self._frame_features(
+                [frame for _, _, frame, _, _ in selector.candidates()]
+            )
+            selected_frames, camera_frames_count = selector.select_diverse(features)
+        else:
+            selected_frames, camera_frames_count = selector.select()
         
         # Log frame distribution per camera
         frames_per_camera = ', '.join([f"{cam}: {count}" for cam, count in camera_frames_count.items()])
-        _LOGGER.info(f"Selected {len(selected_frames)} frames from {len(camera_frames_count)} cameras - {frames_per_camera}")
-        
-        # Sort selected frames back into their original chronological order
-        selected_frames.sort(key=lambda x: x[0])
+        _LOGGER.info(f"Selected {len(selected_frames)} frames from {len(camera_frames_count)} cameras - {frames_per_camera}, pruned {self.pruned_frames} near-duplicates")
 
         # Add selected frames to client
-        for frame_name, frame_data, _ in selected_frames:
-            resized_image = await self.resize_image(
-                target_width=target_width, image_data=frame_data
-            )
+        for frame_name, frame, _ in selected_frames:
             if expose_images:
                 await self._expose_image(
-                    frame_name[-1], resized_image, uid=str(uuid.uuid4())[:8]
+                    frame_name[-1],
+                    await self._encode_exposed(frame),
+                    uid=str(uuid.uuid4())[:8],
                 )
 
-            self.client.add_frame(base64_image=resized_image, filename=frame_name)
+            frame = await self._crop_frame(frame, motion_boxes.get(frame_name))
+            await self._add_selected_frame(frame, filename=frame_name)
+
+        _LOGGER.debug(
+            f"Media executor: {self.executor.stats}, image cache: {self.cache.stats}, "
+            f"ffmpeg: {self.ffmpeg.stats}, processes: {self.supervisor.stats}, "
+            f"pruned frames: {self.pruned_frames}"
+        )
 
     async def add_images(
         self, image_entities, image_paths, target_width, include_filename, expose_images
     ):
         """Wrapper for client.add_frame for images"""
-        base_url = get_url(self.hass)
-
         if image_entities:
             for image_entity in image_entities:
                 try:
-                    image_url = base_url + self.hass.states.get(
-                        image_entity
-                    ).attributes.get("entity_picture")
-                    image_data = await self._fetch(image_url)
+                    image_data = await self._entity_image(image_entity)
 
                     # Skip frame if fetch failed
                     if not image_data:
@@ -471,13 +593,15 @@ class MediaProcessor:
                             raise ServiceValidationError(
                                 f"Failed to fetch image from {image_entity}"
                             )
+                        continue
 
-                    # If entity snapshot requested, use entity name as 'filename'
-                    resized_image = await self.resize_image(
-                        target_width=target_width, image_data=image_data
+                    encoded_image, exposed_image = await self._prepare_image(
+                        target_width, image_data, expose=expose_images
                     )
-                    self.client.add_frame(
-                        base64_image=resized_image,
+
+                    # If entity snapshot requested, use entity name as 'filename'
+                    self._add_frame(
+                        encoded_image,
                         filename=(
                             self.hass.states.get(image_entity).attributes.get(
                                 "friendly_name"
@@ -489,7 +613,7 @@ class MediaProcessor:
 
                     if expose_images:
                         await self._expose_image(
-                            "0", resized_image, str(uuid.uuid4())[:8]
+                            "0", exposed_image, str(uuid.uuid4())[:8]
                         )
 
                 except AttributeError as e:
@@ -511,16 +635,22 @@ class MediaProcessor:
                     if include_filename:
                         filename = image_path.split("/")[-1].split(".")[-2]
 
-                    image_data = await self.resize_image(
-                        target_width=target_width, image_path=image_path
+                    image_data = await self.executor.run(self._read_file, image_path)
+                    encoded_image, exposed_image = await self._prepare_image(
+                        target_width, image_data, expose=expose_images
                     )
 
-                    self.client.add_frame(base64_image=image_data, filename=filename)
+                    self._add_frame(encoded_image, filename=filename)
 
                     if expose_images:
-                        await self._expose_image("0", image_data, str(uuid.uuid4())[:8])
+                        await self._expose_image(
+                            "0", exposed_image, str(uuid.uuid4())[:8]
+                        )
                 except Exception as e:
                     raise ServiceValidationError(f"Error: {e}")
+        _LOGGER.debug(
+            f"Media executor: {self.executor.stats}, image cache: {self.cache.stats}"
+        )
         return self.client
 
     async def add_video(
@@ -533,6 +663,11 @@ class MediaProcessor:
         target_width=640,
         include_filename=False,
         expose_images=False,
+        frame_selection=FRAME_SELECTION_SSIM,
+        crop_to_motion=False,
+        priority=0,
+        retry_attempts=2,
+        retry_seconds=1,
     ):
         try:
             current_event_id = str(uuid.uuid4())
@@ -559,6 +694,58 @@ class MediaProcessor:
 
                 video_path = base_url + video_path
 
+            # Diversity selection picks from a larger pool of distinct frames
+            pool_size = (
+                max_frames * DIVERSITY_POOL_FACTOR
+                if frame_selection == FRAME_SELECTION_DIVERSITY
+                else max_frames
+            )
+
+            async def select_frames(source, clip=None):
+                # Clips read from a pipe can't be seeked
+                timestamps = (
+                    None if clip else await self._sampling_timestamps(source, pool_size)
+                )
+                if self.extraction.mode == FRAME_EXTRACTION_PIPE:
+                    return await self._select_piped_frames(
+                        source,
+                        current_event_id,
+                        target_width,
+                        pool_size,
+                        crop_to_motion,
+                        clip=clip,
+                        priority=priority,
+                        timestamps=timestamps,
+                    )
+                return await self._select_extracted_frames(
+                    source,
+                    tmp_frames_dir,
+                    current_event_id,
+                    target_width,
+                    pool_size,
+                    expose_images,
+                    crop_to_motion,
+                    clip=clip,
+                    priority=priority,
+                    timestamps=timestamps,
+                )
+
+            # Frames selected with other settings can't be reused, exposed
+            # frames are kept in their original size
+            cache_params = [
+                max_frames,
+                target_width,
+                expose_images,
+                frame_selection,
+                crop_to_motion,
+                self.extraction.mode,
+                self.extraction.scene_threshold,
+            ]
+            key = None
+            selected = None
+            cached = None
+            digest = None
+            downloaded = False
             # Fetch URL to local file to avoid ffmpeg schenanigans
             if video_path.startswith("http://") or video_path.startswith("https://"):
                 # Create tmp dir to store video
@@ -576,167 +763,580 @@ class MediaProcessor:
                     current_event_id + "_" + basename,
                 )
 
-                await self._fetch(video_path, target_file=tmp_filename)
+                # Clips of Frigate events that just ended may not be available
+                # yet, other URLs are downloaded right away
+                version = None
+                if is_frigate_clip(video_path):
+                    headers = await wait_until_ready(
+                        self.session, video_path, retry_attempts, retry_seconds
+                    )
+                    if headers is None:
+                        raise ServiceValidationError(
+                            f"{basename} is not available after {retry_attempts} attempts"
+                        )
+                    version = clip_version(headers)
+
+                # Versioned clips are looked up before they are downloaded
+                if version and self.frame_cache.enabled:
+                    key = cache_key(clip_id(video_path), version, cache_params)
+                    cached = await self._cached_frames(key, target_width, expose_images)
+
+                if cached is None:
+                    if self.extraction.stream_clips:
+                        selected = await self._stream_clip(
+                            video_path,
+                            tmp_filename,
+                            partial(select_frames, tmp_filename),
+                            retry_attempts,
+                            retry_seconds,
+                        )
+                    else:
+                        await download(
+                            self.session,
+                            video_path,
+                            tmp_filename,
+                            retry_attempts,
+                            retry_seconds,
+                        )
 
                 video_path = tmp_filename
+                downloaded = True
+
+            if cached is None:
+                # Check file exists
+                if selected is None and not os.path.exists(video_path):
+                    raise ServiceValidationError(f"File {video_path} does not exist")
+
+                if key is None and self.frame_cache.enabled:
+                    if downloaded:
+                        # Downloads without a version are identified by their
+                        # content, hashed while the frames are selected
+                        digest = self.hass.loop.run_in_executor(
+                            None, file_digest, video_path
+                        )
+                    else:
+                        # Local clips by their path, size and modification time
+                        identity = await self.hass.loop.run_in_executor(
+                            None, file_identity, video_path
+                        )
+                        key = cache_key(identity, cache_params)
+                        cached = await self._cached_frames(
+                            key, target_width, expose_images
+                        )
 
-            # Check file exists
-            if not os.path.exists(video_path):
-                raise ServiceValidationError(f"File {video_path} does not exist")
+            if cached is None and selected is None:
+                _LOGGER.debug(f"Processing {video_path}")
+                if digest is None:
+                    selected = await select_frames(video_path)
+                else:
+                    # The selection stops if the digest finds cached frames
+                    selection = asyncio.ensure_future(select_frames(video_path))
+                    try:
+                        key = cache_key(await digest, cache_params)
+                        cached = await self._cached_frames(
+                            key, target_width, expose_images
+                        )
+                        if cached is None:
+                            selected = await selection
+                    finally:
+                        selection.cancel()
+
+            if cached is not None:
+                _LOGGER.debug(f"Using cached frames of {video_path}")
+                frames, motion_boxes = cached
+            else:
+                frames, motion_boxes = selected
+
+                if frame_selection == FRAME_SELECTION_DIVERSITY:
+                    features = await self._frame_features(
+                        [frame for _, frame, _ in frames]
+                    )
+                    frames = [
+                        frames[index]
+                        for index in select_diverse_frames(
+                            features, [video_path] * len(frames), max_frames
+                        )
+                    ]
 
-            _LOGGER.debug(f"Processing {video_path}")
+                if key is None and digest is not None:
+                    key = cache_key(await digest, cache_params)
+                if key is not None:
+                    await self._cache_frames(key, frames, motion_boxes)
 
-            # create tmp dir to store extracted frames
-            await self.hass.loop.run_in_executor(
-                None, partial(os.makedirs, tmp_frames_dir, exist_ok=True)
-            )
-            if os.path.exists(tmp_frames_dir):
-                _LOGGER.debug(f"Created {tmp_frames_dir}")
-            else:
-                _LOGGER.error(f"Failed to create temp directory {tmp_frames_dir}")
-
-            # Extract iframes from video
-            # use %05d formatting to enable iteration in sorted order
-            ffmpeg_cmd = " ".join(
-                [
-                    "ffmpeg",
-                    "-hide_banner",
-                    "-hwaccel",
-                    "auto",  # TODO: Add config option to specify FFmpeg options (hwaccel auto doesn't work on all systems, ie RP4)
-                    "-skip_frame",
-                    "nokey",
-                    "-an",
-                    "-sn",
-                    "-dn",
-                    "-i",
-                    shlex.quote(
-                        video_path
-                    ),  # TODO: Consider using stdin to avoid file I/O
-                    "-fps_mode",
-                    "passthrough",
-                    os.path.join(tmp_frames_dir, f"{current_event_id}_frame%05d.jpg"),
-                ]
+            if expose_images:
+                # Expose images with original size, keep SSIM score order
+                for frame_path, frame, _ in frames:
+                    frame_name = os.path.splitext(os.path.basename(frame_path))[
+                        0
+                    ].replace("frame", "")
+                    await self._expose_image(
+                        frame_name,
+                        frame.full_size_source or await self._encode_exposed(frame),
+                        current_event_id[:8],
+                    )
+
+            # Add frames to client, sorted by frame number instead of SSIM score
+            for counter, (frame_path, frame, _) in enumerate(
+                sorted(frames, key=lambda x: x[0]), start=1
+            ):
+                frame = await self._crop_frame(frame, motion_boxes.get(frame_path))
+                await self._add_selected_frame(
+                    frame,
+                    filename=(
+                        f"{os.path.splitext(os.path.basename(video_path))[0]} (frame {counter})"
+                        if include_filename
+                        else f"Video frame {counter}"
+                    ),
+                )
+        except Exception as e:
+            raise ServiceValidationError(f"Error: {e}")
+
+    async def _cached_frames(self, key, target_width, keep_source):
+        """Frames selected from the same clip by an earlier call, or None
+
+        Returns:
+            tuple: (frames, motion_boxes) like the frame selection
+        """
+        cached = await self.hass.loop.run_in_executor(None, self.frame_cache.get, key)
+        if cached is None:
+            return None
+        decoded = await asyncio.gather(
+            *(
+                self.executor.run(
+                    Frame.decode, data, target_width=target_width, keep_source=keep_source
+                )
+                for _, data, _, _ in cached
             )
-            # Add additional options for friga
+        )
+        frames = [
+            (name, frame, score)
+            for (name, _, score, _), frame in zip(cached, decoded)
+        ]
+        motion_boxes = {
+            name: tuple(box) for name, _, _, box in cached if box is not None
+        }
+        return frames, motion_boxes
+
+    async def _cache_frames(self, key, frames, motion_boxes):
+        """Keep the frames selected from a clip for later calls"""
+        encoded = await asyncio.gather(
+            *(self.executor.run(frame.encode_full_size) for _, frame, _ in frames)
+        )
+        await self.hass.loop.run_in_executor(
+            None,
+            self.frame_cache.put,
+            key,
+            [
+                (name, data, score, motion_boxes.get(name))
+                for (name, _, score), data in zip(frames, encoded)
+            ],
+        )
 
-            # Don't clutter stdout/stderr with ffmpeg output by default
-            output = asyncio.subprocess.DEVNULL
+    async def _sampling_timestamps(self, video_path, pool_size):
+        """Timestamps to extract frames at, None to extract the keyframes
 
-            if _LOGGER.isEnabledFor(logging.DEBUG):
-                output = None
+        Probes the clip's duration and keyframes, see sampling_timestamps.
+        """
+        samples = min(pool_size * SEEK_SAMPLES_PER_FRAME, MAX_SEEK_SAMPLES)
+        try:
+            duration, keyframes = await probe_keyframes(video_path, self.supervisor)
+        except ValueError as e:
+            _LOGGER.debug(f"Couldn't probe {video_path}, extracting keyframes: {e}")
+            return None
+        timestamps = sampling_timestamps(duration, keyframes, samples)
+        _LOGGER.debug(
+            f"{video_path}: {duration} s, {keyframes} keyframes, "
+            + (
+                f"sampling {len(timestamps)} timestamps"
+                if timestamps
+                else "extracting keyframes"
+            )
+        )
+        return timestamps
 
+    async def _extract_keyframes(
+        self, video_path, tmp_frames_dir, current_event_id, target_width, clip, priority
+    ):
+        """Write the keyframes of a video to tmp_frames_dir as JPEG files
+
+        Args:
+            target_width (int, optional): Scale the keyframes down to this
+                width, None keeps their original size
+        """
+        # Scale and drop unchanged keyframes in ffmpeg, before they are written
+        video_filter = self.extraction.video_filter(target_width)
+
+        # Extract iframes from video
+        # use %05d formatting to enable iteration in sorted order
+        ffmpeg_args = [
+            "-hide_banner",
+            *self.supervisor.ffmpeg_options(),
+            "-hwaccel",
+            "auto",  # TODO: Add config option to specify FFmpeg options (hwaccel auto doesn't work on all systems, ie RP4)
+            "-skip_frame",
+            "nokey",
+            "-an",
+            "-sn",
+            "-dn",
+            "-i",
+            "pipe:0" if clip else video_path,
+            "-fps_mode",
+            "passthrough",
+            *(["-vf", video_filter] if video_filter else []),
+            os.path.join(tmp_frames_dir, f"{current_event_id}_frame%05d.jpg"),
+        ]
+        # Add additional options for friga
+
+        # Don't clutter stdout/stderr with ffmpeg output by default
+        output = asyncio.subprocess.DEVNULL
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            output = None
+
+        # Wait for a free ffmpeg slot, shared by all calls
+        async with self.ffmpeg.job(priority) as ffmpeg_timeout:
             ffmpeg_start = time.monotonic_ns()
 
-            # TODO: Make this configurable
-            ffmpeg_timeout = 300  # seconds
+            _LOGGER.debug(
+                f"Running FFMPEG to create keyframes: {shlex.join(['ffmpeg', *ffmpeg_args])}"
+            )
+
+            # Run ffmpeg, the supervisor stops it if it is still running on exit
+            async with self.supervisor.process(
+                "ffmpeg",
+                *ffmpeg_args,
+                stdin=asyncio.subprocess.PIPE if clip else None,
+                stdout=output,
+                stderr=output,
+            ) as ffmpeg_process:
+                if clip:
+                    clip.attach(ffmpeg_process.stdin)
+                try:
+                    await asyncio.wait_for(
+                        ffmpeg_process.wait(), timeout=ffmpeg_timeout
+                    )
+                except TimeoutError:
+                    raise ServiceValidationError(
+                        f"FFmpeg failed to process video within {ffmpeg_timeout} seconds"
+                    ) from None
 
-            _LOGGER.debug(f"Running FFMPEG to create keyframes: {ffmpeg_cmd}")
+        _LOGGER.debug(
+            f"FFmpeg process finished with return code {ffmpeg_process.returncode}"
+        )
 
-            # Run ffmpeg command
-            ffmpeg_process = await asyncio.create_subprocess_shell(
-                ffmpeg_cmd, stdout=output, stderr=output
+        if ffmpeg_process.returncode != 0:
+            raise ServiceValidationError(
+                f"FFmpeg failed with return code {ffmpeg_process.returncode}"
             )
-            try:
-                await asyncio.wait_for(ffmpeg_process.wait(), timeout=ffmpeg_timeout)
-            except TimeoutError:
-                _LOGGER.info(
-                    f"FFmpeg failed to process video within {ffmpeg_timeout} seconds"
-                )
-                if ffmpeg_process.returncode is not None:
-                    ffmpeg_process.terminate()
 
-            _LOGGER.debug(
-                f"FFmpeg process finished with return code {ffmpeg_process.returncode}"
+        ffmpeg_time = time.monotonic_ns() - ffmpeg_start
+        _LOGGER.debug(f"FFmpeg took {ffmpeg_time / 1_000_000:.2f} ms")
+
+    @staticmethod
+    def _remove_frames(tmp_frames_dir, current_event_id):
+        """Delete the frame files extracted for an event"""
+        for frame_file in os.listdir(tmp_frames_dir):
+            if frame_file.startswith(f"{current_event_id}_frame"):
+                os.remove(os.path.join(tmp_frames_dir, frame_file))
+
+    async def _select_extracted_frames(
+        self,
+        video_path,
+        tmp_frames_dir,
+        current_event_id,
+        target_width,
+        pool_size,
+        keep_source,
+        crop_to_motion,
+        clip=None,
+        priority=0,
+        timestamps=None,
+    ):
+        """Extract keyframes to JPEG files and select the pool_size most distinct
+
+        Args:
+            clip (ClipStream, optional): Download to read from instead of video_path
+            priority (int): Position in the ffmpeg queue, lower starts first
+            timestamps (list[float], optional): Extract the frames at these
+                timestamps instead of the keyframes
+
+        Returns:
+            tuple: (frames, motion_boxes) where frames is a list of
+                (frame_path, frame, ssim_score) and motion_boxes maps frame
+                paths to their changed region
+        """
+        # create tmp dir to store extracted frames
+        await self.hass.loop.run_in_executor(
+            None, partial(os.makedirs, tmp_frames_dir, exist_ok=True)
+        )
+        if os.path.exists(tmp_frames_dir):
+            _LOGGER.debug(f"Created {tmp_frames_dir}")
+        else:
+            _LOGGER.error(f"Failed to create temp directory {tmp_frames_dir}")
+
+        # A failed extraction from the streamed clip leaves frames behind,
+        # they must not be scored with the frames of the retry
+        await self.hass.loop.run_in_executor(
+            None, self._remove_frames, tmp_frames_dir, current_event_id
+        )
+
+        # Exposed frames keep the original size, they are scaled when loaded
+        scale_width = None if keep_source else target_width
+
+        if timestamps:
+            # Seek to each timestamp instead of decoding all keyframes
+            await self._seek_frames(
+                video_path,
+                timestamps,
+                self.extraction.video_filter(scale_width, scene_detection=False),
+                priority,
+                output_pattern=os.path.join(
+                    tmp_frames_dir, f"{current_event_id}_frame%05d.jpg"
+                ),
+            )
+        else:
+            await self._extract_keyframes(
+                video_path, tmp_frames_dir, current_event_id, scale_width, clip, priority
             )
 
-            if ffmpeg_process.returncode != 0:
-                raise ServiceValidationError(
-                    f"FFmpeg failed with return code {ffmpeg_process.returncode}"
-                )
+        generated_frames = await self.hass.loop.run_in_executor(
+            None, os.listdir, tmp_frames_dir
+        )
 
-            ffmpeg_time = time.monotonic_ns() - ffmpeg_start
-            _LOGGER.debug(f"FFmpeg took {ffmpeg_time / 1_000_000:.2f} ms")
+        _LOGGER.debug(f"Extracted {len(generated_frames)} frames")
 
-            previous_frame, previous_frame_path = None, None
-            frames = []
+        # Check if the file is a "our" frame file before processing
+        # It can belong to another event, so we check the prefix
+        frame_paths = [
+            os.path.join(tmp_frames_dir, frame_file)
+            for frame_file in sorted(generated_frames)
+            if frame_file.startswith(f"{current_event_id}_frame")
+        ]
 
-            generated_frames = await self.hass.loop.run_in_executor(
-                None, os.listdir, tmp_frames_dir
+        # Decode only the grayscale proxies, split across the media workers
+        chunk_size = max(1, -(-len(frame_paths) // self.executor.max_workers))
+        chunks = await asyncio.gather(
+            *(
+                self.executor.run_cpu(
+                    load_gray_proxies, frame_paths[i : i + chunk_size]
+                )
+                for i in range(0, len(frame_paths), chunk_size)
             )
+        )
+        paths, proxies = [], []
+        for frame_path, proxy in zip(frame_paths, chain.from_iterable(chunks)):
+            if proxy is None:
+                _LOGGER.error(f"Cannot identify image file {frame_path}")
+                continue
+            paths.append(frame_path)
+            proxies.append(proxy)
+
+        # Drop near-duplicates before scoring
+        keep = await self.executor.run_cpu(distinct_frames, proxies)
+        if len(keep) < len(paths):
+            _LOGGER.debug(f"Pruned {len(paths) - len(keep)} near-duplicate frames")
+            self.pruned_frames += len(paths) - len(keep)
+            paths = [paths[i] for i in keep]
+            proxies = [proxies[i] for i in keep]
+
+        # Score all consecutive pairs of the clip at once
+        scores = await self.executor.run_cpu(consecutive_scores, proxies)
+
+        frames = []
+        for frame_path, score in zip(paths, scores):
+            # Insert the new frame, maintain sorted order
+            insort(frames, (frame_path, score), key=lambda x: x[1])
+            if len(frames) > pool_size:
+                # Keep only max_frames many frames with lowest SSIM scores
+                frames.pop()
+
+        if len(frames) == 0 and paths:
+            frames.append((paths[-1], 0))
+
+        # Decode the selected frames only, keep the original bytes only if they get exposed
+        selected = await asyncio.gather(
+            *(
+                self._load_frame(
+                    target_width, image_path=frame_path, keep_source=keep_source
+                )
+                for frame_path, _ in frames
+            )
+        )
+        frames = [
+            (frame_path, frame, score)
+            for (frame_path, score), frame in zip(frames, selected)
+        ]
+
+        # Changed region of each frame, against the frame it was scored with
+        motion_boxes = {}
+        if crop_to_motion and len(paths) > 1:
+            positions = {frame_path: i for i, frame_path in enumerate(paths)}
+            for frame_path, _, _ in frames:
+                i = positions[frame_path]
+                other = i + 1 if i + 1 < len(paths) else i - 1
+                motion_boxes[frame_path] = await self.executor.run_cpu(
+                    motion_box, proxies[other], proxies[i]
+                )
 
-            _LOGGER.debug(f"Extracted {len(generated_frames)} frames")
+        return frames, motion_boxes
 
-            # Iterate over frames in sorted order
-            for frame_file in sorted(generated_frames):
-                # Check if the file is a "our" frame file before processing
-                # It can belong to another event, so we check the prefix
-                if not frame_file.startswith(f"{current_event_id}_frame"):
-                    _LOGGER.debug(f"Skipping non-frame file {frame_file}")
-                    continue
+    async def _seek_frames(
+        self, video_path, timestamps, video_filter, priority, output_pattern=None
+    ):
+        """Decode the frames at timestamps, each seek is an ffmpeg job
 
-                _LOGGER.debug(f"Adding frame {frame_file}")
-                frame_path = os.path.join(tmp_frames_dir, frame_file)
-                try:
-                    # open image in hass.loop
-                    with await self.hass.loop.run_in_executor(
-                        None, Image.open, frame_path
-                    ) as img:
-                        await self.hass.loop.run_in_executor(None, img.load)
-                        # Remove transparency for compatibility
-                        if img.mode == "RGBA":
-                            img = img.convert("RGB")
-                            await self.hass.loop.run_in_executor(
-                                None, img.save, frame_path
-                            )
+        Returns:
+            list: JPEG bytes of each timestamp, None where there is no frame,
+                the seek failed or the frame was written to output_pattern
+                formatted with its 1-based index
 
-                        current_frame_gray = np.array(img.convert("L"))
+        Raises:
+            ServiceValidationError: If no frame could be decoded
+        """
 
-                    # Calculate similarity score
-                    if previous_frame is not None:
-                        score = self._similarity_score(
-                            previous_frame, current_frame_gray
-                        )
-                        # Insert the new frame, maintain sorted order
-                        insort(frames, (previous_frame_path, score), key=lambda x: x[1])
-                        if len(frames) > max_frames:
-                            # Keep only max_frames many frames with lowest SSIM scores
-                            frames.pop()
-                    previous_frame = current_frame_gray
-                    previous_frame_path = frame_path
-                except UnidentifiedImageError:
-                    _LOGGER.error(f"Cannot identify image file {frame_path}")
-                    continue
+        async def seek(index, timestamp):
+            async with self.ffmpeg.job(priority) as ffmpeg_timeout:
+                return await seek_frame(
+                    video_path,
+                    timestamp,
+                    video_filter,
+                    output=output_pattern % index if output_pattern else None,
+                    timeout=ffmpeg_timeout,
+                    supervisor=self.supervisor,
+                )
 
-            if len(frames) == 0 and previous_frame_path is not None:
-                frames.append((previous_frame_path, 0))
+        seek_start = time.monotonic_ns()
+        results = await asyncio.gather(
+            *(seek(index, timestamp) for index, timestamp in enumerate(timestamps, 1)),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if len(errors) == len(results):
+            raise ServiceValidationError(f"FFmpeg failed to seek: {errors[0]}")
+        for timestamp, result in zip(timestamps, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(f"Couldn't extract frame at {timestamp:.3f} s: {result}")
+        _LOGGER.debug(
+            f"Seeked to {len(timestamps)} timestamps in "
+            f"{(time.monotonic_ns() - seek_start) / 1_000_000:.2f} ms"
+        )
+        return [None if isinstance(result, Exception) else result for result in results]
 
-            if expose_images:
-                # Expose images with original size, keep SSIM score order
-                for frame_path, _ in frames:
-                    frame_name = os.path.splitext(os.path.basename(frame_path))[
-                        0
-                    ].replace("frame", "")
-                    await self._expose_image(
-                        frame_name, None, current_event_id[:8], frame_path
-                    )
+    async def _load_samples(self, samples, buffer):
+        """Decode sampled JPEGs into buffer, like pipe_keyframes yields frames"""
+        for index, data in enumerate(samples, 1):
+            if data is None:
+                continue
+            slot = buffer.acquire()
+            try:
+                await self.executor.run(buffer.load, slot, data)
+            except (UnidentifiedImageError, OSError) as e:
+                _LOGGER.warning(f"Cannot decode sampled frame {index}: {e}")
+                buffer.release(slot)
+                continue
+            yield index, slot
 
-            # Add frames to client, sorted by frame number instead of SSIM score
-            for counter, (frame_path, _) in enumerate(
-                sorted(frames, key=lambda x: x[0]), start=1
-            ):
-                resized_image = await self.resize_image(
-                    image_path=frame_path, target_width=target_width
+    async def _select_piped_frames(
+        self,
+        video_path,
+        current_event_id,
+        target_width,
+        pool_size,
+        crop_to_motion,
+        clip=None,
+        priority=0,
+        timestamps=None,
+    ):
+        """Pipe keyframes from ffmpeg and select the pool_size most distinct
+
+        Frames are scored as they arrive. Only the candidates, the previous
+        frame and the incoming frame are held, in a preallocated buffer.
+
+        Args:
+            clip (ClipStream, optional): Download to read from instead of video_path
+            priority (int): Position in the ffmpeg queue, lower starts first
+            timestamps (list[float], optional): Extract the frames at these
+                timestamps instead of the keyframes
+
+        Returns:
+            tuple: (frames, motion_boxes) like _select_extracted_frames, with
+                frame names instead of paths
+        """
+        if clip:
+            size = await probe_video_size("pipe:0", clip.prefix, self.supervisor)
+        else:
+            size = await probe_video_size(video_path, supervisor=self.supervisor)
+        width, height = scaled_size(*size, target_width)
+        buffer = FrameBuffer(pool_size + 2, width, height)
+        # (frame_name, slot, ssim_score, proxy) sorted by score
+        candidates = []
+        motion_boxes = {}
+        previous = None
+
+        async with AsyncExitStack() as stack:
+            if timestamps:
+                samples = await self._seek_frames(
+                    video_path,
+                    timestamps,
+                    self.extraction.video_filter(width, height, scene_detection=False),
+                    priority,
                 )
-                self.client.add_frame(
-                    base64_image=resized_image,
-                    filename=(
-                        f"{os.path.splitext(os.path.basename(video_path))[0]} (frame {counter})"
-                        if include_filename
-                        else f"Video frame {counter}"
-                    ),
+                keyframes = self._load_samples(samples, buffer)
+            else:
+                # Wait for a free ffmpeg slot, shared by all calls
+                ffmpeg_timeout = await stack.enter_async_context(
+                    self.ffmpeg.job(priority)
                 )
-        except Exception as e:
-            raise ServiceValidationError(f"Error: {e}")
+                keyframes = pipe_keyframes(
+                    video_path,
+                    buffer,
+                    self.extraction,
+                    clip,
+                    timeout=ffmpeg_timeout,
+                    supervisor=self.supervisor,
+                )
+            keyframes = await stack.enter_async_context(aclosing(keyframes))
+            async for index, slot in keyframes:
+                frame_name = f"{current_event_id}_frame{index:05d}"
+                proxy, frame_hash = await self.executor.run(
+                    frame_proxy, buffer.frames[slot]
+                )
+                # Drop near-duplicates of the previous kept frame
+                if previous is not None and (
+                    hamming(previous[3], frame_hash) <= HASH_THRESHOLD
+                ):
+                    self.pruned_frames += 1
+                    buffer.release(slot)
+                    continue
+
+                if previous is not None:
+                    previous_name, previous_slot, previous_proxy, _ = previous
+                    score = await self.executor.run(
+                        similarity_score, previous_proxy, proxy
+                    )
+                    if crop_to_motion:
+                        motion_boxes[previous_name] = await self.executor.run(
+                            motion_box, proxy, previous_proxy
+                        )
+                    # Insert the new frame, maintain sorted order
+                    insort(
+                        candidates,
+                        (previous_name, previous_slot, score, previous_proxy),
+                        key=lambda x: x[2],
+                    )
+                    if len(candidates) > pool_size:
+                        # Keep only pool_size many frames with lowest SSIM scores
+                        buffer.release(candidates.pop()[1])
+                previous = (frame_name, slot, proxy, frame_hash)
+
+        if len(candidates) == 0 and previous is not None:
+            candidates.append((previous[0], previous[1], 0, previous[2]))
+
+        frames = [
+            (frame_name, Frame(buffer.image(slot), gray=proxy), score)
+            for frame_name, slot, score, proxy in candidates
+        ]
+        return frames, motion_boxes
 
     async def add_videos(
         self,
@@ -748,13 +1348,12 @@ class MediaProcessor:
         expose_images,
         frigate_retry_attempts,
         frigate_retry_seconds,
+        frame_selection=FRAME_SELECTION_SSIM,
+        crop_to_motion=False,
+        mosaic=False,
     ):
         """Wrapper for client.add_frame for videos"""
-
-        # TODO: Add config option to specify path for tmp files.
-        # For example: Sometimes config path is located on SD card, and using ramdisk/SSD instead would be much faster and won't wear SD card out
-        tmp_clips_dir = self.hass.config.path(f"custom_components/{DOMAIN}/tmp_clips")
-        tmp_frames_dir = self.hass.config.path(f"custom_components/{DOMAIN}/tmp_frames")
+        self.mosaic = mosaic
 
         if not video_paths:
             video_paths = []
@@ -769,32 +1368,42 @@ class MediaProcessor:
 
         _LOGGER.debug(f"Processing videos: {video_paths}")
 
-        def process_video(video_path):
-            return self.add_video(
-                video_path=video_path,
-                tmp_clips_dir=tmp_clips_dir,
-                tmp_frames_dir=tmp_frames_dir,
-                base_url=base_url,
-                max_frames=max_frames,
-                target_width=target_width,
-                include_filename=include_filename,
-                expose_images=expose_images,
-            )
-
-        # Process videos in parallel
-        await asyncio.gather(*map(process_video, video_paths))
+        # Each call gets its own workspace, concurrent calls don't share files
+        async with Workspace(get_tmp_path(self.hass)) as workspace:
+
+            def process_video(position, video_path):
+                return self.add_video(
+                    video_path=video_path,
+                    tmp_clips_dir=workspace.clips_dir,
+                    tmp_frames_dir=workspace.frames_dir,
+                    base_url=base_url,
+                    max_frames=max_frames,
+                    target_width=target_width,
+                    include_filename=include_filename,
+                    expose_images=expose_images,
+                    frame_selection=frame_selection,
+                    crop_to_motion=crop_to_motion,
+                    # The n-th video of each call queues behind the (n-1)-th
+                    # videos of other calls, so one large call can't starve
+                    # the others
+                    priority=position,
+                    retry_attempts=frigate_retry_attempts,
+                    retry_seconds=frigate_retry_seconds,
+                )
 
-        # Clean up tmp dirs
-        try:
-            await self.hass.loop.run_in_executor(None, shutil.rmtree, tmp_clips_dir)
-            _LOGGER.info(f"Deleted tmp folder: {tmp_clips_dir}")
-        except FileNotFoundError as e:
-            _LOGGER.info(f"Failed to delete tmp folder: {e}")
-        try:
-            await self.hass.loop.run_in_executor(None, shutil.rmtree, tmp_frames_dir)
-            _LOGGER.info(f"Deleted tmp folder: {tmp_frames_dir}")
-        except FileNotFoundError as e:
-            _LOGGER.info(f"Failed to delete tmp folders: {e}")
+            # Process videos in parallel, at most ffmpeg_jobs at a time
+            await asyncio.gather(
+                *(
+                    process_video(position, video_path)
+                    for position, video_path in enumerate(video_paths)
+                )
+            )
+        await self._add_mosaic()
+        _LOGGER.debug(
+            f"Media executor: {self.executor.stats}, image cache: {self.cache.stats}, "
+            f"ffmpeg: {self.ffmpeg.stats}, processes: {self.supervisor.stats}, "
+            f"frame cache: {self.frame_cache.stats}, pruned frames: {self.pruned_frames}"
+        )
         return self.client
 
     async def add_streams(
@@ -806,7 +1415,11 @@ class MediaProcessor:
         target_width,
         include_filename,
         expose_images,
+        frame_selection=FRAME_SELECTION_SSIM,
+        crop_to_motion=False,
+        mosaic=False,
     ):
+        self.mosaic = mosaic
         if image_entities:
             await self.record(
                 image_entities=image_entities,
@@ -816,7 +1429,10 @@ class MediaProcessor:
                 target_width=target_width,
                 include_filename=include_filename,
                 expose_images=expose_images,
+                frame_selection=frame_selection,
+                crop_to_motion=crop_to_motion,
             )
+            await self._add_mosaic()
         return self.client
 
     async def add_visual_data(
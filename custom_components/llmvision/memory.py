@@ -7,9 +7,12 @@ from .const import (
     CONF_TITLE_PROMPT,
     DEFAULT_SYSTEM_PROMPT,
     DEFAULT_TITLE_PROMPT,
+    DATA_ENCODER_PROFILE,
 )
+from .executor import get_media_executor
+from .frame import EncoderProfile, convert_to_rgb, encode_image, image_mime_type
+from .payload import Base64Image
 import base64
-import io
 from PIL import Image
 import logging
 
@@ -59,7 +62,9 @@ class Memory:
                 content.append(
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                        "image_url": {
+                            "url": f"data:{image_mime_type(image)};base64,{image}"
+                        },
                     }
                 )
 
@@ -73,7 +78,9 @@ class Memory:
                 content.append(
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                        "image_url": {
+                            "url": f"data:{image_mime_type(image)};base64,{image}"
+                        },
                     }
                 )
 
@@ -99,7 +106,7 @@ class Memory:
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "media_type": "image/jpeg",
+                            "media_type": image_mime_type(image),
                             "data": f"{image}",
                         },
                     }
@@ -112,7 +119,12 @@ class Memory:
 
                 content.append({"text": tag + ":"})
                 content.append(
-                    {"inline_data": {"mime_type": "image/jpeg", "data": image}}
+                    {
+                        "inline_data": {
+                            "mime_type": image_mime_type(image),
+                            "data": image,
+                        }
+                    }
                 )
         elif memory_type == "AWS":
             if self.memory_images:
@@ -124,8 +136,8 @@ class Memory:
                 content.append(
                     {
                         "image": {
-                            "format": "jpeg",
-                            "source": {"bytes": base64.b64decode(image)},
+                            "format": image_mime_type(image).split("/")[1],
+                            "source": {"bytes": Base64Image(image)},
                         }
                     }
                 )
@@ -152,34 +164,38 @@ class Memory:
 
         return memory_entry
 
+    @staticmethod
+    def _encode_image(image_path, profile):
+        """Resize a memory image to fit 512x512 and encode it as base64"""
+        with Image.open(image_path) as img:
+            img.load()
+            # calculate new height and width based on aspect ratio
+            width, height = img.size
+            aspect_ratio = width / height
+            if aspect_ratio > 1:
+                new_width = 512
+                new_height = int(512 / aspect_ratio)
+            else:
+                new_height = 512
+                new_width = int(512 * aspect_ratio)
+            img = img.resize((new_width, new_height))
+
+            # Convert Memory Images to RGB mode if needed
+            img = convert_to_rgb(img)
+
+            # Encode the image to base64
+            return base64.b64encode(encode_image(img, profile)).decode("utf-8")
+
     async def _encode_images(self, image_paths):
-        """Encode images as base64"""
+        """Encode images as base64 on the media executor"""
+        executor = get_media_executor(self.hass)
+        profile = self.hass.data.get(DATA_ENCODER_PROFILE) or EncoderProfile()
         encoded_images = []
 
         for image_path in image_paths:
-            img = await self.hass.loop.run_in_executor(None, Image.open, image_path)
-            with img:
-                await self.hass.loop.run_in_executor(None, img.load)
-                # calculate new height and width based on aspect ratio
-                width, height = img.size
-                aspect_ratio = width / height
-                if aspect_ratio > 1:
-                    new_width = 512
-                    new_height = int(512 / aspect_ratio)
-                else:
-                    new_height = 512
-                    new_width = int(512 * aspect_ratio)
-                img = img.resize((new_width, new_height))
-
-                # Convert Memory Images to RGB mode if needed
-                if img.mode == "RGBA":
-                    img = img.convert("RGB")
-
-                # Encode the image to base64
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format="JPEG")
-                base64_image = base64.b64encode(img_byte_arr.getvalue()).decode("utf-8")
-                encoded_images.append(base64_image)
+            encoded_images.append(
+                await executor.run_cpu(self._encode_image, image_path, profile)
+            )
 
         return encoded_images
 
@@ -0,0 +1,98 @@
+"""Mosaic of several frames in one image, for providers with per-image overhead"""
+
+import math
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+# Mosaics are scaled down to at most this width
+MOSAIC_MAX_WIDTH = 3840
+
+# Gap between cells in pixels
+MOSAIC_GAP = 4
+
+
+def mosaic_layout(count, cell_width, cell_height, max_width=MOSAIC_MAX_WIDTH):
+    """Grid layout for count cells of cell_width x cell_height pixels
+
+    Picks the number of columns that gives the squarest mosaic with the
+    fewest empty cells, then shrinks the cells so the mosaic is at most
+    max_width wide.
+
+    Args:
+        count (int): Number of frames, at least 1
+        cell_width (int): Width the frames are sent with
+        cell_height (int): Height of the frames at cell_width
+
+    Returns:
+        tuple: (columns, rows, cell_width)
+    """
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        empty = columns * rows - count
+        aspect = (columns * cell_width) / (rows * cell_height)
+        # Half empty rows weigh as much as a 1:1.65 aspect ratio
+        cost = abs(math.log(aspect)) + empty / columns
+        if best is None or cost < best[0]:
+            best = (cost, columns, rows)
+    _, columns, rows = best
+    cell_width = min(cell_width, (max_width - (columns - 1) * MOSAIC_GAP) // columns)
+    return columns, rows, cell_width
+
+
+def _load_font(size):
+    """Default font at size, the bitmap font on Pillow without FreeType"""
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, ImportError, OSError):
+        return ImageFont.load_default()
+
+
+def build_mosaic(images, labels, max_width=MOSAIC_MAX_WIDTH):
+    """Pack images into one grid image with burned-in labels
+
+    The cells have the size of the largest image. Images with another aspect
+    ratio are fit into their cell.
+
+    Args:
+        images (list[PIL.Image.Image]): Frames in the order they are shown
+        labels (list[str]): Label of each frame, drawn in the top left corner
+        max_width (int): Maximum width of the mosaic
+
+    Returns:
+        PIL.Image.Image: RGB mosaic, cells left to right, top to bottom
+    """
+    cell_width = max(image.width for image in images)
+    cell_height = max(image.height for image in images)
+    columns, rows, width = mosaic_layout(
+        len(images), cell_width, cell_height, max_width
+    )
+    cell_height = round(cell_height * width / cell_width)
+    cell_width = width
+
+    mosaic = Image.new(
+        "RGB",
+        (
+            columns * cell_width + (columns - 1) * MOSAIC_GAP,
+            rows * cell_height + (rows - 1) * MOSAIC_GAP,
+        ),
+    )
+    draw = ImageDraw.Draw(mosaic)
+    font = _load_font(max(12, cell_height // 16))
+    margin = max(2, cell_height // 100)
+
+    for index, (image, label) in enumerate(zip(images, labels)):
+        row, column = divmod(index, columns)
+        x = column * (cell_width + MOSAIC_GAP)
+        y = row * (cell_height + MOSAIC_GAP)
+        cell = ImageOps.contain(image.convert("RGB"), (cell_width, cell_height))
+        mosaic.paste(
+            cell,
+            (x + (cell_width - cell.width) // 2, y + (cell_height - cell.height) // 2),
+        )
+        # White label on a black box, readable on any background
+        left, top, right, bottom = draw.textbbox((x + 2 * margin, y + 2 * margin), label, font=font)
+        draw.rectangle(
+            (left - margin, top - margin, right + margin, bottom + margin), fill="black"
+        )
+        draw.text((x + 2 * margin, y + 2 * margin), label, fill="white", font=font)
+    return mosaic
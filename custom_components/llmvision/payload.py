@@ -0,0 +1,139 @@
+"""Request body writer that splices images into pre-serialized JSON"""
+
+import base64
+import binascii
+import json
+import re
+
+from .frame import image_mime_type
+
+# Bytes of an image encoded at a time. A multiple of 3, so the base64 chunks
+# can be concatenated without padding in between.
+CHUNK_SIZE = 3 * 16 * 1024
+
+# json.dumps writes the placeholder for image n as "\u0000llmvision_image_n\u0000"
+_PLACEHOLDER = "\x00llmvision_image_{}\x00"
+_PLACEHOLDER_PATTERN = re.compile(rb'"\\u0000llmvision_image_(\d+)\\u0000"')
+
+
+class Base64Image:
+    """Image in a request payload, serialized as a base64 encoded JSON string
+
+    The image is kept as bytes until the request body is written, so it is
+    base64 encoded once, directly into the body.
+
+    Args:
+        data (bytes | str): Encoded image, or an image that already is base64 encoded
+        prefix (str): Written in front of the base64 data
+    """
+
+    __slots__ = ("data", "prefix")
+
+    def __init__(self, data, prefix=""):
+        self.data = data
+        self.prefix = prefix
+
+    @property
+    def raw(self) -> bytes:
+        """Encoded image bytes (e.g. for boto3)"""
+        if isinstance(self.data, str):
+            return base64.b64decode(self.data)
+        return self.data
+
+    def __len__(self):
+        """Length of the serialized string, without quotes"""
+        if isinstance(self.data, str):
+            return len(self.prefix) + len(self.data)
+        return len(self.prefix) + 4 * ((len(self.data) + 2) // 3)
+
+    def write(self, view, offset) -> int:
+        """Write prefix and base64 data into view at offset, return the new offset"""
+        for chunk in self._chunks():
+            view[offset : offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return offset
+
+    def _chunks(self):
+        yield self.prefix.encode("ascii")
+        if isinstance(self.data, str):
+            yield self.data.encode("ascii")
+            return
+        data = memoryview(self.data)
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield binascii.b2a_base64(data[start : start + CHUNK_SIZE], newline=False)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {len(self)} chars>"
+
+
+class DataUri(Base64Image):
+    """Image serialized as a base64 data URI (e.g. for OpenAI image_url)
+
+    Args:
+        data (bytes | str): Encoded image, or an image that already is base64 encoded
+        mime_type (str, optional): Mime type, detected from data if not given
+    """
+
+    __slots__ = ()
+
+    def __init__(self, data, mime_type=None):
+        super().__init__(data, f"data:{mime_type or image_mime_type(data)};base64,")
+
+
+def serialize(payload) -> bytes | bytearray:
+    """Serialize payload as JSON, writing Base64Image values straight into the body
+
+    The payload is serialized once with placeholders for the images. The
+    body is then allocated with its final size and the placeholders are
+    replaced with the base64 encoded images, without building intermediate
+    base64 strings or escaping them.
+
+    Args:
+        payload (dict): Request payload, may contain Base64Image values
+
+    Returns:
+        bytes | bytearray: UTF-8 encoded JSON
+    """
+    images = []
+
+    def default(obj):
+        if isinstance(obj, Base64Image):
+            images.append(obj)
+            return _PLACEHOLDER.format(len(images) - 1)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    skeleton = json.dumps(payload, default=default).encode("utf-8")
+    if not images:
+        return skeleton
+
+    placeholders = list(_PLACEHOLDER_PATTERN.finditer(skeleton))
+    size = len(skeleton) + sum(
+        len(images[int(match.group(1))]) + 2 - len(match.group(0))
+        for match in placeholders
+    )
+
+    body = bytearray(size)
+    view = memoryview(body)
+    offset, position = 0, 0
+    for match in placeholders:
+        start, end = match.span()
+        view[offset : offset + start - position] = skeleton[position:start]
+        offset += start - position
+        view[offset] = ord('"')
+        offset = images[int(match.group(1))].write(view, offset + 1)
+        view[offset] = ord('"')
+        offset += 1
+        position = end
+    view[offset:] = skeleton[position:]
+    return body
+
+
+def with_raw_images(data):
+    """Copy of data with Base64Image values replaced by their bytes (for boto3)"""
+    if isinstance(data, dict):
+        return {key: with_raw_images(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [with_raw_images(item) for item in data]
+    if isinstance(data, Base64Image):
+        return data.raw
+    return data
@@ -7,7 +7,8 @@ import logging
 import inspect
 import re
 import json
-import base64
+from .frame import image_mime_type
+from .payload import Base64Image, DataUri, serialize, with_raw_images
 from .const import (
     DOMAIN,
     CONF_API_KEY,
@@ -63,7 +64,7 @@ class Request:
         self.message = message
         self.max_tokens = max_tokens
         self.temperature = temperature
-        self.base64_images = []
+        self.images = []
         self.filenames = []
 
     @staticmethod
@@ -77,6 +78,8 @@ class Request:
             return "<long_string>"
         elif isinstance(data, bytes) and len(data) > 400:
             return "<long_bytes>"
+        elif isinstance(data, Base64Image):
+            return "<image>"
         else:
             return data
 
@@ -122,11 +125,11 @@ class Request:
         if not call.model:
             call.model = self._get_default_model(call.provider)
         # Check image input
-        if not call.base64_images:
+        if not call.images:
             raise ServiceValidationError(ERROR_NO_IMAGE_INPUT)
         # Check if single image is provided for Groq
         if (
-            len(call.base64_images) > 1
+            len(call.images) > 1
             and self.get_provider(self.hass, call.provider) == "Groq"
         ):
             raise ServiceValidationError(ERROR_GROQ_MULTIPLE_IMAGES)
@@ -164,7 +167,7 @@ class Request:
         setattr(call, "model", model if model else self.get_default_model(entry_id))
         call.temperature = config.get(CONF_TEMPERATURE, 0.5)
         call.top_p = config.get(CONF_TOP_P, 0.9)
-        call.base64_images = self.base64_images
+        call.images = self.images
         call.filenames = self.filenames
 
         self.validate(call)
@@ -369,8 +372,14 @@ class Request:
         
         return result
 
-    def add_frame(self, base64_image, filename):
-        self.base64_images.append(base64_image)
+    def add_frame(self, image, filename):
+        """Add an image to the request
+
+        Args:
+            image (bytes | str): Encoded image, or base64 encoded image
+            filename (str): Name the image is labeled with in the prompt
+        """
+        self.images.append(image)
         self.filenames.append(filename)
 
     async def _resolve_error(self, response, provider):
@@ -469,13 +478,20 @@ class Provider(ABC):
         return await self._make_request(data)
 
     async def _post(self, url: str, headers: dict, data: dict) -> dict:
-        """Post data to url and return response data"""
-        _LOGGER.debug(f"Request data: {Request.sanitize_data(data)}")
+        """Post data to url and return response data
+
+        Images (Base64Image) are base64 encoded directly into the request body.
+        """
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"Request data: {Request.sanitize_data(data)}")
         # Sanitize url
         san_url = re.sub(r"\?key=[^&]*", "", url)
+        if not any(key.lower() == "content-type" for key in headers):
+            headers = {**headers, "Content-Type": "application/json"}
         try:
-            _LOGGER.debug(f"Posting to {san_url}")
-            response = await self.session.post(url, headers=headers, json=data)
+            body = await self.hass.async_add_executor_job(serialize, data)
+            _LOGGER.debug(f"Posting {len(body)} bytes to {san_url}")
+            response = await self.session.post(url, headers=headers, data=body)
         except Exception as e:
             raise ServiceValidationError(f"Request failed: {e}")
 
@@ -578,9 +594,9 @@ class OpenAI(Provider):
                 # If schema is invalid, don't add structured output
                 pass
 
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
@@ -590,7 +606,7 @@ class OpenAI(Provider):
             payload["messages"][0]["content"].append(
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                    "image_url": {"url": DataUri(image)},
                 }
             )
 
@@ -683,9 +699,9 @@ class AzureOpenAI(Provider):
             "top_p": default_parameters.get("top_p"),
             "stream": False,
         }
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
@@ -695,7 +711,7 @@ class AzureOpenAI(Provider):
             payload["messages"][0]["content"].append(
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                    "image_url": {"url": DataUri(image)},
                 }
             )
         payload["messages"][0]["content"].append({"type": "text", "text": call.message})
@@ -849,9 +865,9 @@ class Anthropic(Provider):
                 payload["tool_choice"] = {"type": "tool", "name": "return_structured_data"}
             except json.JSONDecodeError as e:
                 raise ServiceValidationError(f"Invalid JSON in structure parameter: {str(e)}")
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
@@ -863,8 +879,8 @@ class Anthropic(Provider):
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/jpeg",
-                        "data": f"{image}",
+                        "media_type": image_mime_type(image),
+                        "data": Base64Image(image),
                     },
                 }
             )
@@ -990,15 +1006,20 @@ class Google(Provider):
                 payload["generationConfig"]["response_json_schema"] = schema
             except json.JSONDecodeError as e:
                 raise ServiceValidationError(f"Invalid JSON in structure parameter: {str(e)}")
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
             payload["contents"][0]["parts"].append({"text": tag + ":"})
             payload["contents"][0]["parts"].append(
-                {"inline_data": {"mime_type": "image/jpeg", "data": image}}
+                {
+                    "inline_data": {
+                        "mime_type": image_mime_type(image),
+                        "data": Base64Image(image),
+                    }
+                }
             )
         payload["contents"][0]["parts"].append({"text": call.message})
 
@@ -1072,7 +1093,7 @@ class Groq(Provider):
 
     def _prepare_vision_data(self, call: dict) -> dict:
         default_parameters = self._get_default_parameters(call)
-        first_image = call.base64_images[0]
+        first_image = call.images[0]
         payload = {
             "messages": [
                 {
@@ -1081,9 +1102,7 @@ class Groq(Provider):
                         {"type": "text", "text": call.message},
                         {
                             "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{first_image}"
-                            },
+                            "image_url": {"url": DataUri(first_image)},
                         },
                     ],
                 }
@@ -1199,9 +1218,9 @@ class LocalAI(Provider):
             "temperature": default_parameters.get("temperature"),
             "top_p": default_parameters.get("top_p"),
         }
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
@@ -1211,7 +1230,7 @@ class LocalAI(Provider):
             payload["messages"][0]["content"].append(
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image}"},
+                    "image_url": {"url": DataUri(image)},
                 }
             )
         payload["messages"][0]["content"].append({"type": "text", "text": call.message})
@@ -1354,13 +1373,17 @@ class Ollama(Provider):
             if system_prompt:
                 payload["system"] = system_prompt
 
-        for image, filename in zip(call.base64_images, call.filenames):
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
-            image_message = {"role": "user", "content": tag + ":", "images": [image]}
+            image_message = {
+                "role": "user",
+                "content": tag + ":",
+                "images": [Base64Image(image)],
+            }
             payload["messages"].append(image_message)
         prompt_message = {"role": "user", "content": call.message}
         payload["messages"].append(prompt_message)
@@ -1480,7 +1503,8 @@ class AWSBedrock(Provider):
 
     async def invoke_bedrock(self, model: str, data: dict) -> dict:
         """Post data to url and return response data"""
-        _LOGGER.debug(f"AWS Bedrock request data: {Request.sanitize_data(data)}")
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"AWS Bedrock request data: {Request.sanitize_data(data)}")
 
         try:
             _LOGGER.info(f"Invoking Bedrock model {model} in {self.aws_region}")
@@ -1497,7 +1521,7 @@ class AWSBedrock(Provider):
             # Invoke the model with the response stream
             converse_kwargs = {
                 "modelId": model,
-                "messages": data.get("messages"),
+                "messages": with_raw_images(data.get("messages")),
                 "inferenceConfig": data.get("inferenceConfig"),
             }
             
@@ -1549,10 +1573,11 @@ class AWSBedrock(Provider):
             },
         }
 
-        # Bedrock converse API wants the raw bytes of the image
-        for image, filename in zip(call.base64_images, call.filenames):
+        # Bedrock converse API wants the raw bytes of the image (boto3), or
+        # base64 in the JSON body (bearer token)
+        for image, filename in zip(call.images, call.filenames):
             tag = (
-                ("Image " + str(call.base64_images.index(image) + 1))
+                ("Image " + str(call.images.index(image) + 1))
                 if filename == ""
                 else filename
             )
@@ -1560,8 +1585,8 @@ class AWSBedrock(Provider):
             payload["messages"][0]["content"].append(
                 {
                     "image": {
-                        "format": "jpeg",
-                        "source": {"bytes": base64.b64decode(image)},
+                        "format": image_mime_type(image).split("/")[1],
+                        "source": {"bytes": Base64Image(image)},
                     }
                 }
             )
@@ -0,0 +1,128 @@
+"""Scheduler limiting the number of concurrent ffmpeg processes"""
+
+import asyncio
+import heapq
+import logging
+import time
+from contextlib import asynccontextmanager
+from itertools import count
+
+from .const import (
+    CONF_FFMPEG_JOBS,
+    CONF_FFMPEG_TIMEOUT,
+    DATA_FFMPEG_SCHEDULER,
+    DEFAULT_FFMPEG_JOBS,
+    DEFAULT_FFMPEG_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FFmpegScheduler:
+    """Global queue for ffmpeg jobs, shared by all service calls
+
+    At most max_jobs ffmpeg processes run at once, so a burst of events
+    can't start a decoder per video. Waiting jobs are started in order of
+    priority, then in the order they were queued.
+
+    Args:
+        max_jobs (int): Maximum number of concurrent ffmpeg jobs
+        timeout (float): Seconds a job may run, unless it sets its own
+    """
+
+    def __init__(self, max_jobs=DEFAULT_FFMPEG_JOBS, timeout=DEFAULT_FFMPEG_TIMEOUT):
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        # (priority, sequence, future) of waiting jobs
+        self._queue = []
+        self._sequence = count()
+        # Metrics
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @asynccontextmanager
+    async def job(self, priority=0, timeout=None):
+        """Wait until an ffmpeg process may be started
+
+        Args:
+            priority (int): Lower values start first
+            timeout (float, optional): Seconds the job may run
+
+        Yields:
+            float: Seconds the job may run, the caller stops ffmpeg after
+        """
+        queued = time.monotonic()
+        if self.running < self.max_jobs and not self._queue:
+            self.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._sequence), future))
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await future
+            except asyncio.CancelledError:
+                # The slot may have been handed over just before the cancellation
+                if future.done() and not future.cancelled():
+                    self._release()
+                raise
+            finally:
+                self.waiting -= 1
+
+        wait_time = time.monotonic() - queued
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        try:
+            yield timeout or self.timeout
+        finally:
+            self.completed += 1
+            self._release()
+
+    def _release(self):
+        """Hand the slot to the next waiting job, or free it"""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    @property
+    def stats(self) -> dict:
+        """Queue length and wait time metrics"""
+        return {
+            "max_jobs": self.max_jobs,
+            "running": self.running,
+            "queued": self.waiting,
+            "peak_queued": self.peak_waiting,
+            "completed": self.completed,
+            "average_wait_ms": round(
+                1000 * self.total_wait_time / max(self.completed, 1), 2
+            ),
+            "max_wait_ms": round(1000 * self.max_wait_time, 2),
+        }
+
+
+def setup_ffmpeg_scheduler(hass, config: dict) -> FFmpegScheduler:
+    """Create the ffmpeg scheduler from Settings, replacing an existing one
+
+    Jobs running on the previous scheduler finish, new jobs use the new one.
+    """
+    max_jobs = int(config.get(CONF_FFMPEG_JOBS) or DEFAULT_FFMPEG_JOBS)
+    timeout = config.get(CONF_FFMPEG_TIMEOUT) or DEFAULT_FFMPEG_TIMEOUT
+    _LOGGER.debug(f"FFmpeg scheduler: {max_jobs} concurrent jobs, {timeout} s timeout")
+    scheduler = FFmpegScheduler(max_jobs=max_jobs, timeout=timeout)
+    hass.data[DATA_FFMPEG_SCHEDULER] = scheduler
+    return scheduler
+
+
+def get_ffmpeg_scheduler(hass) -> FFmpegScheduler:
+    """Return the shared ffmpeg scheduler, create it with defaults if needed"""
+    scheduler = hass.data.get(DATA_FFMPEG_SCHEDULER)
+    if scheduler is None:
+        scheduler = setup_ffmpeg_scheduler(hass, {})
+    return scheduler
@@ -0,0 +1,257 @@
+"""Selection of the most distinct frames across cameras"""
+
+import heapq
+from itertools import count
+
+import numpy as np
+
+# In diversity mode, the candidates are the max_frames * DIVERSITY_POOL_FACTOR
+# frames with the lowest SSIM scores
+DIVERSITY_POOL_FACTOR = 3
+
+
+def select_frames_with_minimums(camera_frames, max_frames, min_frames_per_camera):
+    """Select frames ensuring minimum representation per camera
+
+    Args:
+        camera_frames (dict): Dict of camera_entity -> frames
+        max_frames (int): Maximum total frames to select
+        min_frames_per_camera (int): Minimum frames each camera should contribute
+
+    Returns:
+        tuple: (selected_frames, camera_frames_count) where:
+            - selected_frames: list of (frame_name, frame_data, ssim_score) tuples
+            - camera_frames_count: dict of camera_entity -> count
+    """
+    if min_frames_per_camera == 0:
+        # Original behavior - no minimum per camera
+        frames_with_scores = []
+        for camera_entity in camera_frames:
+            for frame_name, frame_data in camera_frames[camera_entity].items():
+                frames_with_scores.append(
+                    (frame_name, frame_data["frame_data"], frame_data["ssim_score"])
+                )
+        frames_with_scores.sort(key=lambda x: x[2])
+        selected_frames = frames_with_scores[:max_frames]
+
+        # Calculate camera distribution for logging
+        camera_frames_count = {}
+        for frame_name, _, _ in selected_frames:
+            # Extract camera name from frame_name (format: "camera_name frame N")
+            camera_name = frame_name.rsplit(" frame ", 1)[0]
+            camera_frames_count[camera_name] = camera_frames_count.get(camera_name, 0) + 1
+
+        return selected_frames, camera_frames_count
+
+    # Build list of all frames with camera info
+    all_frames = []
+    for camera_entity in camera_frames:
+        for frame_name, frame_data in camera_frames[camera_entity].items():
+            all_frames.append(
+                (frame_name, frame_data["frame_data"], frame_data["ssim_score"], camera_entity)
+            )
+
+    # Sort by SSIM score (lower = more distinct)
+    all_frames.sort(key=lambda x: x[2])
+
+    selected_frames = []
+    selected_frame_names = set()  # Track selected frames by name
+    camera_frame_counts = {camera: 0 for camera in camera_frames.keys()}
+
+    # First pass: try to satisfy minimum frames per camera
+    for frame_name, frame_data, ssim_score, camera_entity in all_frames:
+        if len(selected_frames) >= max_frames:
+            break
+
+        if camera_frame_counts[camera_entity] < min_frames_per_camera:
+            selected_frames.append((frame_name, frame_data, ssim_score))
+            selected_frame_names.add(frame_name)
+            camera_frame_counts[camera_entity] += 1
+
+    # Second pass: fill remaining slots with best frames
+    for frame_name, frame_data, ssim_score, camera_entity in all_frames:
+        if len(selected_frames) >= max_frames:
+            break
+
+        # Skip if already selected
+        if frame_name in selected_frame_names:
+            continue
+
+        selected_frames.append((frame_name, frame_data, ssim_score))
+        selected_frame_names.add(frame_name)
+        camera_frame_counts[camera_entity] += 1
+
+    return selected_frames, camera_frame_counts
+
+
+class FrameSelector:
+    """Online frame selection with constant memory while recording
+
+    Each camera keeps only its max_frames most distinct frames in a bounded
+    max-heap on the SSIM score. The final selection never takes more than
+    max_frames frames from one camera, so the frames dropped from a heap
+    could not have been selected anyway and the result is the same as
+    selecting from all recorded frames.
+
+    Args:
+        max_frames (int): Maximum total frames to select
+        min_frames_per_camera (int): Minimum frames each camera should contribute
+        pool_size (int, optional): Frames kept per camera, at least max_frames
+    """
+
+    def __init__(self, max_frames, min_frames_per_camera=0, pool_size=None):
+        self.max_frames = max_frames
+        self.min_frames_per_camera = min_frames_per_camera
+        self.pool_size = max(max_frames, pool_size or 0)
+        self._heaps = {}
+        self._sequence = count()
+        self.added = 0
+
+    def add_camera(self, camera_entity):
+        """Register a camera, so it is counted even if it records no frames"""
+        self._heaps.setdefault(camera_entity, [])
+
+    def add(self, camera_entity, frame_name, frame, score, timestamp):
+        """Offer a frame, it is kept if it is among the camera's most distinct
+
+        Args:
+            camera_entity (str): Camera the frame was captured from
+            frame_name (str): Label of the frame
+            frame (Frame): Decoded frame
+            score (float): SSIM score against the previous frame, lower is more distinct
+            timestamp (float): Capture time of the frame
+        """
+        self.added += 1
+        heap = self._heaps.setdefault(camera_entity, [])
+        # Max-heap on the score, the latest frame goes first on equal scores
+        entry = (-score, -next(self._sequence), timestamp, frame_name, frame)
+        if len(heap) < self.pool_size:
+            heapq.heappush(heap, entry)
+        elif heap and entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def __len__(self):
+        """Number of frames currently kept"""
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def candidates(self):
+        """Kept frames as (camera_entity, frame_name, frame, score, timestamp)
+
+        Ordered by score, the most distinct frame first.
+        """
+        entries = sorted(
+            (-neg_score, -neg_sequence, camera_entity, frame_name, frame, timestamp)
+            for camera_entity, heap in self._heaps.items()
+            for neg_score, neg_sequence, timestamp, frame_name, frame in heap
+        )
+        return [
+            (camera_entity, frame_name, frame, score, timestamp)
+            for score, _, camera_entity, frame_name, frame, timestamp in entries
+        ]
+
+    def select(self):
+        """Select the frames, in the order they were captured
+
+        Returns:
+            tuple: (selected_frames, camera_frames_count) as returned by
+                select_frames_with_minimums
+        """
+        camera_frames, timestamps = {}, {}
+        for camera_entity, heap in self._heaps.items():
+            frames = camera_frames[camera_entity] = {}
+            # Offer the frames in the order they were added
+            for neg_score, _, timestamp, frame_name, frame in sorted(
+                heap, key=lambda x: -x[1]
+            ):
+                frames[frame_name] = {"frame_data": frame, "ssim_score": -neg_score}
+                timestamps[frame_name] = timestamp
+
+        selected_frames, camera_frames_count = select_frames_with_minimums(
+            camera_frames, self.max_frames, self.min_frames_per_camera
+        )
+        selected_frames.sort(key=lambda x: timestamps[x[0]])
+        return selected_frames, camera_frames_count
+
+    def select_diverse(self, features):
+        """Select the most diverse frames, in the order they were captured
+
+        Args:
+            features (list[np.ndarray]): Feature vector of each frame in candidates()
+
+        Returns:
+            tuple: (selected_frames, camera_frames_count) like select()
+        """
+        candidates = self.candidates()
+        selected = sorted(
+            (
+                candidates[index]
+                for index in select_diverse_frames(
+                    features,
+                    [camera_entity for camera_entity, *_ in candidates],
+                    self.max_frames,
+                    self.min_frames_per_camera,
+                )
+            ),
+            key=lambda x: x[4],
+        )
+        camera_frames_count = dict.fromkeys(self._heaps, 0)
+        for camera_entity, *_ in selected:
+            camera_frames_count[camera_entity] += 1
+        return [
+            (frame_name, frame, score) for _, frame_name, frame, score, _ in selected
+        ], camera_frames_count
+
+
+def select_diverse_frames(features, cameras, max_frames, min_frames_per_camera=0):
+    """Greedy farthest-point selection of the most diverse frames
+
+    Starts with the first candidate and repeatedly adds the candidate that is
+    farthest from all frames selected so far (greedy k-center). Cameras with
+    fewer than min_frames_per_camera frames are served first, round robin,
+    with each pick restricted to the frames of that camera.
+
+    Args:
+        features (np.ndarray): (n, d) feature vectors, the most important candidate first
+        cameras (list[str]): Camera of each candidate
+        max_frames (int): Maximum total frames to select
+        min_frames_per_camera (int): Minimum frames each camera should contribute
+
+    Returns:
+        list[int]: Indices of the selected candidates, in selection order
+    """
+    features = np.asarray(features, dtype=np.float32)
+    cameras = np.asarray(cameras)
+    selected = []
+    available = np.ones(len(features), dtype=bool)
+    distance = np.full(len(features), np.inf, dtype=np.float32)
+
+    def pick(mask):
+        if selected:
+            index = int(np.where(mask, distance, -1.0).argmax())
+        else:
+            index = int(mask.argmax())
+        selected.append(index)
+        available[index] = False
+        np.minimum(
+            distance, np.linalg.norm(features - features[index], axis=1), out=distance
+        )
+
+    # First pass: try to satisfy minimum frames per camera
+    counts = dict.fromkeys(cameras.tolist(), 0)
+    while len(selected) < max_frames:
+        picked = False
+        for camera in counts:
+            mask = available & (cameras == camera)
+            if counts[camera] < min_frames_per_camera and mask.any():
+                pick(mask)
+                counts[camera] += 1
+                picked = True
+                if len(selected) >= max_frames:
+                    break
+        if not picked:
+            break
+
+    # Second pass: fill remaining slots with the most diverse frames
+    while len(selected) < max_frames and available.any():
+        pick(available)
+    return selected
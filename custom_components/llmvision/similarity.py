@@ -0,0 +1,371 @@
+"""Structural similarity of frames, used to pick the most distinct frames"""
+
+import io
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Frames are scored on a small grayscale proxy of at most this width
+PROXY_WIDTH = 256
+
+# Side length of the square SSIM window in pixels
+SSIM_WINDOW = 7
+
+# Number of scales for multi-scale SSIM, each scale halves the resolution
+SSIM_SCALES = 2
+
+# Weights per scale from the MS-SSIM paper, finest scale first
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+# Consecutive pairs scored per vectorized pass, bounds the memory of a pass
+BATCH_PAIRS = 64
+
+# Side length of the difference hash, the hash has HASH_SIZE ** 2 bits
+HASH_SIZE = 16
+
+# Frames whose hashes differ in at most this many bits are near-duplicates
+HASH_THRESHOLD = 2
+
+# Frame features for diversity selection: side length of the grayscale
+# thumbnail and color histogram bins per channel
+FEATURE_SIZE = 16
+FEATURE_BINS = 4
+
+# Motion cropping works on MOTION_BLOCK x MOTION_BLOCK block means of the
+# proxies. Blocks whose mean changes by more than MOTION_THRESHOLD gray levels
+# are motion. Padding and minimum size of the crop are fractions of the frame.
+MOTION_BLOCK = 8
+MOTION_THRESHOLD = 12
+MOTION_PADDING = 0.1
+MOTION_MIN_SIZE = 0.3
+# Crops larger than this fraction of the frame are not worth it
+MOTION_MAX_AREA = 0.8
+
+K1 = 0.005
+K2 = 0.015
+L = 255
+C1 = (K1 * L) ** 2
+C2 = (K2 * L) ** 2
+
+
+def gray_proxy(img, width=PROXY_WIDTH):
+    """Grayscale array of img, scaled down to at most width pixels
+
+    Args:
+        img (PIL.Image.Image): Decoded image
+        width (int): Maximum width of the proxy
+
+    Returns:
+        np.ndarray: uint8 array of shape (height, width)
+    """
+    gray = img.convert("L")
+    if gray.width > width:
+        height = max(1, round(width * gray.height / gray.width))
+        gray = gray.resize((width, height), Image.Resampling.BOX, reducing_gap=2.0)
+    return np.asarray(gray)
+
+
+def load_gray_proxy(path, width=PROXY_WIDTH):
+    """Decode only the grayscale proxy of an image file
+
+    JPEG files are decoded in draft mode, only the luma channel at the
+    smallest DCT scale that is still at least width wide.
+
+    Args:
+        path (str): Path to the image file
+        width (int): Maximum width of the proxy
+    """
+    with Image.open(path) as img:
+        if img.format == "JPEG":
+            img.draft("L", (width, round(width * img.height / img.width)))
+        return gray_proxy(img, width)
+
+
+def load_gray_proxies(paths, width=PROXY_WIDTH):
+    """Grayscale proxies of image files, None for files that cannot be decoded"""
+    proxies = []
+    for path in paths:
+        try:
+            proxies.append(load_gray_proxy(path, width))
+        except (UnidentifiedImageError, OSError):
+            proxies.append(None)
+    return proxies
+
+
+def dhash(img, size=HASH_SIZE) -> int:
+    """Difference hash of an image, one bit per horizontal gradient
+
+    Args:
+        img (PIL.Image.Image | np.ndarray): Image or grayscale proxy
+        size (int): Side length of the hash
+
+    Returns:
+        int: Hash with size * size bits
+    """
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    thumbnail = np.asarray(
+        img.convert("L").resize((size + 1, size), Image.Resampling.BOX),
+        dtype=np.int16,
+    )
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_hash(data, size=HASH_SIZE) -> int:
+    """Difference hash of encoded image bytes, without a full decode
+
+    JPEG images are decoded in draft mode at the smallest DCT scale.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format == "JPEG":
+            img.draft("L", (size + 1, size))
+        return dhash(img, size)
+
+
+def hamming(a, b) -> int:
+    """Number of bits in which two hashes differ"""
+    return (a ^ b).bit_count()
+
+
+def distinct_frames(proxies, threshold=HASH_THRESHOLD):
+    """Indices of the frames that are no near-duplicate of the previous kept frame
+
+    Args:
+        proxies (list[np.ndarray]): Grayscale proxies in frame order
+        threshold (int): Maximum Hamming distance of near-duplicates
+
+    Returns:
+        list[int]: Indices of the frames to keep, the first frame is always kept
+    """
+    keep, previous = [], None
+    for index, proxy in enumerate(proxies):
+        current = dhash(proxy)
+        if previous is not None and hamming(previous, current) <= threshold:
+            continue
+        keep.append(index)
+        previous = current
+    return keep
+
+
+def frame_features(gray, image, size=FEATURE_SIZE, bins=FEATURE_BINS):
+    """Compact feature vector of a frame, for diversity selection
+
+    A size x size grayscale thumbnail, scaled so the distance of two frames
+    is the RMS difference of their thumbnails, followed by a normalized
+    bins ** 3 color histogram.
+
+    Args:
+        gray (np.ndarray): Grayscale proxy of the frame
+        image (PIL.Image.Image): Decoded RGB frame
+
+    Returns:
+        np.ndarray: float32 vector of size ** 2 + bins ** 3 values
+    """
+    thumbnail = np.asarray(
+        Image.fromarray(gray).resize((size, size), Image.Resampling.BOX),
+        dtype=np.float32,
+    )
+    # The histogram does not need more than a few thousand pixels
+    small = image.reduce(max(1, image.width // 64))
+    rgb = np.asarray(small.convert("RGB")).reshape(-1, 3) // (256 // bins)
+    index = (rgb[:, 0].astype(np.intp) * bins + rgb[:, 1]) * bins + rgb[:, 2]
+    histogram = np.bincount(index, minlength=bins**3) / len(index)
+    return np.concatenate(
+        (thumbnail.ravel() / (255 * size), histogram.astype(np.float32))
+    )
+
+
+def _block_means(x, block):
+    """Means of the block x block tiles of a 2D array"""
+    height, width = x.shape[0] // block, x.shape[1] // block
+    tiles = x[: height * block, : width * block].reshape(height, block, width, block)
+    return tiles.mean(axis=(1, 3), dtype=np.float32)
+
+
+def _padded_span(start, end, padding, min_size):
+    """Pad start and end, grow to min_size and shift the span into [0, 1]"""
+    start, end = start - padding, end + padding
+    if end - start < min_size:
+        center = (start + end) / 2
+        start, end = center - min_size / 2, center + min_size / 2
+    if start < 0:
+        start, end = 0.0, end - start
+    if end > 1:
+        start, end = start - (end - 1), 1.0
+    return max(0.0, start), min(1.0, end)
+
+
+def motion_box(
+    previous_frame,
+    current_frame,
+    threshold=MOTION_THRESHOLD,
+    padding=MOTION_PADDING,
+    min_size=MOTION_MIN_SIZE,
+):
+    """Padded bounding box of the region that changed between two frames
+
+    The proxies are compared on block means, which averages out sensor
+    noise and compression artifacts.
+
+    Args:
+        previous_frame (np.ndarray): Grayscale proxy of the previous frame
+        current_frame (np.ndarray): Grayscale proxy of the current frame
+        threshold (float): Change of a block mean in gray levels that is motion
+        padding (float): Padding around the changed region
+        min_size (float): Minimum width and height of the box
+
+    Returns:
+        tuple | None: (left, top, right, bottom) as fractions of the frame size,
+            None if nothing changed or the box covers most of the frame
+    """
+    height = min(previous_frame.shape[0], current_frame.shape[0])
+    width = min(previous_frame.shape[1], current_frame.shape[1])
+    block = min(MOTION_BLOCK, height, width)
+    diff = np.abs(
+        _block_means(previous_frame[:height, :width], block)
+        - _block_means(current_frame[:height, :width], block)
+    )
+    mask = diff > threshold
+    if not mask.any():
+        return None
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    columns = np.flatnonzero(mask.any(axis=0))
+    top, bottom = _padded_span(
+        rows[0] / mask.shape[0], (rows[-1] + 1) / mask.shape[0], padding, min_size
+    )
+    left, right = _padded_span(
+        columns[0] / mask.shape[1],
+        (columns[-1] + 1) / mask.shape[1],
+        padding,
+        min_size,
+    )
+    if (right - left) * (bottom - top) > MOTION_MAX_AREA:
+        return None
+    return (left, top, right, bottom)
+
+
+def _box_mean(stack, window):
+    """Mean over every window x window block of the last two axes (valid mode)
+
+    Separable box filter: running sums of shifted views, first along the
+    rows, then along the columns.
+    """
+    height = stack.shape[-2] - window + 1
+    rows = stack[..., :height, :].copy()
+    for shift in range(1, window):
+        rows += stack[..., shift : shift + height, :]
+    width = stack.shape[-1] - window + 1
+    box = rows[..., :width].copy()
+    for shift in range(1, window):
+        box += rows[..., shift : shift + width]
+    return box / (window * window)
+
+
+def _ssim(x, y, window):
+    """Mean windowed SSIM of float arrays x and y over their last two axes"""
+    window = min(window, x.shape[-2], x.shape[-1])
+    # Filter all local statistics in one pass
+    mu_x, mu_y, mean_xx, mean_yy, mean_xy = _box_mean(
+        np.stack((x, y, x * x, y * y, x * y)), window
+    )
+    mu_xy = mu_x * mu_y
+    mu_xx = mu_x * mu_x
+    mu_yy = mu_y * mu_y
+    sigma_xy = mean_xy - mu_xy
+    sigma_xx = mean_xx - mu_xx
+    sigma_yy = mean_yy - mu_yy
+
+    ssim_map = ((2 * mu_xy + C1) * (2 * sigma_xy + C2)) / (
+        (mu_xx + mu_yy + C1) * (sigma_xx + sigma_yy + C2)
+    )
+    return ssim_map.mean(axis=(-2, -1), dtype=np.float64)
+
+
+def _downsample(x):
+    """Halve the resolution of the last two axes by averaging 2x2 blocks"""
+    height, width = x.shape[-2] // 2 * 2, x.shape[-1] // 2 * 2
+    x = x[..., :height, :width]
+    return (
+        x[..., 0::2, 0::2] + x[..., 1::2, 0::2] + x[..., 0::2, 1::2] + x[..., 1::2, 1::2]
+    ) / 4
+
+
+def ssim(x, y, window=SSIM_WINDOW, scales=1):
+    """Windowed (multi-scale) SSIM of grayscale arrays
+
+    SSIM by Z. Wang: https://ece.uwaterloo.ca/~z70wang/research/ssim/
+    The local statistics are computed with box filters instead of a gaussian
+    window. With scales > 1 the SSIM of each scale is weighted as in MS-SSIM.
+
+    Args:
+        x (np.ndarray): Grayscale array(s) of shape (..., height, width)
+        y (np.ndarray): Grayscale array(s) of the same shape as x
+        window (int): Side length of the SSIM window
+        scales (int): Number of scales (1 to 5)
+
+    Returns:
+        float | np.ndarray: SSIM score(s), 1.0 for identical frames
+    """
+    # float32 is precise enough for window sums of 8 bit values and their squares
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    weights = MS_SSIM_WEIGHTS[:scales] if scales > 1 else (1.0,)
+
+    score = 0.0
+    for scale, weight in enumerate(weights):
+        if scale:
+            if min(x.shape[-2:]) < 2 * window:
+                # Too small for another scale, use the weights so far
+                weights = weights[:scale]
+                break
+            x, y = _downsample(x), _downsample(y)
+        score = score + weight * _ssim(x, y, window)
+    return score / sum(weights)
+
+
+def similarity_score(previous_frame, current_frame, scales=SSIM_SCALES):
+    """Similarity of two grayscale proxies, lower means more different
+
+    Args:
+        previous_frame (np.ndarray): Grayscale proxy of the previous frame
+        current_frame (np.ndarray): Grayscale proxy of the current frame
+        scales (int): Number of scales for multi-scale SSIM
+    """
+    # Ensure both frames have same dimensions
+    if previous_frame.shape != current_frame.shape:
+        height = min(previous_frame.shape[0], current_frame.shape[0])
+        width = min(previous_frame.shape[1], current_frame.shape[1])
+        previous_frame = previous_frame[:height, :width]
+        current_frame = current_frame[:height, :width]
+    return float(ssim(previous_frame, current_frame, scales=scales))
+
+
+def consecutive_scores(proxies, scales=SSIM_SCALES, batch=BATCH_PAIRS):
+    """Similarity of each frame to the next one, for a whole clip at once
+
+    The proxies are stacked into one (n, height, width) array, cropped to
+    their common area, and all consecutive pairs are scored in vectorized
+    passes of up to batch pairs.
+
+    Args:
+        proxies (list[np.ndarray]): Grayscale proxies in frame order
+        scales (int): Number of scales for multi-scale SSIM
+        batch (int): Maximum number of pairs per pass
+
+    Returns:
+        np.ndarray: n - 1 scores, score i compares frame i with frame i + 1
+    """
+    if len(proxies) < 2:
+        return np.empty(0)
+    height = min(proxy.shape[0] for proxy in proxies)
+    width = min(proxy.shape[1] for proxy in proxies)
+    stack = np.stack([proxy[:height, :width] for proxy in proxies])
+
+    scores = np.empty(len(stack) - 1)
+    for start in range(0, len(scores), batch):
+        end = min(start + batch, len(scores))
+        scores[start:end] = ssim(
+            stack[start:end], stack[start + 1 : end + 1], scales=scales
+        )
+    return scores
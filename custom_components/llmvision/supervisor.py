@@ -0,0 +1,236 @@
+"""Supervisor for ffmpeg and ffprobe subprocesses"""
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import weakref
+from contextlib import asynccontextmanager
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+from .const import (
+    CONF_FFMPEG_IONICE,
+    CONF_FFMPEG_NICE,
+    CONF_FFMPEG_THREADS,
+    DATA_PROCESS_SUPERVISOR,
+    DATA_RETIRED_SUPERVISORS,
+    DEFAULT_FFMPEG_IONICE,
+    DEFAULT_FFMPEG_NICE,
+    DEFAULT_FFMPEG_THREADS,
+    IONICE_BEST_EFFORT,
+    IONICE_IDLE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds a process gets to exit after SIGTERM, before it is killed
+TERMINATE_TIMEOUT = 5
+
+# ionice arguments of each I/O scheduling class
+IONICE_ARGS = {
+    IONICE_BEST_EFFORT: ["-c", "2", "-n", "7"],
+    IONICE_IDLE: ["-c", "3"],
+}
+
+
+class ProcessSupervisor:
+    """Starts subprocesses at low priority and makes sure they are stopped
+
+    Each process runs in its own process group, so stopping it also stops
+    any child it started. A process still running when its context exits,
+    on timeouts, errors or cancellation, is sent SIGTERM, then SIGKILL if it
+    doesn't exit within TERMINATE_TIMEOUT seconds, and is always reaped.
+
+    Args:
+        nice (int): Niceness of the processes, 0 (normal) to 19 (lowest)
+        ionice (str): I/O scheduling class: "none", "best_effort" or "idle"
+        threads (int): Threads per ffmpeg process, 0 lets ffmpeg decide
+    """
+
+    def __init__(
+        self,
+        nice=DEFAULT_FFMPEG_NICE,
+        ionice=DEFAULT_FFMPEG_IONICE,
+        threads=DEFAULT_FFMPEG_THREADS,
+    ):
+        self.nice = int(nice)
+        self.threads = int(threads)
+        self._ionice = None
+        if ionice in IONICE_ARGS:
+            executable = shutil.which("ionice")
+            if executable:
+                self._ionice = [executable, *IONICE_ARGS[ionice]]
+            else:
+                _LOGGER.debug("ionice not found, I/O priority is not lowered")
+        self._processes = set()
+        self._closed = False
+        # Metrics
+        self.peak_running = 0
+        self.started = 0
+        self.terminated = 0
+        self.killed = 0
+
+    def ffmpeg_options(self):
+        """Input options limiting the resources of an ffmpeg process"""
+        return ["-threads", str(self.threads)] if self.threads else []
+
+    @asynccontextmanager
+    async def process(self, program, *args, **kwargs):
+        """Start program and stop it when the context exits
+
+        Args:
+            program (str): Executable, e.g. "ffmpeg"
+            *args: Command line arguments
+            **kwargs: Passed to asyncio.create_subprocess_exec
+
+        Yields:
+            asyncio.subprocess.Process: The running process
+        """
+        if self._closed:
+            raise RuntimeError("Process supervisor is shut down")
+        command = [*(self._ionice or []), program, *args]
+        process = await asyncio.create_subprocess_exec(
+            *command, start_new_session=True, **kwargs
+        )
+        self._processes.add(process)
+        self.started += 1
+        self.peak_running = max(self.peak_running, len(self._processes))
+        try:
+            self._lower_priority(process)
+            yield process
+        finally:
+            try:
+                await self.stop(process)
+            finally:
+                self._processes.discard(process)
+
+    def _lower_priority(self, process):
+        if self.nice <= 0:
+            return
+        try:
+            os.setpriority(os.PRIO_PROCESS, process.pid, self.nice)
+        except (AttributeError, OSError) as e:
+            # Not supported on this platform, or the process already exited
+            _LOGGER.debug(f"Couldn't lower priority of process {process.pid}: {e}")
+
+    async def stop(self, process):
+        """Terminate, then kill, a running process and reap it"""
+        if process.returncode is not None:
+            return
+        self._signal(process, signal.SIGTERM)
+        self.terminated += 1
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+        except TimeoutError:
+            _LOGGER.warning(
+                f"Process {process.pid} didn't exit within {TERMINATE_TIMEOUT} "
+                "seconds, killing it"
+            )
+            self._signal(process, signal.SIGKILL)
+            self.killed += 1
+            await process.wait()
+
+    @staticmethod
+    def _signal(process, sig):
+        """Signal the process group, which includes children of the process"""
+        try:
+            os.killpg(process.pid, sig)
+        except AttributeError:
+            process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+    @property
+    def running(self):
+        """Number of processes currently running"""
+        return len(self._processes)
+
+    @property
+    def stats(self) -> dict:
+        """Process gauge and counters"""
+        return {
+            "running": self.running,
+            "peak_running": self.peak_running,
+            "started": self.started,
+            "terminated": self.terminated,
+            "killed": self.killed,
+        }
+
+    def shutdown(self):
+        """Kill all running processes, new processes can't be started"""
+        self._closed = True
+        for process in self._processes:
+            if process.returncode is None:
+                self._signal(process, signal.SIGKILL)
+
+
+def _retired_supervisors(hass) -> weakref.WeakSet:
+    """Supervisors whose processes still run after a reload
+
+    Home Assistant stopping kills their processes along with those of the
+    current supervisor. The stop listener is registered with the set, once,
+    so reloads don't add listeners. A retired supervisor drops out once its
+    processes have exited and their calls are done.
+    """
+    retired = hass.data.get(DATA_RETIRED_SUPERVISORS)
+    if retired is None:
+        retired = hass.data[DATA_RETIRED_SUPERVISORS] = weakref.WeakSet()
+
+        def _shutdown(event):
+            shutdown_process_supervisor(hass)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _shutdown)
+    return retired
+
+
+def setup_process_supervisor(hass, config: dict) -> ProcessSupervisor:
+    """Create the process supervisor from Settings, replacing an existing one
+
+    Processes of the previous supervisor run until their context exits.
+    """
+    supervisor = ProcessSupervisor(
+        nice=config.get(CONF_FFMPEG_NICE, DEFAULT_FFMPEG_NICE),
+        ionice=config.get(CONF_FFMPEG_IONICE, DEFAULT_FFMPEG_IONICE),
+        threads=config.get(CONF_FFMPEG_THREADS, DEFAULT_FFMPEG_THREADS),
+    )
+    retire_process_supervisor(hass)
+    _LOGGER.debug(
+        f"Process supervisor: nice {supervisor.nice}, "
+        f"ionice {supervisor._ionice}, {supervisor.threads or 'auto'} threads"
+    )
+    hass.data[DATA_PROCESS_SUPERVISOR] = supervisor
+    return supervisor
+
+
+def get_process_supervisor(hass) -> ProcessSupervisor:
+    """Return the shared process supervisor, create it with defaults if needed"""
+    supervisor = hass.data.get(DATA_PROCESS_SUPERVISOR)
+    if supervisor is None:
+        supervisor = setup_process_supervisor(hass, {})
+    return supervisor
+
+
+def shutdown_process_supervisor(hass) -> None:
+    """Kill the processes of the shared supervisor and retired ones"""
+    supervisor = hass.data.pop(DATA_PROCESS_SUPERVISOR, None)
+    if supervisor is not None:
+        supervisor.shutdown()
+    retired = hass.data.get(DATA_RETIRED_SUPERVISORS)
+    if retired:
+        for supervisor in list(retired):
+            supervisor.shutdown()
+        retired.clear()
+
+
+def retire_process_supervisor(hass) -> None:
+    """Forget the shared supervisor, its processes run until their calls end
+
+    Used when Settings are reloaded. The processes are still killed if Home
+    Assistant stops before they are done.
+    """
+    retired = _retired_supervisors(hass)
+    supervisor = hass.data.pop(DATA_PROCESS_SUPERVISOR, None)
+    if supervisor is not None and supervisor.running:
+        retired.add(supervisor)
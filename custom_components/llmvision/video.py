@@ -0,0 +1,498 @@
+"""Keyframe extraction from videos with ffmpeg"""
+
+import asyncio
+import io
+import json
+import logging
+import struct
+import numpy as np
+from aiofile import async_open
+from PIL import Image
+
+from .const import (
+    CONF_FRAME_EXTRACTION,
+    CONF_SCENE_THRESHOLD,
+    CONF_STREAM_CLIPS,
+    DEFAULT_FRAME_EXTRACTION,
+    DEFAULT_SCENE_THRESHOLD,
+    DEFAULT_STREAM_CLIPS,
+)
+from .similarity import dhash, gray_proxy
+from .supervisor import ProcessSupervisor
+
+_LOGGER = logging.getLogger(__name__)
+
+# Clips whose moov box doesn't end within this many bytes are downloaded first
+MAX_SNIFF_BYTES = 4 * 1024 * 1024
+
+# Timestamp sampling seeks to this many frames per frame in the pool
+SEEK_SAMPLES_PER_FRAME = 3
+MAX_SEEK_SAMPLES = 60
+
+# Clips with more keyframes per sample are sampled by timestamp, decoding
+# all their keyframes costs more than seeking
+MAX_KEYFRAMES_PER_SAMPLE = 10
+
+# Top-level boxes that can precede moov in an MP4 file
+MP4_LEADING_BOXES = {b"ftyp", b"styp", b"free", b"skip", b"wide", b"uuid", b"pdin"}
+
+
+async def probe_video_size(video_path, data=None, supervisor=None):
+    """Width and height of the first video stream, read with ffprobe
+
+    Args:
+        video_path (str): Path of the video file, "pipe:0" to probe data
+        data (bytes, optional): Start of a clip, fed to ffprobe's stdin
+        supervisor (ProcessSupervisor, optional): Runs ffprobe
+
+    Raises:
+        ValueError: If ffprobe fails or the file has no video stream
+    """
+    async with (supervisor or ProcessSupervisor()).process(
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=width,height",
+        "-of",
+        "csv=s=x:p=0",
+        video_path,
+        stdin=None if data is None else asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    ) as process:
+        stdout, stderr = await process.communicate(data)
+    if process.returncode != 0:
+        raise ValueError(
+            f"ffprobe failed with return code {process.returncode}: "
+            f"{stderr.decode(errors='replace').strip()}"
+        )
+    try:
+        width, height = (int(value) for value in stdout.decode().split()[0].split("x")[:2])
+    except (IndexError, ValueError):
+        raise ValueError(f"No video stream found in {video_path}") from None
+    return width, height
+
+
+async def probe_keyframes(video_path, supervisor=None):
+    """Duration and number of keyframes of the first video stream
+
+    Only the packet headers are read, nothing is decoded.
+
+    Args:
+        video_path (str): Path of the video file
+        supervisor (ProcessSupervisor, optional): Runs ffprobe
+
+    Returns:
+        tuple: (duration in seconds or None if unknown, number of keyframes)
+
+    Raises:
+        ValueError: If ffprobe fails
+    """
+    async with (supervisor or ProcessSupervisor()).process(
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "format=duration:packet=flags",
+        "-of",
+        "json",
+        video_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    ) as process:
+        stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise ValueError(
+            f"ffprobe failed with return code {process.returncode}: "
+            f"{stderr.decode(errors='replace').strip()}"
+        )
+    try:
+        result = json.loads(stdout)
+    except ValueError:
+        raise ValueError(f"Invalid ffprobe output for {video_path}") from None
+    try:
+        duration = float(result["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        duration = None
+    keyframes = sum(
+        "K" in packet.get("flags", "") for packet in result.get("packets", [])
+    )
+    return duration, keyframes
+
+
+def sampling_timestamps(duration, keyframes, samples):
+    """Timestamps to sample a clip at, or None to decode its keyframes
+
+    Keyframes are decoded unless the clip has fewer keyframes than samples
+    (cameras with long GOPs) or so many that seeking is cheaper (long
+    recordings). Timestamps are the centers of samples equal segments.
+
+    Args:
+        duration (float): Duration of the clip in seconds, None if unknown
+        keyframes (int): Number of keyframes in the clip
+        samples (int): Number of frames wanted
+
+    Returns:
+        list[float]: Timestamps in seconds, None for keyframe sampling
+    """
+    if not duration or duration <= 0 or samples <= 0:
+        return None
+    if samples <= keyframes <= MAX_KEYFRAMES_PER_SAMPLE * samples:
+        return None
+    return [duration * (index + 0.5) / samples for index in range(samples)]
+
+
+async def seek_frame(
+    video_path, timestamp, video_filter=None, output=None, timeout=300, supervisor=None
+):
+    """Decode the frame at timestamp as JPEG, seeking in the input
+
+    ffmpeg seeks to the keyframe before timestamp and only decodes from
+    there, instead of decoding the whole clip.
+
+    Args:
+        video_path (str): Path of the video file
+        timestamp (float): Position in seconds
+        video_filter (str, optional): Filter graph, e.g. for scaling
+        output (str, optional): File to write the JPEG to instead of returning it
+        timeout (float): Seconds after which ffmpeg is stopped
+        supervisor (ProcessSupervisor, optional): Runs ffmpeg
+
+    Returns:
+        bytes: The JPEG, None if written to output or there is no frame at timestamp
+
+    Raises:
+        ValueError: If ffmpeg fails
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    async with supervisor.process(
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        *supervisor.ffmpeg_options(),
+        "-ss",
+        f"{timestamp:.3f}",
+        "-an",
+        "-sn",
+        "-dn",
+        "-i",
+        video_path,
+        "-frames:v",
+        "1",
+        *(["-vf", video_filter] if video_filter else []),
+        "-c:v",
+        "mjpeg",
+        "-q:v",
+        "2",
+        *([output] if output else ["-f", "image2pipe", "pipe:1"]),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=None if _LOGGER.isEnabledFor(logging.DEBUG) else asyncio.subprocess.DEVNULL,
+    ) as process:
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except TimeoutError:
+            raise ValueError(
+                f"FFmpeg failed to seek to {timestamp:.3f} s within {timeout} seconds"
+            ) from None
+    if process.returncode != 0:
+        raise ValueError(f"FFmpeg failed with return code {process.returncode}")
+    return stdout or None
+
+
+def scaled_size(width, height, target_width):
+    """Size frames are extracted with, at most target_width wide
+
+    Both sides are even, as required by most ffmpeg pixel formats.
+    """
+    scaled_width = min(width, target_width) if target_width else width
+    scaled_width = max(2, scaled_width - scaled_width % 2)
+    scaled_height = round(scaled_width * height / width)
+    return scaled_width, max(2, scaled_height + scaled_height % 2)
+
+
+def mp4_moov_end(data):
+    """Whether ffmpeg can read an MP4 clip from a pipe, given its first bytes
+
+    A clip is streamable if the moov box with the stream metadata comes
+    before the media data (faststart or fragmented MP4).
+
+    Args:
+        data (bytes): Start of the clip
+
+    Returns:
+        int | bool | None: Offset where the moov box ends if the clip is
+            streamable, False if it isn't, None if more data is needed
+    """
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > len(data):
+                return None
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        if box_type == b"moov":
+            return offset + size if size >= header else False
+        if box_type not in MP4_LEADING_BOXES or size < header:
+            # mdat before moov, or not an MP4 file
+            return False
+        offset += size
+    return None
+
+
+class ClipStream:
+    """Download that is saved to a file and fed to ffmpeg at the same time
+
+    The copy waits until ffmpeg is attached, or the stream is detached to
+    only save the file. If ffmpeg stops reading, the download continues into
+    the file, so the complete clip is available as fallback.
+
+    Args:
+        prefix (bytes): Data already read from the response
+        chunks: Async iterator over the rest of the response body
+        target_file (str): File the complete clip is saved to
+    """
+
+    def __init__(self, prefix, chunks, target_file):
+        self.prefix = bytes(prefix)
+        self.target_file = target_file
+        self.written = 0
+        self._chunks = chunks
+        self._stdin = None
+        self._attached = asyncio.Event()
+
+    def attach(self, stdin):
+        """Feed the clip to stdin of an ffmpeg process"""
+        self._stdin = stdin
+        self._attached.set()
+
+    def detach(self):
+        """Stop feeding ffmpeg, only save the file"""
+        self._stdin = None
+        self._attached.set()
+
+    async def _feed(self, data):
+        if self._stdin is None:
+            return
+        try:
+            self._stdin.write(data)
+            await self._stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            _LOGGER.debug(f"FFmpeg stopped reading after {self.written} bytes")
+            self._stdin = None
+
+    async def _iter_chunks(self):
+        yield self.prefix
+        async for data in self._chunks:
+            yield data
+
+    async def run(self):
+        """Copy the download until it ends, then close ffmpeg's stdin"""
+        await self._attached.wait()
+        try:
+            async with async_open(self.target_file, "wb") as output:
+                async for data in self._iter_chunks():
+                    await output.write(data)
+                    await self._feed(data)
+                    self.written += len(data)
+        finally:
+            if self._stdin is not None:
+                self._stdin.close()
+        _LOGGER.debug(f"Wrote {self.written} bytes into {self.target_file}")
+
+
+class ExtractionProfile:
+    """How keyframes are extracted from videos
+
+    Scaling and scene change detection run in the ffmpeg filter graph, so
+    only small candidate frames leave ffmpeg.
+
+    Args:
+        mode (str): "files" writes JPEGs to disk, "pipe" streams raw frames
+        scene_threshold (float): Minimum ffmpeg scene score (0-1) a keyframe
+            needs to be extracted, 0 extracts all keyframes
+        stream_clips (bool): Extract frames from downloaded clips while they
+            are downloading
+    """
+
+    def __init__(
+        self,
+        mode=DEFAULT_FRAME_EXTRACTION,
+        scene_threshold=DEFAULT_SCENE_THRESHOLD,
+        stream_clips=DEFAULT_STREAM_CLIPS,
+    ):
+        self.mode = mode
+        self.scene_threshold = float(scene_threshold)
+        self.stream_clips = stream_clips
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Create the profile from the Settings config entry"""
+        return cls(
+            mode=config.get(CONF_FRAME_EXTRACTION, DEFAULT_FRAME_EXTRACTION),
+            scene_threshold=config.get(CONF_SCENE_THRESHOLD, DEFAULT_SCENE_THRESHOLD),
+            stream_clips=config.get(CONF_STREAM_CLIPS, DEFAULT_STREAM_CLIPS),
+        )
+
+    def video_filter(self, width=None, height=None, scene_detection=True):
+        """ffmpeg filter graph for the extracted frames
+
+        Args:
+            width (int, optional): Frames wider than width are scaled down
+            height (int, optional): Scale to exactly width x height instead
+            scene_detection (bool): Drop unchanged frames, if enabled
+
+        Returns:
+            str: Filter graph for -vf, None if no filter is needed
+        """
+        filters = []
+        if width and height:
+            filters.append(f"scale={width}:{height}")
+        elif width:
+            filters.append(f"scale='min(iw,{width})':-2")
+        if scene_detection and self.scene_threshold > 0:
+            # Scene scores are computed on the scaled frames, which is cheaper;
+            # the first frame has no predecessor and is always kept
+            filters.append(f"select='eq(n,0)+gt(scene,{self.scene_threshold:g})'")
+        return ",".join(filters) or None
+
+
+def frame_proxy(frame):
+    """Grayscale proxy and difference hash of an RGB frame array"""
+    proxy = gray_proxy(Image.fromarray(frame))
+    return proxy, dhash(proxy)
+
+
+class FrameBuffer:
+    """Preallocated RGB frames, slots are reused once released
+
+    Args:
+        slots (int): Number of frames the buffer holds
+        width (int): Frame width in pixels
+        height (int): Frame height in pixels
+    """
+
+    def __init__(self, slots, width, height):
+        self.frames = np.empty((slots, height, width, 3), dtype=np.uint8)
+        self._free = list(range(slots - 1, -1, -1))
+
+    @property
+    def frame_size(self):
+        """Size of one frame in bytes"""
+        return self.frames[0].nbytes
+
+    def acquire(self):
+        """Index of a free slot"""
+        if not self._free:
+            raise RuntimeError("All frame buffer slots are in use")
+        return self._free.pop()
+
+    def release(self, slot):
+        """Return a slot to the buffer"""
+        self._free.append(slot)
+
+    def load(self, slot, data):
+        """Decode an encoded image into slot, scaled to the frame size"""
+        height, width = self.frames.shape[1:3]
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+        if image.size != (width, height):
+            image = image.resize((width, height))
+        self.frames[slot] = np.asarray(image)
+
+    def image(self, slot):
+        """Copy of the frame in slot as PIL image"""
+        return Image.fromarray(self.frames[slot].copy())
+
+
+async def pipe_keyframes(
+    video_path, buffer, profile=None, clip=None, timeout=300, supervisor=None
+):
+    """Decode the keyframes of a video into buffer, as they arrive
+
+    ffmpeg scales the frames to the buffer size and writes them to stdout as
+    raw RGB, nothing is written to disk. The consumer owns each slot it
+    receives and has to release it to the buffer.
+
+    Args:
+        video_path (str): Path of the video file
+        buffer (FrameBuffer): Buffer with the size frames are extracted with
+        profile (ExtractionProfile, optional): Adds scene change detection
+        clip (ClipStream, optional): Download to read from instead of video_path
+        timeout (float): Seconds after which ffmpeg is stopped
+        supervisor (ProcessSupervisor, optional): Runs ffmpeg
+
+    Yields:
+        tuple: (index, slot) with the 1-based keyframe index and buffer slot
+
+    Raises:
+        ValueError: If ffmpeg fails
+    """
+    height, width = buffer.frames.shape[1:3]
+    video_filter = (profile or ExtractionProfile()).video_filter(width, height)
+    output = None if _LOGGER.isEnabledFor(logging.DEBUG) else asyncio.subprocess.DEVNULL
+    supervisor = supervisor or ProcessSupervisor()
+    async with supervisor.process(
+        "ffmpeg",
+        "-hide_banner",
+        *supervisor.ffmpeg_options(),
+        "-hwaccel",
+        "auto",
+        "-skip_frame",
+        "nokey",
+        "-an",
+        "-sn",
+        "-dn",
+        "-i",
+        "pipe:0" if clip else video_path,
+        "-fps_mode",
+        "passthrough",
+        "-vf",
+        video_filter,
+        "-pix_fmt",
+        "rgb24",
+        "-f",
+        "rawvideo",
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE if clip else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=output,
+    ) as process:
+        if clip:
+            clip.attach(process.stdin)
+        # The deadline only covers ffmpeg, the time the consumer takes is added
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        index = 0
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(
+                        process.stdout.readexactly(buffer.frame_size),
+                        deadline - loop.time(),
+                    )
+                except asyncio.IncompleteReadError:
+                    break
+                slot = buffer.acquire()
+                buffer.frames[slot] = np.frombuffer(data, dtype=np.uint8).reshape(
+                    height, width, 3
+                )
+                index += 1
+                yielded = loop.time()
+                yield index, slot
+                deadline += loop.time() - yielded
+            await asyncio.wait_for(process.wait(), max(0, deadline - loop.time()))
+        except TimeoutError:
+            raise ValueError(
+                f"FFmpeg failed to process video within {timeout} seconds"
+            ) from None
+
+    _LOGGER.debug(f"FFmpeg piped {index} frames of {width}x{height}")
+    if process.returncode != 0:
+        raise ValueError(f"FFmpeg failed with return code {process.returncode}")
@@ -0,0 +1,109 @@
+"""Temporary directories for downloaded clips and extracted frames"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from .const import CONF_TMP_PATH, DATA_TMP_PATH, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+WORKSPACE_PREFIX = "workspace_"
+
+# Workspaces older than this are left behind by a restart, not used by a call
+STALE_WORKSPACE_AGE = 3600  # seconds
+
+
+def default_tmp_path(hass):
+    """Base path used when no tmp path is configured"""
+    return hass.config.path(f"custom_components/{DOMAIN}/tmp")
+
+
+def setup_tmp_path(hass, config: dict) -> str:
+    """Set the base path for workspaces from Settings"""
+    path = config.get(CONF_TMP_PATH) or default_tmp_path(hass)
+    _LOGGER.debug(f"Workspace path: {path}")
+    hass.data[DATA_TMP_PATH] = path
+    return path
+
+
+def get_tmp_path(hass) -> str:
+    """Return the configured base path for workspaces"""
+    return hass.data.get(DATA_TMP_PATH) or default_tmp_path(hass)
+
+
+def remove_stale_workspaces(path, max_age=STALE_WORKSPACE_AGE):
+    """Delete workspaces left behind by a restart during a call
+
+    Recent workspaces are kept, they can belong to a call that is still
+    running while the Settings entry is reloaded.
+
+    Returns:
+        int: Number of deleted workspaces
+    """
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    with entries:
+        for entry in entries:
+            if (
+                entry.name.startswith(WORKSPACE_PREFIX)
+                and entry.is_dir(follow_symlinks=False)
+                and entry.stat(follow_symlinks=False).st_mtime < cutoff
+            ):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    if removed:
+        _LOGGER.info(f"Deleted {removed} stale workspaces in {path}")
+    return removed
+
+
+class Workspace:
+    """Temporary directory owned by one service call
+
+    Each call gets its own directory below the base path, so concurrent
+    calls never see or delete each other's files. The directory and
+    everything in it is deleted when the call leaves the context.
+
+    Args:
+        base_path (str): Directory the workspace is created in, e.g. a tmpfs
+            mount to keep temporary files off an SD card
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.path = None
+
+    @property
+    def clips_dir(self):
+        """Directory for downloaded videos"""
+        return os.path.join(self.path, "clips")
+
+    @property
+    def frames_dir(self):
+        """Directory for extracted frames"""
+        return os.path.join(self.path, "frames")
+
+    def _create(self):
+        os.makedirs(self.base_path, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=self.base_path)
+        os.mkdir(os.path.join(path, "clips"))
+        os.mkdir(os.path.join(path, "frames"))
+        return path
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.path = await loop.run_in_executor(None, self._create)
+        _LOGGER.debug(f"Created workspace {self.path}")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, shutil.rmtree, self.path, True)
+        _LOGGER.debug(f"Deleted workspace {self.path}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the SSIM engine in similarity.py against the previous global
+SSIM on full resolution frames.
+
+Times the whole path of a frame through scoring: decoding the JPEG written
+by ffmpeg, converting it to grayscale (a proxy for the windowed SSIM) and
+scoring it against the previous frame. Not part of the test suite, timings
+depend on the machine. Run from the project root:
+
+    python tests/benchmark_similarity.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from custom_components.llmvision.similarity import load_gray_proxy, similarity_score
+from unit.test_similarity import add_object, create_scene, legacy_similarity_score
+
+
+def best_of(func, runs):
+    """Fastest of runs calls of func, in seconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy(previous_path, current_path):
+    """Full resolution grayscale frames and the global SSIM, as used before"""
+    with Image.open(previous_path) as previous, Image.open(current_path) as current:
+        return legacy_similarity_score(
+            np.asarray(previous.convert("L")), np.asarray(current.convert("L"))
+        )
+
+
+def windowed(previous_path, current_path):
+    """Grayscale proxies decoded in draft mode and the windowed SSIM"""
+    return similarity_score(
+        load_gray_proxy(previous_path), load_gray_proxy(current_path)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="runs per method")
+    args = parser.parse_args()
+
+    scene = create_scene()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for number, x in enumerate((400, 460)):
+            path = os.path.join(tmp, f"frame{number}.jpg")
+            Image.fromarray(add_object(scene, x)).convert("RGB").save(path, quality=90)
+            paths.append(path)
+
+        legacy_time = best_of(lambda: legacy(*paths), args.runs)
+        windowed_time = best_of(lambda: windowed(*paths), args.runs)
+
+    print(f"Legacy SSIM on full frames:   {legacy_time * 1000:8.2f} ms")
+    print(f"Windowed SSIM on proxies:     {windowed_time * 1000:8.2f} ms")
+    print(f"Speedup:                      {legacy_time / windowed_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
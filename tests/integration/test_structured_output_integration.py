@@ -71,10 +71,10 @@ class MockHass:
 class MockServiceCall:
     """Mock service call that matches the ServiceCallData interface"""
     
-    def __init__(self, response_format="text", structure=None, base64_images=None, filenames=None, message="Test message"):
+    def __init__(self, response_format="text", structure=None, images=None, filenames=None, message="Test message"):
         self.response_format = response_format
         self.structure = structure
-        self.base64_images = base64_images or []
+        self.images = images or []
         self.filenames = filenames or []
         self.message = message
         self.use_memory = False
@@ -122,7 +122,7 @@ class TestStructuredOutputIntegration:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
             # Set images on the request object
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -141,7 +141,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -200,7 +200,7 @@ class TestStructuredOutputIntegration:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
             # Set images on the request object
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -218,7 +218,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -277,7 +277,7 @@ class TestStructuredOutputIntegration:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
             # Set images on the request object
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema (Google doesn't support additionalProperties)
@@ -295,7 +295,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -360,7 +360,7 @@ class TestStructuredOutputIntegration:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
             # Set images on the request object
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -378,7 +378,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -451,7 +451,7 @@ class TestStructuredOutputIntegration:
         try:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -470,7 +470,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -527,7 +527,7 @@ class TestStructuredOutputIntegration:
         try:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -545,7 +545,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -608,7 +608,7 @@ class TestStructuredOutputIntegration:
         try:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -626,7 +626,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
@@ -693,7 +693,7 @@ class TestStructuredOutputIntegration:
         try:
             # Create Request instance
             request = Request(hass, "What is the dominant color in this image?", 100, 0.1)
-            request.base64_images = [create_test_image_base64()]
+            request.images = [create_test_image_base64()]
             request.filenames = ["test_image.png"]
             
             # Define test schema
@@ -711,7 +711,7 @@ class TestStructuredOutputIntegration:
             call = MockServiceCall(
                 response_format="json",
                 structure=json.dumps(color_schema),
-                base64_images=[create_test_image_base64()],
+                images=[create_test_image_base64()],
                 filenames=["test_image.png"],
                 message="What is the dominant color in this image? Respond with confidence level and whether it's a single solid color."
             )
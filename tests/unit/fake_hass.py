@@ -0,0 +1,342 @@
+"""
+Stand-ins for Home Assistant and the provider client, for unit tests of
+MediaProcessor that don't need a running Home Assistant instance.
+"""
+
+import asyncio
+import io
+import json
+import os
+import struct
+import types
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest.mock import patch
+
+import aiohttp
+import numpy as np
+from multidict import CIMultiDict
+from PIL import Image
+
+from custom_components.llmvision.media_handlers import MediaProcessor
+
+
+def jpeg(width=320, height=180, seed=0):
+    """JPEG of a smooth random image, different for each seed"""
+    rng = np.random.default_rng(seed)
+    texture = (rng.random((height // 8, width // 8, 3)) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(texture).resize((width, height)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class FakeStates:
+    """State machine with a camera proxy picture for each entity in entities"""
+
+    def __init__(self, entities=()):
+        self.entities = set(entities)
+
+    def get(self, entity_id):
+        if entity_id not in self.entities:
+            return None
+        return types.SimpleNamespace(
+            entity_id=entity_id,
+            attributes={
+                "entity_picture": f"/api/camera_proxy/{entity_id}?token=abc",
+                "friendly_name": entity_id,
+            },
+        )
+
+
+class FakeHass:
+    """The parts of HomeAssistant used by MediaProcessor, create it in a loop
+
+    Args:
+        config_dir (str): Directory hass.config.path() resolves into
+        entities (list[str]): Entity ids that exist
+    """
+
+    def __init__(self, config_dir, entities=()):
+        self.loop = asyncio.get_running_loop()
+        self.config = types.SimpleNamespace(
+            path=lambda *parts: os.path.join(config_dir, *parts)
+        )
+        self.states = FakeStates(entities)
+        self.data = {}
+        # Listeners by event type, fire them with fire()
+        self.listeners = {}
+        self.bus = types.SimpleNamespace(
+            async_listen_once=lambda event_type, listener: self.listeners.setdefault(
+                event_type, []
+            ).append(listener)
+        )
+
+    def fire(self, event_type):
+        for listener in self.listeners.pop(event_type, []):
+            listener(types.SimpleNamespace(event_type=event_type))
+
+    async def async_add_executor_job(self, func, *args):
+        return await self.loop.run_in_executor(None, func, *args)
+
+
+class FakeClient:
+    """Provider client that keeps the frames added to the request"""
+
+    def __init__(self):
+        self.images = []
+        self.filenames = []
+
+    def add_frame(self, image, filename):
+        self.images.append(image)
+        self.filenames.append(filename)
+
+
+def media_processor(hass, session=None, client=None):
+    """MediaProcessor with session instead of Home Assistant's HTTP session"""
+    with patch(
+        "custom_components.llmvision.media_handlers.async_get_clientsession",
+        return_value=session,
+    ):
+        return MediaProcessor(hass, client or FakeClient())
+
+
+def box(box_type, payload=b""):
+    """MP4 box with a 32-bit size"""
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mp4_clip(streamable=True, size=64 * 1024):
+    """MP4 clip with its moov box before or after the media data"""
+    moov = box(b"moov", b"\0" * 100)
+    mdat = box(b"mdat", bytes(range(256)) * (size // 256))
+    if streamable:
+        return box(b"ftyp", b"isom") + moov + mdat
+    return box(b"ftyp", b"isom") + mdat + moov
+
+
+class FakeContent:
+    """Response body, iter_any() continues where the last iteration stopped"""
+
+    def __init__(self, data, chunk_size, interrupt=None):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.interrupt = interrupt
+        self.position = 0
+
+    async def iter_any(self):
+        while self.position < len(self.data):
+            if self.interrupt is not None and self.position >= self.interrupt:
+                raise aiohttp.ClientPayloadError("Connection lost")
+            await asyncio.sleep(0)
+            chunk = self.data[self.position : self.position + self.chunk_size]
+            self.position += len(chunk)
+            yield chunk
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_any()])
+
+
+class FakeResponse:
+    def __init__(self, status, headers, body=b"", chunk_size=4096, interrupt=None):
+        self.status = status
+        self.ok = status < 400
+        self.headers = CIMultiDict(headers)
+        self.content = FakeContent(body, chunk_size, interrupt)
+
+    async def read(self):
+        return await self.content.read()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    """HTTP session serving clip at every URL, like a Frigate clip with an ETag
+
+    Args:
+        clip (bytes): Body of each response
+        interrupt (int, optional): The first GET response breaks off after
+            this many bytes
+        chunk_size (int): Bytes per chunk of the response body
+    """
+
+    def __init__(self, clip, interrupt=None, chunk_size=4096):
+        self.clip = clip
+        self.interrupt = interrupt
+        self.chunk_size = chunk_size
+        self.requests = []
+
+    def head(self, url, **kwargs):
+        self.requests.append(("HEAD", url, None))
+        return FakeResponse(
+            200, {"Content-Length": str(len(self.clip)), "ETag": '"clip"'}
+        )
+
+    def get(self, url, headers=None, **kwargs):
+        requested = (headers or {}).get("Range")
+        self.requests.append(("GET", url, requested))
+        if requested:
+            start = int(requested[len("bytes=") :].split("-")[0])
+            return FakeResponse(
+                206,
+                {"Content-Range": f"bytes {start}-{len(self.clip) - 1}/{len(self.clip)}"},
+                self.clip[start:],
+                self.chunk_size,
+            )
+        interrupt, self.interrupt = self.interrupt, None
+        return FakeResponse(200, {}, self.clip, self.chunk_size, interrupt)
+
+
+class FakeStdin:
+    """Pipe to a fake process, it reads everything until it is closed"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = asyncio.Event()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        await asyncio.sleep(0)
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeProcess:
+    def __init__(self, stdin):
+        self.stdin = FakeStdin() if stdin == asyncio.subprocess.PIPE else None
+        self.stdout = asyncio.StreamReader()
+        self.returncode = None
+        self._exited = asyncio.Event()
+
+    async def wait(self):
+        await self._exited.wait()
+        return self.returncode
+
+    async def communicate(self, data=None):
+        if data is not None:
+            self.stdin.write(data)
+            self.stdin.close()
+        await self.wait()
+        return await self.stdout.read(), b""
+
+    def exit(self, returncode):
+        self.stdout.feed_eof()
+        self.returncode = returncode
+        self._exited.set()
+
+
+class FakeFFmpeg:
+    """Process supervisor that imitates ffmpeg and ffprobe instead of running them
+
+    Keyframe extraction writes the keyframes as JPEG files, or pipes them as
+    raw frames. Seeking writes or returns the frame at a timestamp, these
+    frames are twice as wide as the keyframes. Written frames are scaled down
+    by a scale filter. Clips piped to stdin are read to the end first.
+
+    Args:
+        keyframes (int): Number of keyframes of every clip
+        duration (float): Duration of every clip in seconds
+        width (int): Width of the keyframes, they are 16:9, see clip_width
+        fail_streamed (int, optional): Extraction from a piped clip fails
+            after writing this many keyframes
+    """
+
+    def __init__(self, keyframes=8, duration=10.0, width=160, fail_streamed=None):
+        self.keyframes = keyframes
+        self.duration = duration
+        self.width = width
+        self.fail_streamed = fail_streamed
+        # (program, args, data read from stdin) of each process
+        self.commands = []
+        self.running = 0
+        self.peak_running = 0
+
+    def ffmpeg_options(self):
+        return []
+
+    @property
+    def stats(self):
+        return {"running": self.running, "peak_running": self.peak_running}
+
+    @asynccontextmanager
+    async def process(self, program, *args, stdin=None, **kwargs):
+        process = FakeProcess(stdin)
+        self.running += 1
+        self.peak_running = max(self.peak_running, self.running)
+        run = asyncio.create_task(self._run(process, program, args))
+        try:
+            yield process
+        finally:
+            run.cancel()
+            self.running -= 1
+
+    def clip_width(self, source):
+        """Width of the keyframes of the clip at source"""
+        return self.width
+
+    @staticmethod
+    def scaled_width(args, width):
+        """Width of frames scaled by the scale='min(iw,W)' filter of args"""
+        video_filter = args[args.index("-vf") + 1] if "-vf" in args else ""
+        if video_filter.startswith("scale='min(iw,"):
+            return min(width, int(video_filter[len("scale='min(iw,") :].split(")")[0]))
+        return width
+
+    @staticmethod
+    def frame(seed, width):
+        return jpeg(width, width * 9 // 16, seed)
+
+    async def _run(self, process, program, args):
+        await asyncio.sleep(0)
+        piped = process.stdin is not None and "pipe:0" in args
+        if piped:
+            await process.stdin.closed.wait()
+        self.commands.append(
+            (program, args, bytes(process.stdin.data) if process.stdin else None)
+        )
+        width = self.clip_width(args[args.index("-i") + 1] if "-i" in args else args[-1])
+        if program == "ffprobe":
+            if "stream=width,height" in args:
+                output = f"{width}x{width * 9 // 16}\n".encode()
+            else:
+                packets = [{"flags": "K_"}] * self.keyframes + [{"flags": "__"}] * 50
+                output = json.dumps(
+                    {"format": {"duration": str(self.duration)}, "packets": packets}
+                ).encode()
+            process.stdout.feed_data(output)
+            return process.exit(0)
+
+        target = args[-1]
+        if "-ss" in args:
+            # Seeking returns different frames than keyframe extraction
+            timestamp = float(args[args.index("-ss") + 1])
+            data = self.frame(
+                1000 + int(timestamp * 10), self.scaled_width(args, width * 2)
+            )
+            if target == "pipe:1":
+                process.stdout.feed_data(data)
+            else:
+                await asyncio.to_thread(Path(target).write_bytes, data)
+            return process.exit(0)
+
+        keyframes = self.keyframes
+        if piped and self.fail_streamed is not None:
+            keyframes = self.fail_streamed
+        for index in range(1, keyframes + 1):
+            if target == "pipe:1":
+                width, height = map(int, args[args.index("-vf") + 1][6:].split(":"))
+                with Image.open(io.BytesIO(self.frame(index, width))) as image:
+                    rgb = image.convert("RGB").resize((width, height))
+                process.stdout.feed_data(np.asarray(rgb).tobytes())
+            else:
+                await asyncio.to_thread(
+                    Path(target % index).write_bytes,
+                    self.frame(index, self.scaled_width(args, width)),
+                )
+        process.exit(1 if keyframes != self.keyframes else 0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the image cache in cache.py.
+Tests LRU eviction within the byte budget and hit/miss counters.
+"""
+
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from PIL import Image
+
+from custom_components.llmvision.cache import ImageCache, content_hash
+from custom_components.llmvision.frame import EncoderProfile, Frame
+
+
+def create_frame(width=100, height=100):
+    """Create a frame of width * height * 3 bytes"""
+    return Frame(Image.new("RGB", (width, height)))
+
+
+@pytest.mark.unit
+class TestImageCache(unittest.TestCase):
+    """Test cases for the image cache"""
+
+    def setUp(self):
+        self.profile = EncoderProfile()
+
+    def key(self, data, target_width=640, profile=None):
+        return ImageCache.key(content_hash(data), target_width, profile or self.profile)
+
+    def test_hit_and_miss_counters(self):
+        """Lookups are counted as hits or misses"""
+        cache = ImageCache(max_bytes=1_000_000)
+        frame = create_frame()
+        self.assertIsNone(cache.get(self.key(b"a")))
+        cache.put(self.key(b"a"), frame)
+        self.assertIs(cache.get(self.key(b"a")), frame)
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_key_includes_width_and_profile(self):
+        """The same content with another width or profile is a different entry"""
+        cache = ImageCache(max_bytes=1_000_000)
+        cache.put(self.key(b"a"), create_frame())
+        self.assertIsNone(cache.get(self.key(b"a", target_width=1280)))
+        self.assertIsNone(cache.get(self.key(b"a", profile=EncoderProfile(quality=50))))
+        self.assertIsNone(cache.get(self.key(b"b")))
+
+    def test_least_recently_used_is_evicted(self):
+        """Frames beyond the byte budget are evicted in LRU order"""
+        # Room for two 30 kB frames
+        cache = ImageCache(max_bytes=70_000)
+        cache.put(self.key(b"a"), create_frame())
+        cache.put(self.key(b"b"), create_frame())
+        cache.get(self.key(b"a"))
+        cache.put(self.key(b"c"), create_frame())
+        self.assertIsNotNone(cache.get(self.key(b"a")))
+        self.assertIsNone(cache.get(self.key(b"b")))
+        self.assertIsNotNone(cache.get(self.key(b"c")))
+        self.assertEqual(cache.stats["evictions"], 1)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_encoded_size_is_accounted(self):
+        """Putting a frame again after encoding updates the cache size"""
+        cache = ImageCache(max_bytes=1_000_000)
+        frame = create_frame()
+        cache.put(self.key(b"a"), frame)
+        size = cache.size
+        frame.encode(self.profile)
+        cache.put(self.key(b"a"), frame)
+        self.assertGreater(cache.size, size)
+        self.assertEqual(cache.stats["entries"], 1)
+
+    def test_zero_budget_disables_cache(self):
+        """With a budget of 0 nothing is cached"""
+        cache = ImageCache(max_bytes=0)
+        cache.put(self.key(b"a"), create_frame())
+        self.assertIsNone(cache.get(self.key(b"a")))
+        self.assertEqual(cache.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Unit tests for clip downloads in download.py.
+Tests the backoff, polling until a clip is ready and resuming interrupted
+downloads against a local HTTP server.
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+import aiohttp
+from aiohttp import web
+
+from custom_components.llmvision.download import (
+    MAX_RETRY_DELAY,
+    backoff_delay,
+    clip_version,
+    download,
+    is_frigate_clip,
+    wait_until_ready,
+)
+
+CLIP = bytes(range(256)) * 400
+ETAG = '"clip"'
+
+
+class ClipServer:
+    """Serves CLIP, like Frigate once the event's recording is written
+
+    Args:
+        missing (int): Number of requests answered with 404 first
+        interrupt (int): Number of downloads cut off halfway
+        ranges (bool): Whether Range requests are supported
+        head (bool): Whether HEAD requests are supported
+        forbidden (bool): Whether HEAD requests are refused, like by presigned
+            URLs that only allow GET
+    """
+
+    def __init__(self, missing=0, interrupt=0, ranges=True, head=True, forbidden=False):
+        self.missing = missing
+        self.forbidden = forbidden
+        self.interrupt = interrupt
+        self.ranges = ranges
+        self.head = head
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append((request.method, request.headers.get("Range")))
+        if request.method == "HEAD" and not self.head:
+            raise web.HTTPMethodNotAllowed("HEAD", ["GET"])
+        if request.method == "HEAD" and self.forbidden:
+            raise web.HTTPForbidden()
+        if self.missing:
+            self.missing -= 1
+            raise web.HTTPNotFound()
+        if request.method == "HEAD":
+            return web.Response(
+                headers={"Content-Length": str(len(CLIP)), "ETag": ETAG}
+            )
+        start, end = 0, len(CLIP) - 1
+        ranged = self.ranges and request.headers.get("Range")
+        if ranged:
+            first, last = request.headers["Range"][len("bytes=") :].split("-")
+            start, end = int(first), int(last or end)
+        response = web.StreamResponse(status=206 if ranged else 200)
+        response.content_length = end + 1 - start
+        response.headers["ETag"] = ETAG
+        if ranged:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(CLIP)}"
+        await response.prepare(request)
+        if self.interrupt:
+            self.interrupt -= 1
+            # Half the clip arrives before the connection drops
+            half = start + (end + 1 - start) // 2
+            for offset in range(start, half, len(CLIP) // 8):
+                await response.write(CLIP[offset : min(offset + len(CLIP) // 8, half)])
+                await asyncio.sleep(0.01)
+            request.transport.close()
+            return response
+        await response.write(CLIP[start : end + 1])
+        return response
+
+    async def run(self, test):
+        """Run test(session, url) against the server"""
+        app = web.Application()
+        app.router.add_route("*", "/clip.mp4", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await test(session, f"http://127.0.0.1:{port}/clip.mp4")
+        finally:
+            await runner.cleanup()
+
+
+@pytest.mark.unit
+class TestDownload(unittest.TestCase):
+    """Test cases for clip downloads"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.target = os.path.join(self.tmp.name, "clip.mp4")
+
+    def read_target(self):
+        with open(self.target, "rb") as file:
+            return file.read()
+
+    def test_backoff_delay(self):
+        """Delays double up to the maximum, with up to half of them random"""
+        rng = random.Random(0)
+        for attempt, delay in ((1, 2), (2, 4), (3, 8), (10, MAX_RETRY_DELAY)):
+            for _ in range(20):
+                value = backoff_delay(attempt, 2, rng)
+                self.assertGreaterEqual(value, delay / 2)
+                self.assertLessEqual(value, delay)
+
+    def test_clip_version(self):
+        """Clips are versioned by ETag, or by Last-Modified and length"""
+        modified = "Wed, 21 Oct 2026 07:28:00 GMT"
+        self.assertEqual(clip_version({"ETag": '"abc"', "Content-Length": "1"}), '"abc"')
+        self.assertEqual(
+            clip_version({"Last-Modified": modified, "Content-Length": "10"}),
+            f"{modified}/10",
+        )
+        self.assertIsNone(clip_version({"Content-Length": "10"}))
+
+    def test_wait_until_ready(self):
+        """Polls until the clip is available, or gives up"""
+        server = ClipServer(missing=2)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertEqual(ready["Content-Length"], str(len(CLIP)))
+        self.assertEqual(clip_version(ready), ETAG)
+        self.assertEqual([method for method, _ in server.requests], ["HEAD"] * 3)
+
+        server = ClipServer(missing=3)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertIsNone(ready)
+
+    def test_probe_refused(self):
+        """Only a missing clip is polled again, a refused probe isn't"""
+        server = ClipServer(forbidden=True)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertEqual(len(ready), 0)
+        self.assertIsNone(clip_version(ready))
+        self.assertEqual(server.requests, [("HEAD", None)])
+
+    def test_is_frigate_clip(self):
+        """Only clips of Frigate events are polled"""
+        self.assertTrue(
+            is_frigate_clip(
+                "http://homeassistant:8123/api/frigate/notifications/1.2-ab/clip.mp4?authSig=x"
+            )
+        )
+        self.assertFalse(is_frigate_clip("http://frigate:5000/api/events/1/clip.mp4"))
+        self.assertFalse(
+            is_frigate_clip("https://bucket.s3.amazonaws.com/clip.mp4?X-Amz-Signature=x")
+        )
+
+    def test_head_not_supported(self):
+        """Servers without HEAD support are polled for the first byte of the clip"""
+        server = ClipServer(missing=2, head=False)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertEqual(ready["Content-Length"], str(len(CLIP)))
+        self.assertEqual(clip_version(ready), ETAG)
+        self.assertEqual(
+            server.requests, [("HEAD", None)] + [("GET", "bytes=0-0")] * 3
+        )
+
+        # Servers that ignore the range start sending the whole clip
+        server = ClipServer(head=False, ranges=False)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertEqual(ready["Content-Length"], str(len(CLIP)))
+
+        server = ClipServer(missing=3, head=False)
+        ready = asyncio.run(
+            server.run(lambda session, url: wait_until_ready(session, url, 3, 0.01))
+        )
+        self.assertIsNone(ready)
+
+    def test_resume(self):
+        """An interrupted download continues where it stopped"""
+        server = ClipServer(interrupt=1)
+        size = asyncio.run(
+            server.run(
+                lambda session, url: download(session, url, self.target, 2, 0.01)
+            )
+        )
+        self.assertEqual(size, len(CLIP))
+        self.assertEqual(self.read_target(), CLIP)
+        self.assertEqual(
+            server.requests,
+            [("GET", None), ("GET", f"bytes={len(CLIP) // 2}-")],
+        )
+
+    def test_range_not_supported(self):
+        """The clip is downloaded again if the server ignores the range"""
+        server = ClipServer(interrupt=1, ranges=False)
+        size = asyncio.run(
+            server.run(
+                lambda session, url: download(session, url, self.target, 2, 0.01)
+            )
+        )
+        self.assertEqual(size, len(CLIP))
+        self.assertEqual(self.read_target(), CLIP)
+
+    def test_download_fails(self):
+        """Gives up after the configured number of attempts"""
+        server = ClipServer(missing=3)
+        with self.assertRaises(ValueError):
+            asyncio.run(
+                server.run(
+                    lambda session, url: download(session, url, self.target, 3, 0.01)
+                )
+            )
+        self.assertEqual(len(server.requests), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the bounded media executor in executor.py.
+Tests that jobs run off the event loop and the queue depth stays bounded.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.executor import MediaExecutor
+
+
+@pytest.mark.unit
+class TestMediaExecutor(unittest.TestCase):
+    """Test cases for the media executor"""
+
+    def test_runs_in_worker_thread(self):
+        """Jobs run on the pool's own threads and return their result"""
+
+        async def run():
+            executor = MediaExecutor(max_workers=1)
+            try:
+                return await executor.run(lambda: threading.current_thread().name)
+            finally:
+                executor.shutdown()
+
+        self.assertTrue(asyncio.run(run()).startswith("llmvision_media"))
+
+    def test_queue_depth_is_bounded(self):
+        """No more than max_queue jobs are handed to the pool at once"""
+
+        async def run():
+            executor = MediaExecutor(max_workers=2, max_queue=3)
+            try:
+                await asyncio.gather(
+                    *[executor.run(time.sleep, 0.01) for _ in range(12)]
+                )
+                return executor.stats
+            finally:
+                executor.shutdown()
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats["peak_queue_depth"], 3)
+        self.assertEqual(stats["completed"], 12)
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["waiting"], 0)
+
+    def test_exceptions_are_propagated(self):
+        """Exceptions raised by a job are raised to the caller"""
+
+        def fail():
+            raise ValueError("broken image")
+
+        async def run():
+            executor = MediaExecutor(max_workers=1)
+            try:
+                await executor.run(fail)
+            finally:
+                executor.shutdown()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+    def test_run_cpu_uses_threads_by_default(self):
+        """Without worker processes, run_cpu runs on the thread pool"""
+
+        async def run():
+            executor = MediaExecutor(max_workers=1)
+            try:
+                return await executor.run_cpu(os.getpid), executor.stats
+            finally:
+                executor.shutdown()
+
+        pid, stats = asyncio.run(run())
+        self.assertEqual(pid, os.getpid())
+        self.assertEqual(stats["backend"], "threads")
+
+    def test_run_cpu_in_worker_process(self):
+        """With the processes backend, run_cpu runs in a worker process"""
+
+        async def run():
+            executor = MediaExecutor(max_workers=1, backend="processes")
+            try:
+                loop = asyncio.get_running_loop()
+                if not await loop.run_in_executor(None, executor.start_processes):
+                    self.skipTest("Worker processes not available")
+                return await executor.run_cpu(os.getpid), executor.stats
+            finally:
+                executor.shutdown()
+
+        pid, stats = asyncio.run(run())
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(stats["backend"], "processes")
+
+    def test_retire_lets_jobs_finish(self):
+        """A retired executor finishes its jobs, then shuts down"""
+
+        async def run():
+            executor = MediaExecutor(max_workers=1, max_queue=1)
+            first = asyncio.create_task(executor.run(time.sleep, 0.05))
+            # Waits for the slot of the first job
+            second = asyncio.create_task(executor.run(lambda: "done"))
+            await asyncio.sleep(0.01)
+            executor.retire()
+            self.assertFalse(executor._closed)
+            await first
+            result = await second
+            return executor, result
+
+        executor, result = asyncio.run(run())
+        self.assertEqual(result, "done")
+        self.assertTrue(executor._closed)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(executor.run(time.sleep, 0))
+
+    def test_retire_idle(self):
+        """An idle executor shuts down when it is retired"""
+        executor = MediaExecutor(max_workers=1)
+        executor.retire()
+        self.assertTrue(executor._closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Frame abstraction in frame.py.
+Tests that frames are decoded once and encoded at most once per size.
+"""
+
+import io
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from PIL import Image
+
+import base64
+
+from custom_components.llmvision.frame import (
+    EncoderProfile,
+    Frame,
+    can_pass_through,
+    image_mime_type,
+)
+
+
+def create_test_image(width=1920, height=1080, mode="RGB", format="JPEG"):
+    """Create an encoded test image"""
+    img = Image.new(mode, (width, height), color="red" if mode == "RGB" else None)
+    buffer = io.BytesIO()
+    img.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+class TestFrame(unittest.TestCase):
+    """Test cases for decode-once frames"""
+
+    def test_decode_scales_to_target_width(self):
+        """Decoded frame is scaled to target width, keeping the aspect ratio"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        self.assertEqual(frame.image.size, (640, 360))
+
+    def test_jpeg_decoded_at_reduced_scale(self):
+        """JPEG frames are decoded at the smallest DCT scale not below target width"""
+        frame = Frame.decode(create_test_image(3840, 2160), target_width=640)
+        self.assertEqual(frame.image.size, (640, 360))
+        # Scoring uses a small grayscale proxy
+        self.assertEqual(frame.gray.shape, (144, 256))
+
+    def test_gray_without_target_width(self):
+        """Without a target width the frame is decoded at full resolution"""
+        frame = Frame.decode(create_test_image())
+        self.assertEqual(frame.gray.shape, (144, 256))
+        self.assertEqual(frame.image.size, (1920, 1080))
+
+    def test_png_is_reduced(self):
+        """Non JPEG images are scaled to the target width as well"""
+        frame = Frame.decode(create_test_image(format="PNG"), target_width=640)
+        self.assertEqual(frame.image.size, (640, 360))
+
+    def test_small_image_is_not_upscaled(self):
+        """Images narrower than the target width keep their size"""
+        frame = Frame.decode(create_test_image(320, 240), target_width=640)
+        self.assertEqual(frame.image.size, (320, 240))
+
+    def test_encode_is_cached(self):
+        """Encoding the same frame twice returns the same bytes object"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        encoded = frame.encode()
+        self.assertIs(frame.encode(), encoded)
+        with Image.open(io.BytesIO(encoded)) as img:
+            self.assertEqual(img.format, "JPEG")
+            self.assertEqual(img.size, (640, 360))
+
+    def test_full_size_reuses_jpeg_source(self):
+        """Full size exposure of a JPEG frame reuses the original bytes"""
+        data = create_test_image()
+        frame = Frame.decode(data, target_width=640, keep_source=True)
+        self.assertIs(frame.encode_full_size(), data)
+
+    def test_full_size_without_source(self):
+        """Without the source, full size exposure falls back to the scaled image"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        self.assertIs(frame.encode_full_size(), frame.encode())
+
+    def test_crop(self):
+        """Cropped frames keep the scale and have their own encoding"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        frame.encode()
+        cropped = frame.crop((0.25, 0.5, 0.75, 1.0))
+        self.assertEqual(cropped.image.size, (320, 180))
+        self.assertEqual(cropped.encoded, {})
+        with Image.open(io.BytesIO(cropped.encode())) as img:
+            self.assertEqual(img.size, (320, 180))
+
+    def test_rgba_png_is_converted(self):
+        """Transparent images are converted so they can be saved as JPEG"""
+        frame = Frame.decode(create_test_image(mode="RGBA", format="PNG"))
+        self.assertEqual(frame.image.mode, "RGB")
+        self.assertTrue(frame.encode())
+
+    def test_encode_with_webp_profile(self):
+        """Frames can be encoded as WebP, cached separately from JPEG"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        webp = frame.encode(EncoderProfile(format="WEBP", quality=60))
+        self.assertIsNot(webp, frame.encode())
+        with Image.open(io.BytesIO(webp)) as img:
+            self.assertEqual(img.format, "WEBP")
+            self.assertEqual(img.size, (640, 360))
+
+    def test_lower_quality_is_smaller(self):
+        """Lower quality JPEG profiles produce smaller images"""
+        img = Image.effect_noise((640, 360), 64).convert("RGB")
+        frame = Frame(img)
+        high = frame.encode(EncoderProfile(quality=95, subsampling="4:4:4"))
+        low = frame.encode(EncoderProfile(quality=50, subsampling="4:2:0"))
+        self.assertLess(len(low), len(high))
+
+    def test_mime_type_is_sniffed(self):
+        """The mime type is detected from the base64 encoded image"""
+        frame = Frame.decode(create_test_image(), target_width=640)
+        for profile, mime_type in (
+            (EncoderProfile(), "image/jpeg"),
+            (EncoderProfile(format="WEBP"), "image/webp"),
+        ):
+            encoded = base64.b64encode(frame.encode(profile)).decode("utf-8")
+            self.assertEqual(image_mime_type(encoded), mime_type)
+            self.assertEqual(profile.mime_type, mime_type)
+        png = base64.b64encode(create_test_image(format="PNG")).decode("utf-8")
+        self.assertEqual(image_mime_type(png), "image/png")
+
+    def test_small_jpeg_passes_through(self):
+        """JPEGs no wider than the target width can be sent as they are"""
+        self.assertTrue(can_pass_through(create_test_image(640, 360), 640))
+        self.assertTrue(can_pass_through(create_test_image(320, 240, mode="L"), 640))
+
+    def test_passthrough_requirements(self):
+        """Wide, non JPEG or CMYK images and non JPEG profiles are re-encoded"""
+        self.assertFalse(can_pass_through(create_test_image(1280, 720), 640))
+        self.assertFalse(can_pass_through(create_test_image(320, 240, format="PNG"), 640))
+        self.assertFalse(can_pass_through(create_test_image(320, 240, mode="CMYK"), 640))
+        self.assertFalse(
+            can_pass_through(
+                create_test_image(320, 240), 640, EncoderProfile(format="WEBP")
+            )
+        )
+        self.assertFalse(can_pass_through(b"not an image", 640))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the frame cache in frame_cache.py.
+Tests reading frames back, expiry, the size cap and cache keys.
+"""
+
+import os
+import tempfile
+import time
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.frame_cache import (
+    FrameCache,
+    cache_key,
+    clip_id,
+    file_digest,
+    file_identity,
+)
+
+
+def selection(size=1000):
+    """Frames as selected from a clip: (name, JPEG bytes, score, motion box)"""
+    return [
+        ("ab12_frame00001", b"\xff\xd8" + b"1" * size, 0.5, None),
+        ("ab12_frame00004", b"\xff\xd8" + b"4" * size, 0.25, (0.1, 0.2, 0.6, 0.8)),
+    ]
+
+
+@pytest.mark.unit
+class TestFrameCache(unittest.TestCase):
+    """Test cases for the frame cache"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "frame_cache")
+
+    def test_put_get(self):
+        """Cached frames are read back as they were stored"""
+        cache = FrameCache(self.path, max_bytes=100_000, ttl=3600)
+        self.assertIsNone(cache.get("clip"))
+        cache.put("clip", selection())
+        frames = cache.get("clip")
+        self.assertEqual(
+            [(name, data, score, box and tuple(box)) for name, data, score, box in frames],
+            selection(),
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.stats["entries"], 1)
+        self.assertEqual(os.listdir(self.path), ["clip"])
+
+    def test_ttl(self):
+        """Expired entries are not used and are deleted"""
+        cache = FrameCache(self.path, max_bytes=100_000, ttl=3600)
+        cache.put("old", selection())
+        cache.put("new", selection())
+        old = time.time() - 7200
+        os.utime(os.path.join(self.path, "old", "frames.json"), (old, old))
+        self.assertIsNone(cache.get("old"))
+        self.assertIsNotNone(cache.get("new"))
+        self.assertEqual(os.listdir(self.path), ["new"])
+
+    def test_size_cap(self):
+        """The least recently used entries are evicted over the budget"""
+        cache = FrameCache(self.path, max_bytes=10_000, ttl=3600)
+        for number, key in enumerate(("a", "b", "c")):
+            cache.put(key, selection())
+            # Entries used in the same second are ordered by their mtime
+            used = time.time() - 100 + number
+            os.utime(os.path.join(self.path, key), (used, used))
+        # Using "a" makes "b" the least recently used entry
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("d", selection(3000))
+        self.assertEqual(sorted(os.listdir(self.path)), ["a", "d"])
+        self.assertEqual(cache.evictions, 2)
+        self.assertLessEqual(cache.size, 10_000)
+
+        # An entry larger than the budget isn't stored
+        cache.put("e", selection(20_000))
+        self.assertIsNone(cache.get("e"))
+
+    def test_keys(self):
+        """Keys depend on the clip and the settings, not on the URL signature"""
+        self.assertEqual(
+            clip_id("http://ha:8123/api/frigate/notifications/1/clip.mp4?authSig=abc"),
+            "http://ha:8123/api/frigate/notifications/1/clip.mp4",
+        )
+        self.assertEqual(
+            clip_id("http://cam/clip.mp4?camera=1&authSig=abc"),
+            "http://cam/clip.mp4?camera=1",
+        )
+        self.assertNotEqual(cache_key("clip", [3, 640]), cache_key("clip", [3, 1280]))
+
+        clip = os.path.join(self.tmp.name, "clip.mp4")
+        with open(clip, "wb") as file:
+            file.write(b"clip" * 1_000_000)
+        digest = file_digest(clip)
+        identity = file_identity(clip)
+        link = os.path.join(self.tmp.name, "link.mp4")
+        os.symlink(clip, link)
+        self.assertEqual(file_identity(link), identity)
+        with open(clip, "ab") as file:
+            file.write(b"more")
+        self.assertNotEqual(file_digest(clip), digest)
+        self.assertNotEqual(file_identity(clip), identity)
+
+
+if __name__ == "__main__":
+    unittest.main()
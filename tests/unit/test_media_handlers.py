@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Unit tests for MediaProcessor in media_handlers.py.
+Runs the processor against stand-ins for Home Assistant, see fake_hass.py.
+"""
+
+import asyncio
+import base64
+import io
+import os
+import sys
+import tempfile
+import time
+import pytest
+import unittest
+from unittest.mock import patch
+
+pytest.importorskip("homeassistant")
+
+from homeassistant.components.camera import Image as CameraImage
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from PIL import Image
+
+from custom_components.llmvision.const import (
+    DATA_PROCESS_SUPERVISOR,
+    DOMAIN,
+    FRAME_EXTRACTION_FILES,
+    FRAME_EXTRACTION_PIPE,
+)
+from custom_components.llmvision.executor import (
+    retire_media_executor,
+    setup_media_executor,
+)
+from custom_components.llmvision.frame_cache import get_frame_cache
+from custom_components.llmvision.supervisor import (
+    retire_process_supervisor,
+    setup_process_supervisor,
+)
+from custom_components.llmvision.video import ExtractionProfile
+from fake_hass import (
+    FakeFFmpeg,
+    FakeHass,
+    FakeSession,
+    FakeStdin,
+    jpeg,
+    media_processor,
+    mp4_clip,
+)
+
+CLIP_URL = "http://homeassistant:8123/api/frigate/notifications/1/clip.mp4"
+HASS_URL = "http://homeassistant:8123"
+MEDIA_HANDLERS = "custom_components.llmvision.media_handlers"
+
+
+def image_sizes(images):
+    """Sizes of the images added to a client"""
+    sizes = []
+    for image in images:
+        if isinstance(image, str):
+            image = base64.b64decode(image)
+        with Image.open(io.BytesIO(image)) as decoded:
+            sizes.append(decoded.size)
+    return sizes
+
+
+@pytest.mark.unit
+class TestImageCache(unittest.TestCase):
+    """Test cases for the image cache use of MediaProcessor"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_images_are_cached(self):
+        """Decoding the same image twice reuses the cached frame"""
+
+        async def run():
+            processor = media_processor(FakeHass(self.tmp.name))
+            first = await processor._load_frame(640, image_data=jpeg())
+            second = await processor._load_frame(640, image_data=jpeg())
+            return processor.cache.stats, first, second
+
+        stats, first, second = asyncio.run(run())
+        self.assertIs(first, second)
+        self.assertEqual((stats["entries"], stats["hits"]), (1, 1))
+
+    def test_stream_frames_are_not_cached(self):
+        """Frames recorded from a camera don't take up the image cache"""
+        snapshots = iter(range(100))
+
+        async def entity_image(entity_id):
+            return jpeg(seed=next(snapshots))
+
+        async def run():
+            processor = media_processor(FakeHass(self.tmp.name, ["camera.front"]))
+            with patch.object(processor, "_entity_image", entity_image):
+                await processor.record(
+                    ["camera.front"],
+                    duration=1,
+                    max_frames=3,
+                    min_frames_per_camera=1,
+                    target_width=640,
+                    include_filename=False,
+                    expose_images=False,
+                )
+            return processor.cache.stats, processor.client.filenames
+
+        stats, filenames = asyncio.run(run())
+        self.assertGreater(next(snapshots), 1)
+        self.assertTrue(filenames)
+        self.assertEqual((stats["entries"], stats["misses"]), (0, 0))
+
+
+@pytest.mark.unit
+class TestReload(unittest.TestCase):
+    """Test cases for calls in flight while Settings are reloaded"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_executor_is_replaced(self):
+        """Calls move on to the new media executor, the old one shuts down"""
+
+        async def run():
+            hass = FakeHass(self.tmp.name)
+            processor = media_processor(hass)
+            previous = processor.executor
+            job = asyncio.create_task(previous.run(lambda: jpeg(seed=1)))
+            await asyncio.sleep(0)
+            # Unloading and setting up the Settings entry again
+            retire_media_executor(hass)
+            setup_media_executor(hass, {})
+            frame = await processor._load_frame(640, image_data=await job)
+            return previous, processor.executor, frame
+
+        previous, current, frame = asyncio.run(run())
+        self.assertIsNot(current, previous)
+        self.assertTrue(previous._closed)
+        self.assertFalse(current._closed)
+        self.assertEqual(frame.image.width, 320)
+
+    def test_executors_stop_with_home_assistant(self):
+        """Reloads don't add stop listeners, busy retired executors are shut down"""
+
+        async def run():
+            hass = FakeHass(self.tmp.name)
+            previous = media_processor(hass).executor
+            job = asyncio.create_task(previous.run(time.sleep, 0.2))
+            await asyncio.sleep(0.05)
+            for _ in range(3):
+                retire_media_executor(hass)
+                setup_media_executor(hass, {})
+            current = media_processor(hass).executor
+            listeners = len(hass.listeners[EVENT_HOMEASSISTANT_STOP])
+            hass.fire(EVENT_HOMEASSISTANT_STOP)
+            closed = previous._closed, current._closed
+            await job
+            return listeners, closed
+
+        listeners, closed = asyncio.run(run())
+        self.assertEqual(listeners, 1)
+        self.assertEqual(closed, (True, True))
+
+    def test_processes_outlive_reload(self):
+        """Running ffmpeg processes finish, unless Home Assistant stops"""
+
+        async def run(stop):
+            hass = FakeHass(self.tmp.name)
+            processor = media_processor(hass)
+            previous = processor.supervisor
+            async with previous.process(
+                sys.executable,
+                "-c",
+                "import sys, time; sys.stdin.readline(); time.sleep(0.2)",
+                stdin=asyncio.subprocess.PIPE,
+            ) as process:
+                for _ in range(3):
+                    retire_process_supervisor(hass)
+                    setup_process_supervisor(hass, {})
+                self.assertEqual(len(hass.listeners[EVENT_HOMEASSISTANT_STOP]), 1)
+                if stop:
+                    hass.fire(EVENT_HOMEASSISTANT_STOP)
+                process.stdin.write(b"\n")
+                await process.wait()
+            return previous, processor.supervisor, process.returncode
+
+        previous, current, returncode = asyncio.run(run(stop=False))
+        self.assertEqual(returncode, 0)
+        self.assertIsNot(current, previous)
+        self.assertEqual(previous.stats["terminated"], 0)
+
+        _, _, returncode = asyncio.run(run(stop=True))
+        self.assertNotEqual(returncode, 0)
+
+
+@pytest.mark.unit
+class TestEntityImage(unittest.TestCase):
+    """Test cases for snapshots of camera and image entities"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, target in (
+            ("camera", "async_get_camera_image"),
+            ("image", "async_get_entity_image"),
+            ("get_url", "get_url"),
+        ):
+            patcher = patch(f"{MEDIA_HANDLERS}.{target}")
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.get_url.return_value = HASS_URL
+
+    def entity_image(self, entity_id, session):
+        async def run():
+            hass = FakeHass(self.tmp.name, ["camera.front", "image.doorbell"])
+            return await media_processor(hass, session)._entity_image(entity_id)
+
+        return asyncio.run(run())
+
+    def test_in_process(self):
+        """Camera and image entities are read without an HTTP request"""
+        session = FakeSession(b"")
+        self.camera.return_value = CameraImage("image/jpeg", b"camera")
+        self.image.return_value = CameraImage("image/jpeg", b"image")
+        self.assertEqual(self.entity_image("camera.front", session), b"camera")
+        self.assertEqual(self.entity_image("image.doorbell", session), b"image")
+        self.assertEqual(self.camera.call_args.args[1], "camera.front")
+        self.assertEqual(self.image.call_args.args[1], "image.doorbell")
+        self.assertEqual(session.requests, [])
+
+    def test_fallback_to_http(self):
+        """Entities that can't be read in-process are fetched from their picture"""
+        snapshot = jpeg()
+        session = FakeSession(snapshot)
+        self.camera.side_effect = HomeAssistantError("Camera is off")
+        # Raised if the image integration isn't loaded
+        self.image.side_effect = KeyError("image")
+        self.assertEqual(self.entity_image("camera.front", session), snapshot)
+        self.assertEqual(self.entity_image("image.doorbell", session), snapshot)
+        self.assertEqual(
+            [url for _, url, _ in session.requests],
+            [
+                f"{HASS_URL}/api/camera_proxy/camera.front?token=abc",
+                f"{HASS_URL}/api/camera_proxy/image.doorbell?token=abc",
+            ],
+        )
+
+    def test_missing_entity(self):
+        """Adding a snapshot of an entity that doesn't exist fails"""
+        self.camera.side_effect = HomeAssistantError("Camera not found")
+
+        async def run():
+            hass = FakeHass(self.tmp.name, ["camera.front"])
+            processor = media_processor(hass, FakeSession(jpeg()))
+            await processor.add_images(
+                ["camera.garden"],
+                None,
+                target_width=640,
+                include_filename=False,
+                expose_images=False,
+            )
+
+        with self.assertRaisesRegex(ServiceValidationError, "does not exist"):
+            asyncio.run(run())
+
+
+@pytest.mark.unit
+class TestStreamClip(unittest.TestCase):
+    """Test cases for extracting frames while a clip downloads"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.target = os.path.join(self.tmp.name, "clip.mp4")
+
+    def read_target(self):
+        with open(self.target, "rb") as file:
+            return file.read()
+
+    def stream(self, session, select_frames):
+        async def run():
+            processor = media_processor(FakeHass(self.tmp.name), session)
+            return await processor._stream_clip(
+                CLIP_URL, self.target, select_frames, 2, 0.01
+            )
+
+        return asyncio.run(run())
+
+    @staticmethod
+    async def read_clip(clip):
+        """Reads the clip like ffmpeg does, returns what it read"""
+        stdin = FakeStdin()
+        clip.attach(stdin)
+        await stdin.closed.wait()
+        return bytes(stdin.data)
+
+    def test_moov_first(self):
+        """Frames of a streamable clip are selected while it downloads"""
+        clip = mp4_clip()
+        session = FakeSession(clip, chunk_size=1000)
+        self.assertEqual(self.stream(session, self.read_clip), clip)
+        self.assertEqual(self.read_target(), clip)
+        self.assertEqual(session.requests, [("GET", CLIP_URL, None)])
+
+    def test_not_streamable(self):
+        """Clips with the moov box at the end are only downloaded"""
+
+        async def select_frames(clip):
+            raise AssertionError("clip isn't streamable")
+
+        clip = mp4_clip(streamable=False)
+        session = FakeSession(clip, chunk_size=1000)
+        self.assertIsNone(self.stream(session, select_frames))
+        self.assertEqual(self.read_target(), clip)
+        self.assertEqual(len(session.requests), 1)
+
+    def test_extraction_fails(self):
+        """The download completes if extracting frames from it fails"""
+
+        async def select_frames(clip):
+            clip.attach(FakeStdin())
+            raise ValueError("FFmpeg failed with return code 1")
+
+        clip = mp4_clip()
+        session = FakeSession(clip, chunk_size=1000)
+        self.assertIsNone(self.stream(session, select_frames))
+        self.assertEqual(self.read_target(), clip)
+        self.assertEqual(len(session.requests), 1)
+
+    def test_download_interrupted(self):
+        """A broken off download is resumed, the frames are extracted again"""
+        clip = mp4_clip()
+        session = FakeSession(clip, interrupt=32_000, chunk_size=1000)
+        self.assertIsNone(self.stream(session, self.read_clip))
+        self.assertEqual(self.read_target(), clip)
+        self.assertEqual(
+            session.requests,
+            [("GET", CLIP_URL, None), ("GET", CLIP_URL, "bytes=32000-")],
+        )
+
+
+@pytest.mark.unit
+class TestAddVideo(unittest.TestCase):
+    """Test cases for selecting frames from video clips"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clips_dir = os.path.join(self.tmp.name, "clips")
+        self.frames_dir = os.path.join(self.tmp.name, "frames")
+
+    def hass(self, ffmpeg):
+        """FakeHass with ffmpeg as process supervisor, call it in the loop"""
+        hass = FakeHass(self.tmp.name)
+        hass.data[DATA_PROCESS_SUPERVISOR] = ffmpeg
+        return hass
+
+    async def add_video(
+        self, hass, session, mode, max_frames=3, url=CLIP_URL, stream_clips=True, **kwargs
+    ):
+        """Frames the processor adds for the clip at url"""
+        processor = media_processor(hass, session)
+        processor.extraction = ExtractionProfile(mode=mode, stream_clips=stream_clips)
+        await processor.add_video(
+            url,
+            self.clips_dir,
+            self.frames_dir,
+            base_url="http://homeassistant:8123",
+            max_frames=max_frames,
+            retry_attempts=2,
+            retry_seconds=0.01,
+            **kwargs,
+        )
+        return processor.client.images
+
+    def test_streamed_extraction_fails(self):
+        """Frames of a failed streamed extraction aren't mixed into the retry"""
+        # Fewer keyframes than samples, so the retry seeks to timestamps
+        ffmpeg = FakeFFmpeg(keyframes=2, fail_streamed=12)
+
+        async def run():
+            return await self.add_video(
+                self.hass(ffmpeg),
+                FakeSession(mp4_clip()),
+                FRAME_EXTRACTION_FILES,
+                max_frames=2,
+            )
+
+        images = asyncio.run(run())
+        extractions = [args for _, args, _ in ffmpeg.commands if "-skip_frame" in args]
+        seeks = [args for _, args, _ in ffmpeg.commands if "-ss" in args]
+        self.assertEqual(len(extractions), 1)
+        self.assertIn("pipe:0", extractions[0])
+        # 3 samples per frame
+        self.assertEqual(len(seeks), 6)
+        self.assertEqual(len(os.listdir(self.frames_dir)), 6)
+        self.assertEqual(len(images), 2)
+        self.assertEqual(set(image_sizes(images)), {(320, 180)})
+
+    def test_piped_frames_and_cache(self):
+        """Frames are piped from the streamed clip, a repeated call uses the cache"""
+        ffmpeg = FakeFFmpeg(keyframes=8)
+        clip = mp4_clip()
+
+        async def run():
+            hass = self.hass(ffmpeg)
+            session = FakeSession(clip)
+            first = await self.add_video(hass, session, FRAME_EXTRACTION_PIPE)
+            commands = list(ffmpeg.commands)
+            second = await self.add_video(hass, session, FRAME_EXTRACTION_PIPE)
+            return first, second, commands, session.requests
+
+        first, second, commands, requests = asyncio.run(run())
+        (probe, _, probed), (_, extraction, piped) = commands
+        self.assertEqual(probe, "ffprobe")
+        self.assertTrue(clip.startswith(probed))
+        self.assertIn("rawvideo", extraction)
+        self.assertEqual(piped, clip)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(set(image_sizes(first)), {(160, 90)})
+
+        # Read back from the frame cache, without downloading or running ffmpeg
+        self.assertEqual(ffmpeg.commands, commands)
+        self.assertEqual(
+            [method for method, _, _ in requests], ["HEAD", "GET", "HEAD"]
+        )
+        self.assertEqual(len(second), 3)
+        self.assertEqual(image_sizes(second), image_sizes(first))
+
+    def test_other_urls_not_polled(self):
+        """Clips other than Frigate's are downloaded without probing them first"""
+        ffmpeg = FakeFFmpeg(keyframes=8)
+        url = "https://bucket.s3.amazonaws.com/clip.mp4?X-Amz-Signature=abc"
+
+        async def run():
+            session = FakeSession(mp4_clip())
+            images = await self.add_video(
+                self.hass(ffmpeg),
+                session,
+                FRAME_EXTRACTION_FILES,
+                url=url,
+                stream_clips=False,
+            )
+            return images, session.requests
+
+        images, requests = asyncio.run(run())
+        self.assertEqual(requests, [("GET", url, None)])
+        self.assertEqual(len(images), 3)
+
+    def test_local_clips_cached_by_identity(self):
+        """Local clips aren't hashed, a changed clip is processed again"""
+        ffmpeg = FakeFFmpeg(keyframes=8)
+        clip = os.path.join(self.tmp.name, "clip.mp4")
+        with open(clip, "wb") as file:
+            file.write(mp4_clip())
+
+        async def run():
+            hass = self.hass(ffmpeg)
+            calls = []
+            for _ in range(2):
+                await self.add_video(hass, None, FRAME_EXTRACTION_FILES, url=clip)
+                calls.append(len(ffmpeg.commands))
+            os.utime(clip, ns=(0, 0))
+            await self.add_video(hass, None, FRAME_EXTRACTION_FILES, url=clip)
+            calls.append(len(ffmpeg.commands))
+            return calls
+
+        with patch(
+            "custom_components.llmvision.media_handlers.file_digest",
+            side_effect=AssertionError("local clips are not hashed"),
+        ):
+            first, second, changed = asyncio.run(run())
+        self.assertGreater(first, 0)
+        self.assertEqual(second, first)
+        self.assertGreater(changed, second)
+
+    def test_downloads_cached_by_digest(self):
+        """Downloads without a version are found in the cache by their content"""
+        ffmpeg = FakeFFmpeg(keyframes=8)
+        url = "https://bucket.s3.amazonaws.com/clip.mp4?X-Amz-Signature=abc"
+
+        async def run():
+            hass = self.hass(ffmpeg)
+            session = FakeSession(mp4_clip())
+            first = await self.add_video(
+                hass, session, FRAME_EXTRACTION_FILES, url=url, stream_clips=False
+            )
+            second = await self.add_video(
+                hass, session, FRAME_EXTRACTION_FILES, url=url, stream_clips=False
+            )
+            return first, second, get_frame_cache(hass)
+
+        first, second, frame_cache = asyncio.run(run())
+        self.assertEqual((frame_cache.misses, frame_cache.hits), (1, 1))
+        self.assertEqual(image_sizes(second), image_sizes(first))
+
+    def test_exposed_frames_keep_original_size(self):
+        """Exposed frames aren't scaled by ffmpeg, the frames sent are"""
+        ffmpeg = FakeFFmpeg(keyframes=8, width=1280)
+
+        async def run():
+            return await self.add_video(
+                self.hass(ffmpeg),
+                FakeSession(mp4_clip()),
+                FRAME_EXTRACTION_FILES,
+                target_width=320,
+                expose_images=True,
+            )
+
+        images = asyncio.run(run())
+        extraction = next(args for _, args, _ in ffmpeg.commands if "-skip_frame" in args)
+        self.assertNotIn("scale", " ".join(extraction))
+        self.assertEqual(set(image_sizes(images)), {(320, 180)})
+        snapshots = os.path.join(self.tmp.name, "media", DOMAIN, "snapshots")
+        (snapshot,) = os.listdir(snapshots)
+        with Image.open(os.path.join(snapshots, snapshot)) as image:
+            self.assertEqual(image.size, (1280, 720))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Unit tests for frame mosaics in mosaic.py.
+Tests the grid layout and that all frames end up in one labeled image.
+"""
+
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from PIL import Image
+
+from custom_components.llmvision.mosaic import (
+    MOSAIC_GAP,
+    build_mosaic,
+    mosaic_layout,
+)
+
+
+@pytest.mark.unit
+class TestMosaic(unittest.TestCase):
+    """Test cases for frame mosaics"""
+
+    def test_layout(self):
+        """Layouts are close to square and have few empty cells"""
+        self.assertEqual(mosaic_layout(1, 640, 360), (1, 1, 640))
+        self.assertEqual(mosaic_layout(2, 640, 360), (1, 2, 640))
+        self.assertEqual(mosaic_layout(4, 640, 360), (2, 2, 640))
+        self.assertEqual(mosaic_layout(6, 640, 360), (2, 3, 640))
+        self.assertEqual(mosaic_layout(9, 640, 360), (3, 3, 640))
+        # Portrait frames are placed side by side
+        self.assertEqual(mosaic_layout(2, 360, 640), (2, 1, 360))
+
+    def test_layout_max_width(self):
+        """Cells shrink so the mosaic fits into the maximum width"""
+        columns, _, cell_width = mosaic_layout(9, 1920, 1080, max_width=3840)
+        self.assertEqual(columns, 3)
+        self.assertLessEqual(columns * cell_width + (columns - 1) * MOSAIC_GAP, 3840)
+
+    def test_build_mosaic(self):
+        """Frames are placed left to right, top to bottom, with labels"""
+        colors = ["red", "green", "blue", "yellow"]
+        images = [Image.new("RGB", (640, 360), color) for color in colors]
+        mosaic = build_mosaic(images, [f"Video frame {i}" for i in range(1, 5)])
+        self.assertEqual(mosaic.size, (2 * 640 + MOSAIC_GAP, 2 * 360 + MOSAIC_GAP))
+        # Cell centers show the frames
+        self.assertEqual(mosaic.getpixel((320, 180)), (255, 0, 0))
+        self.assertEqual(mosaic.getpixel((640 + MOSAIC_GAP + 320, 180)), (0, 128, 0))
+        self.assertEqual(mosaic.getpixel((320, 360 + MOSAIC_GAP + 180)), (0, 0, 255))
+        # Labels are drawn in the top left corner of each cell
+        corner = mosaic.crop((0, 0, 200, 40))
+        self.assertIn((255, 255, 255), [color for _, color in corner.getcolors(10000)])
+
+    def test_mixed_sizes(self):
+        """Frames with another aspect ratio are fit into their cell"""
+        images = [Image.new("RGB", (640, 360), "red"), Image.new("RGB", (200, 360), "blue")]
+        mosaic = build_mosaic(images, ["camera 0 frame 1", "camera 1 frame 1"])
+        self.assertEqual(mosaic.size, (640, 2 * 360 + MOSAIC_GAP))
+        self.assertEqual(mosaic.getpixel((320, 360 + MOSAIC_GAP + 180)), (0, 0, 255))
+        self.assertEqual(mosaic.getpixel((10, 360 + MOSAIC_GAP + 180)), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the request body writer in payload.py.
+Tests that bodies with spliced images match plain JSON serialization.
+"""
+
+import base64
+import json
+import os
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.payload import (
+    CHUNK_SIZE,
+    Base64Image,
+    DataUri,
+    serialize,
+    with_raw_images,
+)
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+
+
+def b64(data):
+    return base64.b64encode(data).decode("utf-8")
+
+
+@pytest.mark.unit
+class TestPayload(unittest.TestCase):
+    """Test cases for pre-serialized request bodies"""
+
+    def test_body_matches_json_dumps(self):
+        """Spliced images serialize exactly like base64 strings would"""
+        # Sizes around the chunk size, with all three padding lengths
+        images = [
+            JPEG_HEADER + os.urandom(size)
+            for size in (0, 1, 2, 1000, CHUNK_SIZE - 4, CHUNK_SIZE * 3 + 7)
+        ]
+        payload = {
+            "model": "test",
+            "messages": [
+                {"type": "text", "text": 'Describe "this" é\n'},
+                *[{"type": "image", "data": Base64Image(image)} for image in images],
+            ],
+            "temperature": 0.5,
+        }
+        expected = {
+            **payload,
+            "messages": [
+                payload["messages"][0],
+                *[{"type": "image", "data": b64(image)} for image in images],
+            ],
+        }
+        body = serialize(payload)
+        self.assertEqual(bytes(body), json.dumps(expected).encode("utf-8"))
+
+    def test_data_uri(self):
+        """Data URIs carry the sniffed mime type"""
+        image = JPEG_HEADER + os.urandom(100)
+        body = json.loads(serialize({"url": DataUri(image)}))
+        self.assertEqual(body["url"], f"data:image/jpeg;base64,{b64(image)}")
+
+    def test_base64_string_input(self):
+        """Images that are base64 strings already are written as they are"""
+        image = JPEG_HEADER + os.urandom(100)
+        body = json.loads(serialize({"url": DataUri(b64(image)), "data": Base64Image(b64(image))}))
+        self.assertEqual(body["url"], f"data:image/jpeg;base64,{b64(image)}")
+        self.assertEqual(body["data"], b64(image))
+
+    def test_without_images(self):
+        """Payloads without images are plain JSON"""
+        payload = {"model": "test", "messages": [{"role": "user", "content": "Hi"}]}
+        self.assertEqual(serialize(payload), json.dumps(payload).encode("utf-8"))
+
+    def test_placeholder_text_is_not_replaced(self):
+        """Text that looks like a placeholder is escaped and kept as it is"""
+        payload = {"text": '"\\u0000llmvision_image_0\\u0000"', "data": Base64Image(b"abc")}
+        body = json.loads(serialize(payload))
+        self.assertEqual(body, {"text": payload["text"], "data": b64(b"abc")})
+
+    def test_raw_images(self):
+        """For boto3, images are replaced with their bytes"""
+        image = JPEG_HEADER + os.urandom(100)
+        data = [{"image": {"source": {"bytes": Base64Image(b64(image))}}}]
+        self.assertEqual(with_raw_images(data)[0]["image"]["source"]["bytes"], image)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ffmpeg scheduler in scheduler.py.
+Tests the concurrency cap, the queue order and the queue metrics.
+"""
+
+import asyncio
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.scheduler import FFmpegScheduler
+
+
+@pytest.mark.unit
+class TestFFmpegScheduler(unittest.TestCase):
+    """Test cases for the ffmpeg scheduler"""
+
+    def test_concurrency_is_bounded(self):
+        """No more than max_jobs jobs run at once"""
+
+        async def run():
+            scheduler = FFmpegScheduler(max_jobs=2)
+            running = peak = 0
+
+            async def job():
+                nonlocal running, peak
+                async with scheduler.job():
+                    running += 1
+                    peak = max(peak, running)
+                    await asyncio.sleep(0.001)
+                    running -= 1
+
+            await asyncio.gather(*(job() for _ in range(10)))
+            return scheduler, peak
+
+        scheduler, peak = asyncio.run(run())
+        self.assertEqual(peak, 2)
+        stats = scheduler.stats
+        self.assertEqual(stats["completed"], 10)
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["peak_queued"], 8)
+        self.assertGreater(stats["max_wait_ms"], 0)
+
+    def test_priority_order(self):
+        """Waiting jobs start by priority, then in the order they were queued"""
+
+        async def run():
+            scheduler = FFmpegScheduler(max_jobs=1)
+            started = []
+            release = asyncio.Event()
+
+            async def job(name, priority):
+                async with scheduler.job(priority):
+                    started.append(name)
+                    await release.wait()
+
+            tasks = [asyncio.create_task(job("first", 5))]
+            await asyncio.sleep(0)
+            for name, priority in (("b1", 1), ("a0", 0), ("c1", 1), ("d0", 0)):
+                tasks.append(asyncio.create_task(job(name, priority)))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.stats["queued"], 4)
+            release.set()
+            await asyncio.gather(*tasks)
+            return started
+
+        self.assertEqual(asyncio.run(run()), ["first", "a0", "d0", "b1", "c1"])
+
+    def test_cancelled_job_frees_its_place(self):
+        """Cancelling a waiting job doesn't leak or block the slot"""
+
+        async def run():
+            scheduler = FFmpegScheduler(max_jobs=1)
+            release = asyncio.Event()
+
+            async def job():
+                async with scheduler.job():
+                    await release.wait()
+
+            first = asyncio.create_task(job())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(job())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            release.set()
+            await first
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            # The slot is free again
+            await asyncio.wait_for(job(), 1)
+            return scheduler.stats
+
+        stats = asyncio.run(run())
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+
+    def test_timeout(self):
+        """Jobs get the default timeout unless they set their own"""
+
+        async def run():
+            scheduler = FFmpegScheduler(max_jobs=1, timeout=300)
+            async with scheduler.job() as default:
+                pass
+            async with scheduler.job(timeout=30) as custom:
+                pass
+            return default, custom
+
+        self.assertEqual(asyncio.run(run()), (300, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
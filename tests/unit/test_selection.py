@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the online frame selection in selection.py.
+Tests that bounded per-camera heaps select the same frames as selecting
+from all recorded frames, in capture order.
+"""
+
+import random
+import numpy as np
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.selection import (
+    FrameSelector,
+    select_diverse_frames,
+    select_frames_with_minimums,
+)
+
+
+def record(cameras, frames_per_camera, seed=0):
+    """Recorded frames as (camera, frame_name, score, timestamp), in capture order"""
+    rng = random.Random(seed)
+    frames = []
+    for counter in range(frames_per_camera):
+        for camera in cameras:
+            # Coarse scores, so some frames have equal scores
+            score = round(rng.random(), 1)
+            frames.append((camera, f"{camera} frame {counter}", score, float(counter)))
+    return frames
+
+
+@pytest.mark.unit
+class TestFrameSelector(unittest.TestCase):
+    """Test cases for the online frame selector"""
+
+    def select_offline(self, cameras, frames, max_frames, min_frames_per_camera):
+        camera_frames = {camera: {} for camera in cameras}
+        for camera, frame_name, score, _ in frames:
+            camera_frames[camera][frame_name] = {"frame_data": frame_name, "ssim_score": score}
+        return select_frames_with_minimums(camera_frames, max_frames, min_frames_per_camera)
+
+    def select_online(self, cameras, frames, max_frames, min_frames_per_camera):
+        selector = FrameSelector(max_frames, min_frames_per_camera)
+        for camera in cameras:
+            selector.add_camera(camera)
+        for camera, frame_name, score, timestamp in frames:
+            selector.add(camera, frame_name, frame_name, score, timestamp)
+        return selector
+
+    def test_same_selection_as_offline(self):
+        """Bounded heaps select the same frames as the full recording"""
+        cameras = ["camera.front", "camera.back", "camera.garage"]
+        for seed in range(10):
+            frames = record(cameras, 20, seed)
+            for max_frames, min_frames in ((1, 0), (5, 0), (5, 1), (6, 2), (3, 2), (10, 4)):
+                expected, expected_count = self.select_offline(
+                    cameras, frames, max_frames, min_frames
+                )
+                selected, count = self.select_online(
+                    cameras, frames, max_frames, min_frames
+                ).select()
+                self.assertEqual(
+                    sorted(name for name, _, _ in selected),
+                    sorted(name for name, _, _ in expected),
+                )
+                self.assertEqual(count, expected_count)
+
+    def test_memory_is_bounded(self):
+        """No more than max_frames frames per camera are kept"""
+        cameras = ["camera.front", "camera.back"]
+        selector = self.select_online(cameras, record(cameras, 1000), 4, 1)
+        self.assertEqual(selector.added, 2000)
+        self.assertEqual(len(selector), 8)
+
+    def test_capture_order(self):
+        """Selected frames are ordered by capture time, not by label"""
+        frames = [
+            ("camera.front", f"front frame {counter}", 0.5, float(counter))
+            for counter in range(12)
+        ]
+        selected, _ = self.select_online(["camera.front"], frames, 12, 0).select()
+        self.assertEqual(
+            [name for name, _, _ in selected],
+            [f"front frame {counter}" for counter in range(12)],
+        )
+
+    def test_camera_without_frames(self):
+        """Cameras without frames are counted with zero frames"""
+        frames = [("camera.front", "front frame 0", 0.5, 0.0)]
+        _, count = self.select_online(["camera.front", "camera.back"], frames, 3, 1).select()
+        self.assertEqual(count, {"camera.front": 1, "camera.back": 0})
+
+    def test_zero_max_frames(self):
+        """Nothing is kept or selected with max_frames 0"""
+        frames = record(["camera.front"], 5)
+        selected, _ = self.select_online(["camera.front"], frames, 0, 0).select()
+        self.assertEqual(selected, [])
+
+
+@pytest.mark.unit
+class TestDiverseSelection(unittest.TestCase):
+    """Test cases for the farthest-point frame selection"""
+
+    def setUp(self):
+        # Three bursts of similar frames
+        rng = np.random.default_rng(0)
+        centers = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+        self.features = np.concatenate(
+            [center + rng.normal(0, 0.1, (4, 2)) for center in centers]
+        )
+        self.burst = np.repeat([0, 1, 2], 4)
+
+    def test_one_frame_per_burst(self):
+        """Each burst contributes one frame before any burst contributes two"""
+        selected = select_diverse_frames(self.features, ["camera.front"] * 12, 3)
+        self.assertEqual(selected[0], 0)
+        self.assertEqual(sorted(self.burst[selected]), [0, 1, 2])
+
+    def test_minimum_per_camera(self):
+        """Cameras below the minimum are served first"""
+        cameras = ["camera.front"] * 8 + ["camera.back"] * 4
+        selected = select_diverse_frames(self.features, cameras, 4, 2)
+        self.assertEqual(sum(cameras[index] == "camera.back" for index in selected), 2)
+        self.assertEqual(len(selected), 4)
+
+    def test_fewer_candidates_than_max_frames(self):
+        """All candidates are selected if there are not enough"""
+        self.assertEqual(
+            sorted(select_diverse_frames(self.features[:2], ["camera.front"] * 2, 5)),
+            [0, 1],
+        )
+        self.assertEqual(select_diverse_frames(np.empty((0, 2)), [], 5), [])
+
+    def test_selector_pool(self):
+        """The selector keeps a larger pool and returns frames in capture order"""
+        selector = FrameSelector(3, pool_size=12)
+        for index in range(len(self.features)):
+            selector.add("camera.front", f"front frame {index}", index, 0.5, float(index))
+        candidates = selector.candidates()
+        self.assertEqual(len(candidates), 12)
+        features = [self.features[frame] for _, _, frame, _, _ in candidates]
+        selected, count = selector.select_diverse(features)
+        frames = [frame for _, frame, _ in selected]
+        self.assertEqual(frames, sorted(frames))
+        self.assertEqual(sorted(self.burst[frames]), [0, 1, 2])
+        self.assertEqual(count, {"camera.front": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SSIM engine in similarity.py.
+Compares the windowed SSIM on grayscale proxies against the previous global
+SSIM on full resolution frames for frame discrimination. For speed, see
+tests/benchmark_similarity.py.
+"""
+
+import io
+import os
+import tempfile
+import numpy as np
+import pytest
+import unittest
+
+pytest.importorskip("homeassistant")
+
+from PIL import Image
+
+from custom_components.llmvision.similarity import (
+    HASH_THRESHOLD,
+    consecutive_scores,
+    distinct_frames,
+    frame_features,
+    gray_proxy,
+    hamming,
+    image_hash,
+    load_gray_proxies,
+    motion_box,
+    similarity_score,
+    ssim,
+)
+
+
+def legacy_similarity_score(previous_frame, current_frame_gray):
+    """Global SSIM over full resolution frames, as used before (reference)"""
+    K1 = 0.005
+    K2 = 0.015
+    L = 255
+
+    C1 = (K1 * L) ** 2
+    C2 = (K2 * L) ** 2
+
+    previous_frame_np = np.array(previous_frame)
+    current_frame_np = np.array(current_frame_gray)
+
+    mu1 = np.mean(previous_frame_np, dtype=np.float64)
+    mu2 = np.mean(current_frame_np, dtype=np.float64)
+
+    sigma1_sq = np.var(previous_frame_np, dtype=np.float64, mean=mu1)
+    sigma2_sq = np.var(current_frame_np, dtype=np.float64, mean=mu2)
+    sigma12 = np.cov(
+        previous_frame_np.flatten(), current_frame_np.flatten(), dtype=np.float64
+    )[0, 1]
+
+    return ((2 * mu1 * mu2 + C1) * (2 * sigma12 + C2)) / (
+        (mu1**2 + mu2**2 + C1) * (sigma1_sq + sigma2_sq + C2)
+    )
+
+
+def create_scene(seed=0, width=1920, height=1080):
+    """Smooth textured background, like a camera image"""
+    rng = np.random.default_rng(seed)
+    texture = (rng.random((height // 8, width // 8)) * 255).astype(np.uint8)
+    return np.asarray(Image.fromarray(texture).resize((width, height), Image.BICUBIC))
+
+
+def add_object(scene, x, y=500, size=40):
+    """Scene with a small dark object at x, y"""
+    frame = scene.copy()
+    frame[y : y + size, x : x + size] = 20
+    return frame
+
+
+def add_noise(frame, sigma=4, seed=1):
+    """Frame with sensor noise"""
+    rng = np.random.default_rng(seed)
+    return np.clip(frame + rng.normal(0, sigma, frame.shape), 0, 255).astype(np.uint8)
+
+
+def proxy_score(previous_frame, current_frame, **kwargs):
+    return similarity_score(
+        gray_proxy(Image.fromarray(previous_frame)),
+        gray_proxy(Image.fromarray(current_frame)),
+        **kwargs,
+    )
+
+
+@pytest.mark.unit
+class TestSimilarity(unittest.TestCase):
+    """Test cases for the windowed SSIM engine"""
+
+    def setUp(self):
+        self.scene = create_scene()
+        self.frame = add_object(self.scene, 400)
+
+    def test_identical_frames(self):
+        """Identical frames score 1"""
+        self.assertAlmostEqual(proxy_score(self.frame, self.frame), 1.0)
+        self.assertAlmostEqual(proxy_score(self.frame, self.frame, scales=3), 1.0)
+
+    def test_gray_proxy_size(self):
+        """Proxies are at most 256 pixels wide and keep the aspect ratio"""
+        self.assertEqual(gray_proxy(Image.fromarray(self.frame)).shape, (144, 256))
+        small = Image.new("RGB", (160, 120))
+        self.assertEqual(gray_proxy(small).shape, (120, 160))
+
+    def test_localized_motion_scores_lower(self):
+        """A small moving object lowers the score more than with global SSIM"""
+        moved = add_object(self.scene, 460)
+        self.assertLess(
+            proxy_score(self.frame, moved),
+            legacy_similarity_score(self.frame, moved),
+        )
+
+    def test_noise_is_ignored(self):
+        """Sensor noise lowers the score less than with global SSIM"""
+        noisy = add_noise(self.frame)
+        self.assertGreater(
+            proxy_score(self.frame, noisy),
+            legacy_similarity_score(self.frame, noisy),
+        )
+
+    def test_motion_ranks_below_noise(self):
+        """Frames with motion are more distinct than frames with only noise"""
+        moved = add_object(self.scene, 460)
+        noisy = add_noise(self.frame)
+        self.assertLess(proxy_score(self.frame, moved), proxy_score(self.frame, noisy))
+
+    def test_batched_scores_match(self):
+        """Stacks of frames are scored like single frames"""
+        frames = [add_object(self.scene, x) for x in (100, 400, 700)]
+        proxies = np.stack([gray_proxy(Image.fromarray(f)) for f in frames])
+        batched = ssim(proxies[:-1], proxies[1:], scales=2)
+        for i, score in enumerate(batched):
+            self.assertAlmostEqual(
+                score, similarity_score(proxies[i], proxies[i + 1], scales=2)
+            )
+
+    def test_consecutive_scores(self):
+        """A clip is scored in batches like pair by pair"""
+        proxies = [
+            gray_proxy(Image.fromarray(add_object(self.scene, x)))
+            for x in range(100, 1000, 60)
+        ]
+        scores = consecutive_scores(proxies, batch=4)
+        self.assertEqual(len(scores), len(proxies) - 1)
+        for i, score in enumerate(scores):
+            self.assertAlmostEqual(score, similarity_score(proxies[i], proxies[i + 1]))
+        self.assertEqual(len(consecutive_scores(proxies[:1])), 0)
+
+    def test_load_gray_proxies(self):
+        """Proxies are decoded from JPEG files, broken files are None"""
+        with tempfile.TemporaryDirectory() as tmp:
+            jpeg = os.path.join(tmp, "frame.jpg")
+            Image.fromarray(self.frame).save(jpeg)
+            broken = os.path.join(tmp, "broken.jpg")
+            with open(broken, "wb") as f:
+                f.write(b"not an image")
+            proxy, missing = load_gray_proxies([jpeg, broken])
+        self.assertEqual(proxy.shape, (144, 256))
+        self.assertIsNone(missing)
+        self.assertGreater(
+            similarity_score(proxy, gray_proxy(Image.fromarray(self.frame))), 0.95
+        )
+
+    def test_near_duplicates_are_pruned(self):
+        """Repeated frames are dropped, frames with a large change are kept"""
+        person = add_object(self.scene, 900, size=150)
+        clip = [self.frame, self.frame, person, person, self.frame]
+        proxies = [gray_proxy(Image.fromarray(frame)) for frame in clip]
+        self.assertEqual(distinct_frames(proxies), [0, 2, 4])
+
+    def test_image_hash(self):
+        """Encoded images are hashed without a full decode"""
+
+        def encode(frame):
+            buffer = io.BytesIO()
+            Image.fromarray(frame).save(buffer, "JPEG", quality=90)
+            return buffer.getvalue()
+
+        frame_hash = image_hash(encode(self.frame))
+        self.assertEqual(frame_hash, image_hash(encode(self.frame)))
+        self.assertGreater(
+            hamming(frame_hash, image_hash(encode(add_object(self.scene, 900, size=150)))),
+            HASH_THRESHOLD,
+        )
+
+    def test_frame_features(self):
+        """Features separate frames by content and by color"""
+
+        def features(frame, tint=(1.0, 1.0, 1.0)):
+            rgb = np.clip(np.stack([frame] * 3, axis=-1) * tint, 0, 255).astype(np.uint8)
+            image = Image.fromarray(rgb)
+            return frame_features(gray_proxy(image), image)
+
+        base = features(self.frame)
+        self.assertEqual(base.shape, (16 * 16 + 4**3,))
+        self.assertAlmostEqual(float(base[-(4**3) :].sum()), 1.0, places=5)
+        person = features(add_object(self.scene, 900, size=150))
+        red = features(self.frame, tint=(1.0, 0.5, 0.5))
+        self.assertEqual(np.linalg.norm(base - features(self.frame)), 0)
+        self.assertGreater(np.linalg.norm(base - person), 0.01)
+        self.assertGreater(np.linalg.norm(base - red), np.linalg.norm(base - person))
+
+    def test_motion_box(self):
+        """The box covers the changed region with padding, noise is ignored"""
+        previous = gray_proxy(Image.fromarray(self.scene))
+        person = gray_proxy(Image.fromarray(add_object(self.scene, 900, size=150)))
+        left, top, right, bottom = motion_box(previous, person)
+        # The object spans 900-1050 of 1920 and 500-650 of 1080 pixels
+        self.assertLess(left, 900 / 1920)
+        self.assertGreater(right, 1050 / 1920)
+        self.assertLess(top, 500 / 1080)
+        self.assertGreater(bottom, 650 / 1080)
+        self.assertLess((right - left) * (bottom - top), 0.25)
+
+        noisy = gray_proxy(Image.fromarray(add_noise(self.scene)))
+        self.assertIsNone(motion_box(previous, noisy))
+
+    def test_motion_box_near_edge(self):
+        """Boxes are shifted into the frame and have a minimum size"""
+        previous = gray_proxy(Image.fromarray(self.scene))
+        corner = gray_proxy(Image.fromarray(add_object(self.scene, 0, y=0)))
+        left, top, right, bottom = motion_box(previous, corner)
+        self.assertEqual((left, top), (0.0, 0.0))
+        self.assertAlmostEqual(right, 0.3)
+        self.assertAlmostEqual(bottom, 0.3)
+
+    def test_motion_across_frame_is_not_cropped(self):
+        """Changes across most of the frame give no box"""
+        previous = gray_proxy(Image.fromarray(self.scene))
+        self.assertIsNone(motion_box(previous, 255 - previous))
+
+    def test_different_shapes_are_cropped(self):
+        """Frames of different size are compared on their common area"""
+        a = gray_proxy(Image.fromarray(self.frame))
+        self.assertAlmostEqual(similarity_score(a, a[:100, :200]), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the process supervisor in supervisor.py.
+Tests that processes are stopped and reaped on exit, timeouts and
+cancellation, and that they run at a lower priority.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import pytest
+import unittest
+from unittest.mock import patch
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.supervisor import ProcessSupervisor
+
+# Ignores SIGTERM, so it can only be stopped with SIGKILL
+STUBBORN = (
+    "import signal, sys, time\n"
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+    "print('ready', flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+# Prints its niceness once the parent writes a line
+NICENESS = "import os, sys\nsys.stdin.readline()\nprint(os.nice(0))\n"
+
+
+@pytest.mark.unit
+@unittest.skipUnless(hasattr(os, "killpg"), "requires POSIX process groups")
+class TestProcessSupervisor(unittest.TestCase):
+    """Test cases for the process supervisor"""
+
+    def test_finished_process(self):
+        """A process that exits by itself isn't signalled"""
+
+        async def run():
+            supervisor = ProcessSupervisor(nice=0, ionice="none")
+            async with supervisor.process(sys.executable, "-c", "pass") as process:
+                await process.wait()
+            return supervisor.stats, process.returncode
+
+        stats, returncode = asyncio.run(run())
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stats["started"], 1)
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["terminated"], 0)
+
+    def test_terminate_then_kill(self):
+        """A process ignoring SIGTERM is killed and reaped"""
+
+        async def run():
+            supervisor = ProcessSupervisor(nice=0, ionice="none")
+            async with supervisor.process(
+                sys.executable, "-c", STUBBORN, stdout=asyncio.subprocess.PIPE
+            ) as process:
+                await process.stdout.readline()
+                self.assertEqual(supervisor.running, 1)
+            return supervisor.stats, process.returncode
+
+        with patch("custom_components.llmvision.supervisor.TERMINATE_TIMEOUT", 0.2):
+            stats, returncode = asyncio.run(run())
+        self.assertEqual(returncode, -signal.SIGKILL)
+        self.assertEqual((stats["terminated"], stats["killed"]), (1, 1))
+        self.assertEqual(stats["running"], 0)
+
+    def test_cancellation(self):
+        """Cancelling the caller stops the process"""
+
+        async def run():
+            supervisor = ProcessSupervisor(nice=0, ionice="none")
+            started = asyncio.Event()
+            processes = []
+
+            async def call():
+                async with supervisor.process(
+                    sys.executable, "-c", "import time; time.sleep(60)"
+                ) as process:
+                    processes.append(process)
+                    started.set()
+                    await process.wait()
+
+            task = asyncio.create_task(call())
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return supervisor.stats, processes[0].returncode
+
+        stats, returncode = asyncio.run(run())
+        self.assertEqual(returncode, -signal.SIGTERM)
+        self.assertEqual((stats["terminated"], stats["killed"]), (1, 0))
+        self.assertEqual(stats["running"], 0)
+
+    def test_niceness(self):
+        """Processes run at the configured niceness"""
+
+        async def run():
+            supervisor = ProcessSupervisor(nice=15, ionice="none")
+            async with supervisor.process(
+                sys.executable,
+                "-c",
+                NICENESS,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            ) as process:
+                stdout, _ = await process.communicate(b"\n")
+            return int(stdout)
+
+        self.assertEqual(asyncio.run(run()), max(15, os.nice(0)))
+
+    def test_ffmpeg_options(self):
+        """Threads are only limited when configured"""
+        self.assertEqual(ProcessSupervisor(threads=0).ffmpeg_options(), [])
+        self.assertEqual(
+            ProcessSupervisor(threads=2).ffmpeg_options(), ["-threads", "2"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
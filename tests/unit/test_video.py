@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Unit tests for piped keyframe extraction in video.py.
+Tests the extraction size, the frame buffer and reading raw frames from
+ffmpeg's stdout.
+"""
+
+import asyncio
+import os
+import stat
+import struct
+import sys
+import tempfile
+import io
+import numpy as np
+import pytest
+import unittest
+from unittest.mock import patch
+from PIL import Image
+
+pytest.importorskip("homeassistant")
+
+from custom_components.llmvision.video import (
+    ClipStream,
+    ExtractionProfile,
+    FrameBuffer,
+    MAX_KEYFRAMES_PER_SAMPLE,
+    frame_proxy,
+    mp4_moov_end,
+    pipe_keyframes,
+    sampling_timestamps,
+    scaled_size,
+)
+
+# Writes three solid frames of the size given by -vf scale=WxH
+FAKE_FFMPEG = """\
+#!{python}
+import sys
+width, height = map(int, sys.argv[sys.argv.index("-vf") + 1][6:].split(":"))
+for value in (0, 128, 255):
+    sys.stdout.buffer.write(bytes([value]) * (width * height * 3))
+sys.exit({returncode})
+"""
+
+
+def box(box_type, payload=b""):
+    """MP4 box with a 32-bit size"""
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+class FakeStdin:
+    """ffmpeg stdin that stops reading after limit bytes"""
+
+    def __init__(self, limit=None):
+        self.data = bytearray()
+        self.limit = limit
+        self.closed = False
+
+    def write(self, data):
+        if self.limit is not None and len(self.data) >= self.limit:
+            raise BrokenPipeError
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+async def chunks(*data):
+    for item in data:
+        await asyncio.sleep(0)
+        yield item
+
+
+@pytest.mark.unit
+class TestVideo(unittest.TestCase):
+    """Test cases for piped keyframe extraction"""
+
+    def test_scaled_size(self):
+        """Frames are scaled down to the target width with even sides"""
+        self.assertEqual(scaled_size(1920, 1080, 1280), (1280, 720))
+        self.assertEqual(scaled_size(1920, 1080, 3840), (1920, 1080))
+        self.assertEqual(scaled_size(1920, 1080, None), (1920, 1080))
+        self.assertEqual(scaled_size(1001, 501, 1001), (1000, 500))
+        width, height = scaled_size(640, 481, 333)
+        self.assertEqual((width % 2, height % 2), (0, 0))
+
+    def test_video_filter(self):
+        """Scaling and scene change detection are done in the filter graph"""
+        self.assertIsNone(ExtractionProfile().video_filter())
+        self.assertEqual(ExtractionProfile().video_filter(640), "scale='min(iw,640)':-2")
+        self.assertEqual(ExtractionProfile().video_filter(640, 360), "scale=640:360")
+        self.assertEqual(
+            ExtractionProfile(scene_threshold=0.3).video_filter(
+                640, 360, scene_detection=False
+            ),
+            "scale=640:360",
+        )
+        self.assertEqual(
+            ExtractionProfile(scene_threshold=0.3).video_filter(640, 360),
+            "scale=640:360,select='eq(n,0)+gt(scene,0.3)'",
+        )
+        profile = ExtractionProfile.from_config(
+            {"frame_extraction": "pipe", "scene_threshold": 0.25}
+        )
+        self.assertEqual((profile.mode, profile.scene_threshold), ("pipe", 0.25))
+
+    def test_mp4_moov_end(self):
+        """Clips are streamable if moov comes before the media data"""
+        ftyp = box(b"ftyp", b"isom" * 4)
+        moov = box(b"moov", b"\0" * 100)
+        faststart = ftyp + moov + box(b"mdat", b"\1" * 1000)
+        self.assertEqual(mp4_moov_end(faststart), len(ftyp) + len(moov))
+        # The moov header is enough to know where it ends
+        self.assertEqual(mp4_moov_end(faststart[: len(ftyp) + 8]), len(ftyp) + len(moov))
+        fragmented = ftyp + moov + box(b"moof") + box(b"mdat")
+        self.assertEqual(mp4_moov_end(fragmented), len(ftyp) + len(moov))
+        # moov at the end, as written by default
+        self.assertFalse(mp4_moov_end(ftyp + box(b"mdat", b"\1" * 10) + moov))
+        self.assertFalse(mp4_moov_end(b"\x1aE\xdf\xa3 matroska header"))
+        self.assertIsNone(mp4_moov_end(ftyp[:6]))
+        self.assertIsNone(mp4_moov_end(ftyp))
+        # 64-bit box size
+        large = struct.pack(">I4sQ", 1, b"moov", 116) + b"\0" * 100
+        self.assertEqual(mp4_moov_end(ftyp + large), len(ftyp) + 116)
+
+    def test_clip_stream(self):
+        """The download is saved to the file and fed to ffmpeg"""
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "clip.mp4")
+            stdin = FakeStdin()
+            clip = ClipStream(b"head", chunks(b"one", b"two"), target)
+            clip.attach(stdin)
+            asyncio.run(clip.run())
+            with open(target, "rb") as file:
+                self.assertEqual(file.read(), b"headonetwo")
+            self.assertEqual(bytes(stdin.data), b"headonetwo")
+            self.assertTrue(stdin.closed)
+
+    def test_clip_stream_ffmpeg_stops(self):
+        """The file is complete if ffmpeg stops reading or is never attached"""
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "clip.mp4")
+            stdin = FakeStdin(limit=4)
+            clip = ClipStream(b"head", chunks(b"one", b"two"), target)
+            clip.attach(stdin)
+            asyncio.run(clip.run())
+            with open(target, "rb") as file:
+                self.assertEqual(file.read(), b"headonetwo")
+            self.assertEqual(bytes(stdin.data), b"head")
+
+            clip = ClipStream(b"head", chunks(b"one"), target)
+            clip.detach()
+            asyncio.run(clip.run())
+            with open(target, "rb") as file:
+                self.assertEqual(file.read(), b"headone")
+
+    def test_sampling_timestamps(self):
+        """Clips with too few or too many keyframes are sampled by timestamp"""
+        # Enough keyframes, decode them
+        self.assertIsNone(sampling_timestamps(60.0, 30, 10))
+        self.assertIsNone(sampling_timestamps(None, 1, 10))
+        # Long GOP
+        self.assertEqual(sampling_timestamps(10.0, 2, 5), [1.0, 3.0, 5.0, 7.0, 9.0])
+        # Long recording
+        timestamps = sampling_timestamps(3600.0, 10 * MAX_KEYFRAMES_PER_SAMPLE + 1, 10)
+        self.assertEqual(len(timestamps), 10)
+        self.assertTrue(all(0 < t < 3600 for t in timestamps))
+
+    def test_frame_buffer_load(self):
+        """Sampled JPEGs are decoded into a slot at the frame size"""
+        buffer = FrameBuffer(1, 64, 32)
+        data = io.BytesIO()
+        Image.new("RGB", (128, 64), (0, 0, 255)).save(data, "JPEG")
+        slot = buffer.acquire()
+        buffer.load(slot, data.getvalue())
+        self.assertEqual(buffer.image(slot).size, (64, 32))
+        self.assertGreater(buffer.frames[slot][16, 32, 2], 200)
+
+    def test_frame_buffer(self):
+        """Slots are reused once released"""
+        buffer = FrameBuffer(2, 64, 32)
+        self.assertEqual(buffer.frame_size, 64 * 32 * 3)
+        first, second = buffer.acquire(), buffer.acquire()
+        self.assertNotEqual(first, second)
+        with self.assertRaises(RuntimeError):
+            buffer.acquire()
+        buffer.frames[first] = 200
+        image = buffer.image(first)
+        buffer.release(first)
+        self.assertEqual(buffer.acquire(), first)
+        # Images are copies and survive the slot being reused
+        buffer.frames[first] = 0
+        self.assertEqual(image.size, (64, 32))
+        self.assertEqual(image.getpixel((0, 0)), (200, 200, 200))
+
+    def test_frame_proxy(self):
+        """Proxies are grayscale and identical frames have the same hash"""
+        frame = np.full((90, 160, 3), 100, dtype=np.uint8)
+        proxy, frame_hash = frame_proxy(frame)
+        self.assertEqual(proxy.ndim, 2)
+        self.assertEqual(frame_proxy(frame.copy())[1], frame_hash)
+
+    def run_fake_ffmpeg(self, returncode=0):
+        """Frames read from a fake ffmpeg, as list of pixel values"""
+        with tempfile.TemporaryDirectory() as bin_dir:
+            path = os.path.join(bin_dir, "ffmpeg")
+            with open(path, "w") as file:
+                file.write(FAKE_FFMPEG.format(python=sys.executable, returncode=returncode))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+            async def read():
+                buffer = FrameBuffer(2, 32, 16)
+                values = []
+                async for index, slot in pipe_keyframes("video.mp4", buffer, timeout=30):
+                    values.append((index, int(buffer.frames[slot].mean())))
+                    buffer.release(slot)
+                return values
+
+            with patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ["PATH"]}):
+                return asyncio.run(read())
+
+    @unittest.skipIf(sys.platform == "win32", "needs an executable script")
+    def test_pipe_keyframes(self):
+        """Raw frames are read into buffer slots as they arrive"""
+        self.assertEqual(self.run_fake_ffmpeg(), [(1, 0), (2, 128), (3, 255)])
+
+    @unittest.skipIf(sys.platform == "win32", "needs an executable script")
+    def test_pipe_keyframes_failure(self):
+        """A failing ffmpeg raises ValueError"""
+        with self.assertRaises(ValueError):
+            self.run_fake_ffmpeg(returncode=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for per-call workspaces in workspace.py.
+Tests that concurrent video calls keep their temporary files apart and that
+each call removes only its own workspace.
+"""
+
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+import pytest
+import unittest
+from unittest.mock import patch
+
+pytest.importorskip("homeassistant")
+
+from PIL import Image
+
+from custom_components.llmvision.const import (
+    CONF_FRAME_CACHE_SIZE,
+    DATA_PROCESS_SUPERVISOR,
+)
+from custom_components.llmvision.frame_cache import setup_frame_cache
+from custom_components.llmvision.workspace import (
+    WORKSPACE_PREFIX,
+    Workspace,
+    get_tmp_path,
+    remove_stale_workspaces,
+)
+from fake_hass import FakeFFmpeg, FakeHass, media_processor
+
+CONCURRENT_CALLS = 32
+FRAMES_PER_CALL = 20
+VIDEO_CALLS = 8
+
+
+class ClipFFmpeg(FakeFFmpeg):
+    """Keyframes are as wide as the number in the clip's name, e.g. clip64_1.mp4"""
+
+    def clip_width(self, source):
+        return int(os.path.basename(source)[len("clip") :].split("_")[0])
+
+
+async def fake_video_call(base_path, call, rng):
+    """Write frames like ffmpeg would, then read them back after other calls ran
+
+    Returns:
+        tuple: (workspace path, frame contents read back)
+    """
+    async with Workspace(base_path) as workspace:
+        with open(os.path.join(workspace.clips_dir, "clip.mp4"), "wb") as file:
+            file.write(b"clip")
+        # All calls use the same file names, as ffmpeg's frame%05d pattern does
+        for index in range(1, FRAMES_PER_CALL + 1):
+            with open(
+                os.path.join(workspace.frames_dir, f"frame{index:05d}.jpg"), "w"
+            ) as file:
+                file.write(f"{call}")
+            if rng.random() < 0.2:
+                await asyncio.sleep(0)
+        await asyncio.sleep(rng.random() * 0.01)
+        contents = set()
+        for name in sorted(os.listdir(workspace.frames_dir)):
+            with open(os.path.join(workspace.frames_dir, name)) as file:
+                contents.add(file.read())
+        return workspace.path, contents
+
+
+@pytest.mark.unit
+class TestWorkspace(unittest.TestCase):
+    """Test cases for per-call workspaces"""
+
+    def setUp(self):
+        self.base = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base.cleanup)
+
+    def test_concurrent_calls(self):
+        """Concurrent calls only see their own frames and clean up after themselves"""
+
+        async def run():
+            rng = random.Random(0)
+            return await asyncio.gather(
+                *(
+                    fake_video_call(self.base.name, call, rng)
+                    for call in range(CONCURRENT_CALLS)
+                )
+            )
+
+        results = asyncio.run(run())
+        self.assertEqual(len({path for path, _ in results}), CONCURRENT_CALLS)
+        for call, (_, contents) in enumerate(results):
+            self.assertEqual(contents, {f"{call}"})
+        self.assertEqual(os.listdir(self.base.name), [])
+
+    def test_concurrent_add_videos(self):
+        """Concurrent add_videos calls only get frames of their own clips"""
+        clips_dir = os.path.join(self.base.name, "clips")
+        os.mkdir(clips_dir)
+        widths = [32 * (call + 1) for call in range(VIDEO_CALLS)]
+        for width in widths:
+            for number in (1, 2):
+                with open(os.path.join(clips_dir, f"clip{width}_{number}.mp4"), "wb"):
+                    pass
+        # Enough keyframes that they are extracted, not sampled by timestamp
+        ffmpeg = ClipFFmpeg(keyframes=12)
+
+        async def call(hass, width):
+            processor = media_processor(hass)
+            await processor.add_videos(
+                [os.path.join(clips_dir, f"clip{width}_{n}.mp4") for n in (1, 2)],
+                event_ids=None,
+                max_frames=3,
+                target_width=640,
+                include_filename=False,
+                expose_images=False,
+                frigate_retry_attempts=2,
+                frigate_retry_seconds=0.01,
+            )
+            sizes = set()
+            for image in processor.client.images:
+                with Image.open(io.BytesIO(image)) as decoded:
+                    sizes.add(decoded.size)
+            return len(processor.client.images), sizes
+
+        async def run():
+            hass = FakeHass(self.base.name)
+            hass.data[DATA_PROCESS_SUPERVISOR] = ffmpeg
+            # Each call extracts its frames, none are read from the frame cache
+            setup_frame_cache(hass, {CONF_FRAME_CACHE_SIZE: 0})
+            with patch(
+                "custom_components.llmvision.media_handlers.get_url",
+                return_value="http://homeassistant:8123",
+            ):
+                results = await asyncio.gather(*(call(hass, width) for width in widths))
+            return results, get_tmp_path(hass)
+
+        results, tmp_path = asyncio.run(run())
+        for width, (count, sizes) in zip(widths, results):
+            self.assertEqual(count, 6)
+            self.assertEqual(sizes, {(width, width * 9 // 16)})
+        self.assertGreater(ffmpeg.peak_running, 1)
+        self.assertEqual(os.listdir(tmp_path), [])
+
+    def test_cleanup_on_error(self):
+        """The workspace is deleted when the call fails"""
+
+        async def run():
+            async with Workspace(os.path.join(self.base.name, "tmp")) as workspace:
+                with open(os.path.join(workspace.frames_dir, "frame00001.jpg"), "w"):
+                    pass
+                raise ValueError("FFmpeg failed")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+        self.assertEqual(os.listdir(os.path.join(self.base.name, "tmp")), [])
+
+    def test_remove_stale_workspaces(self):
+        """Old workspaces are removed, recent ones and other files are kept"""
+        stale = os.path.join(self.base.name, WORKSPACE_PREFIX + "stale")
+        recent = os.path.join(self.base.name, WORKSPACE_PREFIX + "recent")
+        other = os.path.join(self.base.name, "other")
+        for path in (stale, recent, other):
+            os.mkdir(path)
+        old = time.time() - 7200
+        os.utime(stale, (old, old))
+        os.utime(other, (old, old))
+
+        self.assertEqual(remove_stale_workspaces(self.base.name), 1)
+        self.assertEqual(
+            sorted(os.listdir(self.base.name)), ["other", WORKSPACE_PREFIX + "recent"]
+        )
+        self.assertEqual(remove_stale_workspaces(os.path.join(self.base.name, "x")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()